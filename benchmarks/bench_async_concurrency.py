@@ -0,0 +1,63 @@
+"""Throughput of the async request path at increasing concurrency.
+
+Starts uvicorn against a fresh database and issues GET /product/ with N
+concurrent clients.  With the sync handlers every in-flight request held one
+of the 40 threadpool tokens; the async path should keep scaling past that.
+
+    python -m benchmarks.bench_async_concurrency --requests 2000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.common import free_port, start_server, summarize, workdir
+
+
+async def run_level(base_url, concurrency, total):
+    samples = []
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def one():
+            async with sem:
+                start = time.perf_counter()
+                r = await client.get("/product/", params={"limit": 10})
+                r.raise_for_status()
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+    return summarize(samples, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--levels", default="10,40,80,160,320")
+    args = parser.parse_args()
+
+    cwd = workdir()
+    port = free_port()
+    server = start_server(cwd, port)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for i in range(50):
+            httpx.post(f"{base_url}/product/", json={"name": f"product-{i}", "price": 100 + i, "stock": 10})
+        results = {}
+        for level in (int(x) for x in args.levels.split(",")):
+            results[level] = asyncio.run(run_level(base_url, level, args.requests))
+            print(f"concurrency={level}: {results[level]}")
+        print(json.dumps(results, indent=2))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
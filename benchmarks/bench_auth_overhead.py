@@ -0,0 +1,89 @@
+"""Per-request authentication overhead: cold vs cached token validation.
+
+Times security.authenticate_token with an empty token cache (JWT decode plus
+a user lookup) against a warm cache, then GET /auth/users/me over HTTP.
+Asserts that a cached token costs no database query. The revocation list
+is re-read once per REVOCATION_REFRESH_INTERVAL whatever the cache holds;
+those refreshes are counted separately and excluded from the checks.
+
+    python -m benchmarks.bench_auth_overhead --tokens 500 --requests 2000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import QueryCounter, asgi_client, seed_users, summarize, workdir
+
+
+async def run(tokens, requests):
+    from database import SessionLocal, engine, init_db
+    from main import app
+    from revocation import revoked_tokens
+    from routers.auth_router import create_access_token
+    from security import authenticate_token, token_cache
+    import hashing
+
+    await init_db()
+    await seed_users(tokens)
+    issued = [create_access_token({"sub": f"user-{i}"}) for i in range(tokens)]
+
+    results = {}
+    async with SessionLocal() as db:
+        for phase in ("cold", "warm"):
+            if phase == "cold":
+                token_cache.clear()
+            samples = []
+            refreshes = revoked_tokens.refreshes
+            with QueryCounter(engine) as counter:
+                start = time.perf_counter()
+                for token in issued:
+                    t = time.perf_counter()
+                    await authenticate_token(token, db)
+                    samples.append(time.perf_counter() - t)
+                elapsed = time.perf_counter() - start
+            # Одна выборка отзывов на каждое обновление списка, не на токен
+            refreshes = revoked_tokens.refreshes - refreshes
+            results[phase] = dict(
+                summarize(samples, elapsed), queries=counter.count - refreshes, revocation_refreshes=refreshes
+            )
+    assert results["cold"]["queries"] == tokens, results["cold"]
+    assert results["warm"]["queries"] == 0, results["warm"]
+
+    async with asgi_client(app) as client:
+        headers = [{"Authorization": f"Bearer {token}"} for token in issued]
+        samples = []
+        refreshes = revoked_tokens.refreshes
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            for i in range(requests):
+                t = time.perf_counter()
+                r = await client.get("/auth/users/me", headers=headers[i % tokens])
+                samples.append(time.perf_counter() - t)
+                assert r.status_code == 200, r.text
+            elapsed = time.perf_counter() - start
+        refreshes = revoked_tokens.refreshes - refreshes
+        queries = counter.count - refreshes
+        # Кешированный токен: остаётся только чтение баланса
+        assert queries == requests, (counter.count, refreshes)
+        results["users_me"] = dict(summarize(samples, elapsed), queries=queries, revocation_refreshes=refreshes)
+        results["token_cache"] = (await client.get("/auth/tokens/stats")).json()
+
+    hashing.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir()
+    print(json.dumps(asyncio.run(run(args.tokens, args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""A 20-item cart as one multi-line order vs 20 single-item orders.
+
+    python -m benchmarks.bench_cart --items 20 --rounds 50
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import asgi_client, seed_users, workdir
+
+
+async def run(items, rounds):
+    from database import init_db
+    from main import app
+
+    await init_db()
+    await seed_users(1)
+
+    async with asgi_client(app) as client:
+        product_ids = []
+        for i in range(items):
+            r = await client.post("/product/", json={"name": f"item-{i}", "price": 50, "stock": 10 * rounds})
+            product_ids.append(r.json()["id"])
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for product_id in product_ids:
+                r = await client.post("/order/", json={"user_id": 1, "product_id": product_id, "quantity": 1})
+                r.raise_for_status()
+        single_elapsed = time.perf_counter() - start
+
+        cart = [{"product_id": product_id, "quantity": 1} for product_id in product_ids]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            r = await client.post("/order/", json={"user_id": 1, "items": cart})
+            r.raise_for_status()
+        cart_elapsed = time.perf_counter() - start
+
+    return {
+        "items": items,
+        "rounds": rounds,
+        "single_item_orders_ms_per_cart": round(single_elapsed / rounds * 1000, 2),
+        "multi_line_order_ms_per_cart": round(cart_elapsed / rounds * 1000, 2),
+        "speedup": round(single_elapsed / cart_elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir()
+    print(json.dumps(asyncio.run(run(args.items, args.rounds)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
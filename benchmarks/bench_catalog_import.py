@@ -0,0 +1,122 @@
+"""Bulk catalog import/export vs one POST /product/ per row.
+
+Writes an NDJSON file of --rows products and imports it through
+POST /product/import, then re-imports the same names as CSV with new prices
+and a few broken rows (all upserts hit ON CONFLICT). Compares the rate with
+creating --single-rows products one request at a time and streams the table
+back through GET /product/export. Finally imports a CSV with only name and
+price. Asserts row counts, the per-row error report, that the re-imports
+updated prices and that the partial CSV left the other columns alone.
+
+    python -m benchmarks.bench_catalog_import --rows 100000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+
+from benchmarks.common import asgi_client, workdir
+
+# Каждая такая по счёту строка CSV намеренно испорчена
+BROKEN_EVERY = 1000
+
+
+def write_files(cwd, rows):
+    ndjson_path = os.path.join(cwd, "products.ndjson")
+    csv_path = os.path.join(cwd, "products.csv")
+    prices_path = os.path.join(cwd, "prices.csv")
+    with open(ndjson_path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(json.dumps({"name": f"product-{i:07d}", "description": "Сезонный товар", "price": 100, "stock": 5}) + "\n")
+    broken = 0
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "description", "price", "is_available", "stock"])
+        for i in range(rows):
+            price = 200
+            if i % BROKEN_EVERY == BROKEN_EVERY - 1:
+                price, broken = "n/a", broken + 1
+            writer.writerow([f"product-{i:07d}", "Сезонный товар, обновлено", price, "true", 7])
+    # Только цены: остальные поля товаров не меняются
+    with open(prices_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "price"])
+        for i in range(rows):
+            writer.writerow([f"product-{i:07d}", 300])
+    return ndjson_path, csv_path, prices_path, broken
+
+
+async def upload(client, path, media_type):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        r = await client.post("/product/import", files={"file": (os.path.basename(path), f, media_type)}, timeout=None)
+    r.raise_for_status()
+    return time.perf_counter() - start, r.json()
+
+
+async def run(cwd, rows, single_rows):
+    from sqlalchemy import func, select
+    from database import SessionLocal, init_db
+    from main import app
+    from models.product import Product
+
+    await init_db()
+    ndjson_path, csv_path, prices_path, broken = write_files(cwd, rows)
+    results = {}
+    async with asgi_client(app) as client:
+        elapsed, report = await upload(client, ndjson_path, "application/x-ndjson")
+        assert report == {"imported": rows, "failed": 0, "errors": []}, report
+        results["ndjson_insert"] = {"seconds": round(elapsed, 2), "rows_per_s": round(rows / elapsed)}
+
+        elapsed, report = await upload(client, csv_path, "text/csv")
+        assert report["imported"] == rows - broken and report["failed"] == broken, {**report, "errors": report["errors"][:3]}
+        assert report["errors"][0]["line"] == BROKEN_EVERY + 1, report["errors"][0]
+        results["csv_upsert"] = {"seconds": round(elapsed, 2), "rows_per_s": round(rows / elapsed), "failed": broken}
+
+        elapsed, report = await upload(client, prices_path, "text/csv")
+        assert report == {"imported": rows, "failed": 0, "errors": []}, report
+        results["csv_prices_only"] = {"seconds": round(elapsed, 2), "rows_per_s": round(rows / elapsed)}
+
+        start = time.perf_counter()
+        for i in range(single_rows):
+            r = await client.post("/product/", json={"name": f"single-{i}", "price": 100, "stock": 5})
+            r.raise_for_status()
+        elapsed = time.perf_counter() - start
+        results["post_per_row"] = {"rows": single_rows, "rows_per_s": round(single_rows / elapsed)}
+
+        start = time.perf_counter()
+        lines = 0
+        async with client.stream("GET", "/product/export", timeout=None) as r:
+            async for _ in r.aiter_lines():
+                lines += 1
+        elapsed = time.perf_counter() - start
+        assert lines == rows + single_rows, lines
+        results["ndjson_export"] = {"seconds": round(elapsed, 2), "rows_per_s": round(lines / elapsed)}
+
+    async with SessionLocal() as db:
+        assert await db.scalar(select(func.count()).select_from(Product)) == rows + single_rows
+        assert await db.scalar(select(func.count()).select_from(Product).filter(Product.price == 300)) == rows
+        updated = select(func.count()).select_from(Product).filter(
+            Product.stock == 7, Product.description == "Сезонный товар, обновлено", Product.is_available.is_(True)
+        )
+        assert await db.scalar(updated) == rows - broken
+    results["speedup"] = round(results["ndjson_insert"]["rows_per_s"] / results["post_per_row"]["rows_per_s"], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--single-rows", type=int, default=500)
+    args = parser.parse_args()
+
+    cwd = workdir()
+    print(json.dumps(asyncio.run(run(cwd, args.rows, args.single_rows)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
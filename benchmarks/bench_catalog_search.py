@@ -0,0 +1,135 @@
+"""Search latency over a large products table: FTS5 vs LIKE.
+
+Seeds --rows products whose names and descriptions are built from a small
+vocabulary (so common words match tens of thousands of rows), then times
+crud.product.search_products_json for several query shapes: a common word,
+a rare word, 2- and 3-letter prefixes, two words, filters and a deep
+cursor page. Each is compared with the naive LIKE '%term%' query. LIKE is
+unranked and stops at the first --limit rows in id order, so it wins on
+words that match a large share of the table and loses badly on rare ones;
+FTS cost grows with the number of matches, because bm25 is computed for
+each. Asserts that every FTS hit really contains the terms and that the
+cursor walks pages without repeats.
+
+    python -m benchmarks.bench_catalog_search --rows 500000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from benchmarks.common import asgi_client, workdir
+
+CHUNK = 50_000
+ADJECTIVES = ["красная", "синяя", "тёплая", "летняя", "зимняя", "шерстяная", "кожаная", "детская", "большая", "лёгкая"]
+NOUNS = ["шляпа", "шапка", "куртка", "перчатки", "сумка", "футболка", "кепка", "шарф", "ботинки", "рубашка"]
+WORDS = ["скидка", "новинка", "хлопок", "подарок", "классика", "размер", "доставка", "комплект", "сезон", "бренд"]
+
+QUERIES = {
+    "common_word": {"text": "шляпа"},
+    "rare_word": {"text": "зебра"},
+    "prefix_2": {"text": "шл"},
+    "prefix_3": {"text": "кеп"},
+    "two_words": {"text": "красная шапка"},
+    "filtered": {"text": "куртка", "available": True, "min_price": 100, "max_price": 300},
+}
+
+
+async def seed(cwd, rows):
+    from sqlalchemy import insert
+    from database import make_engine
+    from migrations import upgrade
+    from models.product import Product
+
+    rng = random.Random(42)
+    seed_engine = make_engine(f"sqlite+aiosqlite:///{cwd}/test.db")
+    await upgrade(seed_engine)
+    async with seed_engine.begin() as conn:
+        for start in range(0, rows, CHUNK):
+            await conn.execute(insert(Product), [
+                {
+                    "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                    "description": " ".join(rng.choices(WORDS, k=6)) + (" зебра" if i % 10_000 == 0 else ""),
+                    "price": rng.randint(10, 1000), "stock": 1, "is_available": rng.random() < 0.8,
+                }
+                for i in range(start, min(rows, start + CHUNK))
+            ])
+    await seed_engine.dispose()
+
+
+async def like_search(db, text, limit):
+    from sqlalchemy import and_, or_, select
+    from crud.product import PRODUCT_RESPONSE_COLUMNS
+    from models.product import Product
+
+    conditions = [or_(Product.name.like(f"%{term}%"), Product.description.like(f"%{term}%")) for term in text.split()]
+    return (await db.execute(select(*PRODUCT_RESPONSE_COLUMNS).filter(and_(*conditions)).order_by(Product.id).limit(limit))).all()
+
+
+async def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await fn()
+        samples.append(time.perf_counter() - start)
+    return {"p50_ms": round(statistics.median(samples) * 1000, 2), "max_ms": round(max(samples) * 1000, 2)}, result
+
+
+async def run(limit, repeat, pages):
+    from database import SessionLocal
+    from crud.product import search_products_json
+    from main import app
+
+    results = {}
+    async with SessionLocal() as db:
+        for name, params in QUERIES.items():
+            params = dict(params)
+            text = params.pop("text")
+            fts, data = await timed(lambda: search_products_json(db, text, limit=limit, **params), repeat)
+            like, _ = await timed(lambda: like_search(db, text, limit), repeat)
+            items = json.loads(data)["items"]
+            for item in items:
+                haystack = f"{item['name']} {item['description']}".lower().split()
+                assert all(any(word.startswith(term) for word in haystack) for term in text.split()), (text, item)
+                if "max_price" in params:
+                    assert item["is_available"] and params["min_price"] <= item["price"] <= params["max_price"], item
+            results[name] = {"fts": fts, "like": like, "returned": len(items)}
+            print(name, results[name])
+
+        # Глубокая страница по курсору: страницы не повторяются
+        start = time.perf_counter()
+        cursor, seen = None, set()
+        for _ in range(pages):
+            page = json.loads(await search_products_json(db, "шапка", limit=limit, cursor=cursor))
+            ids = {item["id"] for item in page["items"]}
+            assert not ids & seen
+            seen |= ids
+            cursor = page["next_cursor"]
+        results["cursor_pages"] = {"pages": pages, "avg_page_ms": round((time.perf_counter() - start) / pages * 1000, 2)}
+        print("cursor_pages", results["cursor_pages"])
+
+    async with asgi_client(app) as client:
+        r = await client.get("/product/search", params={"q": "синяя шарф", "limit": limit})
+        assert r.status_code == 200 and r.json()["items"], r.text
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=10)
+    args = parser.parse_args()
+
+    cwd = workdir()
+    asyncio.run(seed(cwd, args.rows))
+    print(json.dumps(asyncio.run(run(args.limit, args.repeat, args.pages)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
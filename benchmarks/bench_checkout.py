@@ -0,0 +1,72 @@
+"""Concurrent checkout against a product with limited stock.
+
+Fires many single-unit orders at once and checks that exactly `stock` of
+them succeed, the rest are rejected with 409 and stock never goes negative.
+
+    python -m benchmarks.bench_checkout --orders 1000 --stock 300 --concurrency 50
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import asgi_client, seed_users, summarize, workdir
+
+
+async def run(orders, stock, concurrency, users):
+    from database import init_db
+    from main import app
+
+    await init_db()
+    await seed_users(users)
+
+    async with asgi_client(app) as client:
+        r = await client.post("/product/", json={"name": "limited", "price": 100, "stock": stock})
+        product_id = r.json()["id"]
+
+        sem = asyncio.Semaphore(concurrency)
+        samples = []
+        statuses = []
+
+        async def checkout(i):
+            async with sem:
+                start = time.perf_counter()
+                r = await client.post("/order/", json={
+                    "user_id": i % users + 1, "product_id": product_id, "quantity": 1,
+                })
+                samples.append(time.perf_counter() - start)
+                statuses.append(r.status_code)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(checkout(i) for i in range(orders)))
+        elapsed = time.perf_counter() - start
+
+        remaining = (await client.get(f"/product/{product_id}")).json()["stock"]
+        placed = len((await client.get("/order/", params={"limit": 1000})).json()["items"])
+
+    sold = statuses.count(200)
+    rejected = statuses.count(409)
+    assert sold + rejected == orders, f"unexpected statuses: {set(statuses)}"
+    assert sold == min(orders, stock), "oversold or under-sold"
+    assert remaining == stock - sold and remaining >= 0, "stock out of sync"
+    assert placed == sold, "orders out of sync with stock"
+
+    return dict(summarize(samples, elapsed), sold=sold, rejected=rejected, remaining_stock=remaining)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--stock", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir()
+    print(json.dumps(asyncio.run(run(args.orders, args.stock, args.concurrency, args.users)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
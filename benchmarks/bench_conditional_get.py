@@ -0,0 +1,102 @@
+"""Repeated polling of an unchanged catalog with If-None-Match.
+
+Counts SQL statements issued while a client re-polls /product/ with the
+ETag it already has; unchanged polls should be answered with 304 and
+(almost) no database work. Then checks that a change made by another
+worker (the database changes, this process's response cache does not) is
+served with the new ETag and the new body once the table version is
+re-read, and that If-None-Match: * gives 404 for a missing product.
+
+    python -m benchmarks.bench_conditional_get --polls 2000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import QueryCounter, asgi_client, summarize, workdir
+
+
+async def poll(client, url, polls, etag=None):
+    samples = []
+    statuses = set()
+    transferred = 0
+    headers = {"If-None-Match": etag} if etag else {}
+    start = time.perf_counter()
+    for _ in range(polls):
+        t = time.perf_counter()
+        r = await client.get(url, headers=headers)
+        samples.append(time.perf_counter() - t)
+        statuses.add(r.status_code)
+        transferred += len(r.content)
+    return dict(summarize(samples, time.perf_counter() - start), bytes=transferred), statuses
+
+
+async def other_worker_update(product_id, description):
+    # Как запись в другом воркере: данные и версия таблицы меняются в базе,
+    # кеш ответов этого процесса никто не сбрасывает
+    from sqlalchemy import text
+    from database import engine
+
+    async with engine.begin() as conn:
+        await conn.execute(text("UPDATE products SET description = :d WHERE id = :id"), {"d": description, "id": product_id})
+        await conn.execute(text("UPDATE table_versions SET version = version + 1 WHERE name = 'products'"))
+
+
+async def run(polls, products):
+    from crud.version import VERSION_CACHE_TTL
+    from database import engine, init_db
+    from main import app
+
+    await init_db()
+    async with asgi_client(app) as client:
+        for i in range(products):
+            await client.post("/product/", json={"name": f"product-{i}", "price": 10, "stock": 1})
+        url = "/product/?limit=50"
+        first = await client.get(url)
+        etag = first.headers["etag"]
+
+        results = {}
+        with QueryCounter(engine) as counter:
+            results["unconditional"], _ = await poll(client, url, polls)
+        results["unconditional"]["queries"] = counter.count
+        with QueryCounter(engine) as counter:
+            results["if_none_match"], statuses = await poll(client, url, polls, etag)
+        results["if_none_match"]["queries"] = counter.count
+        assert statuses == {304}, statuses
+
+        await client.put("/product/1", json={"description": "changed"})
+        r = await client.get(url, headers={"If-None-Match": etag})
+        assert r.status_code == 200 and r.headers["etag"] != etag, "stale ETag after update"
+
+        for path in (url, "/product/2"):
+            etag = (await client.get(path)).headers["etag"]
+            await other_worker_update(2, f"changed by another worker for {path}")
+            await asyncio.sleep(VERSION_CACHE_TTL)
+            r = await client.get(path, headers={"If-None-Match": etag})
+            assert r.status_code == 200 and r.headers["etag"] != etag, "stale ETag after another worker's update"
+            assert f"changed by another worker for {path}" in r.text, "stale body under a new ETag"
+
+        r = await client.get("/product/2", headers={"If-None-Match": "*"})
+        assert r.status_code == 304, r.status_code
+        r = await client.get(f"/product/{products + 1000}", headers={"If-None-Match": "*"})
+        assert r.status_code == 404, r.status_code
+
+    assert results["if_none_match"]["queries"] <= polls * 0.05, "304 path is querying the database"
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--polls", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir()
+    print(json.dumps(asyncio.run(run(args.polls, args.products)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
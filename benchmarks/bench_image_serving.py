@@ -0,0 +1,189 @@
+"""Serving catalog images: resized variants vs re-fetching originals.
+
+Generates --images noisy photos of --size pixels (JPEG, a few MB each like
+camera uploads), uploads them to a uvicorn server through POST /images/ and
+reports upload latency for new and for duplicate content. Then clients
+fetch random images for each scenario:
+
+    original    the full-size file, what clients downloaded before
+    large       1280px variant
+    card        480px variant
+    thumb       160px variant
+    revalidate  thumb with If-None-Match, answered 304
+
+Reports requests/s, MB/s and latency per scenario. Asserts variant
+dimensions, immutable Cache-Control, a byte range of an original and that
+duplicate uploads return the same digest.
+
+Finally a second server with a one-slot image pool gets all photos
+uploaded at once (new content): every upload is either stored or answered
+503 with Retry-After within the queue timeout, and rejected uploads leave
+no original on disk.
+
+    python -m benchmarks.bench_image_serving --images 20 --requests 500
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks.common import free_port, start_server, summarize, workdir
+
+SCENARIOS = ("original", "large", "card", "thumb", "revalidate")
+
+
+def make_photo(size, seed):
+    # Шум сжимается плохо, поэтому размер файла близок к настоящим фотографиям
+    random.seed(seed)
+    bands = [Image.effect_noise(size, 40 + random.randint(0, 40)) for _ in range(3)]
+    out = io.BytesIO()
+    Image.merge("RGB", bands).save(out, "JPEG", quality=92)
+    return out.getvalue()
+
+
+async def upload(client, photos):
+    uploaded, samples = [], []
+    for data in photos:
+        start = time.perf_counter()
+        r = await client.post("/images/", files={"file": ("photo.jpg", data, "image/jpeg")})
+        samples.append(time.perf_counter() - start)
+        assert r.status_code == 200, r.text
+        uploaded.append(r.json())
+    duplicates = []
+    for data, image in zip(photos, uploaded):
+        start = time.perf_counter()
+        r = await client.post("/images/", files={"file": ("copy.jpg", data, "image/jpeg")})
+        duplicates.append(time.perf_counter() - start)
+        assert r.json() == image
+    return uploaded, {
+        "new_p50_ms": round(statistics.median(samples) * 1000, 1),
+        "duplicate_p50_ms": round(statistics.median(duplicates) * 1000, 1),
+    }
+
+
+async def check(client, image, data, sizes):
+    for name, url in image["images"].items():
+        r = await client.get(url)
+        assert r.status_code == 200 and r.headers["cache-control"].endswith("immutable"), (url, r.status_code)
+        if name != "original":
+            assert max(Image.open(io.BytesIO(r.content)).size) == min(sizes[name], max(image["width"], image["height"]))
+    r = await client.get(image["url"], headers={"Range": "bytes=1000-1999"})
+    assert r.status_code == 206 and r.content == data[1000:2000]
+
+
+async def serve(client, uploaded, scenario, requests, concurrency):
+    rng = random.Random(scenario)
+    sem = asyncio.Semaphore(concurrency)
+    samples, received = [], 0
+    etags = {}
+    if scenario == "revalidate":
+        for image in uploaded:
+            etags[image["digest"]] = (await client.get(image["images"]["thumb"])).headers["etag"]
+
+    async def one():
+        nonlocal received
+        image = rng.choice(uploaded)
+        if scenario == "revalidate":
+            url, headers, expected = image["images"]["thumb"], {"If-None-Match": etags[image["digest"]]}, 304
+        else:
+            url, headers, expected = image["images"][scenario], {}, 200
+        async with sem:
+            start = time.perf_counter()
+            r = await client.get(url, headers=headers)
+            samples.append(time.perf_counter() - start)
+        assert r.status_code == expected, (url, r.status_code)
+        received += len(r.content)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    result = summarize(samples, elapsed)
+    result["mb_per_s"] = round(received / elapsed / 1e6, 1)
+    result["kb_per_response"] = round(received / requests / 1e3, 1)
+    return result
+
+
+async def saturate(base_url, photos, root, timeout):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def one(data):
+            start = time.perf_counter()
+            r = await client.post("/images/", files={"file": ("photo.jpg", data, "image/jpeg")})
+            return r, time.perf_counter() - start
+
+        responses = await asyncio.gather(*(one(data) for data in photos))
+    statuses = [r.status_code for r, _ in responses]
+    assert set(statuses) <= {200, 503} and 200 in statuses and 503 in statuses, statuses
+    busy = [elapsed for r, elapsed in responses if r.status_code == 503]
+    assert all(r.headers.get("retry-after") for r, _ in responses if r.status_code == 503)
+    # Загрузка, получившая 503, оригинал не оставляет
+    originals = [name for _, _, names in os.walk(root) for name in names if "-" not in name]
+    assert len(originals) == statuses.count(200), (originals, statuses)
+    return {"uploads": len(photos), "stored": statuses.count(200), "busy": len(busy),
+            "busy_max_ms": round(max(busy) * 1000, 1), "queue_timeout_ms": timeout * 1000}
+
+
+async def run(base_url, photos, requests, concurrency):
+    from images import IMAGE_VARIANTS
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        uploaded, uploads = await upload(client, photos)
+        for image, data in zip(uploaded, photos):
+            await check(client, image, data, IMAGE_VARIANTS)
+        results = {"upload": uploads}
+        for scenario in SCENARIOS:
+            results[scenario] = await serve(client, uploaded, scenario, requests, concurrency)
+            print(scenario, json.dumps(results[scenario]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--size", type=int, nargs=2, default=(3000, 2000), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--queue-timeout", type=float, default=0.2, help="IMAGE_QUEUE_TIMEOUT of the one-slot server")
+    args = parser.parse_args()
+
+    cwd = workdir()
+    photos = [make_photo(tuple(args.size), seed) for seed in range(args.images)]
+    print(f"{args.images} photos, {sum(map(len, photos)) / len(photos) / 1e6:.1f} MB on average")
+    port = free_port()
+    server = start_server(cwd, port)
+    try:
+        results = asyncio.run(run(f"http://127.0.0.1:{port}", photos, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+    saturated = os.path.join(cwd, "saturated")
+    os.makedirs(saturated)
+    port = free_port()
+    server = start_server(saturated, port, env={
+        "IMAGE_WORKERS": "1", "IMAGE_QUEUE_LIMIT": "1", "IMAGE_QUEUE_TIMEOUT": str(args.queue_timeout),
+    })
+    try:
+        fresh = [make_photo(tuple(args.size), seed) for seed in range(args.images, 2 * args.images)]
+        results["saturated"] = asyncio.run(saturate(
+            f"http://127.0.0.1:{port}", fresh, os.path.join(saturated, "media", "images"), args.queue_timeout,
+        ))
+    finally:
+        server.terminate()
+        server.wait()
+    original = results["original"]
+    for name in SCENARIOS[1:]:
+        results[name]["rps_vs_original"] = round(results[name]["throughput_rps"] / original["throughput_rps"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""OFFSET vs keyset (cursor) pagination on a large products table.
+
+Times one page at increasing depths. OFFSET latency grows with the depth,
+keyset latency should stay flat for both the id and the name ordering.
+
+    python -m benchmarks.bench_keyset_pagination --rows 1000000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import random
+import string
+import time
+
+from benchmarks.common import workdir
+
+CHUNK = 50_000
+
+
+async def seed(rows):
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models.product import Product
+
+    rnd = random.Random(42)
+    async with SessionLocal() as db:
+        for start in range(0, rows, CHUNK):
+            await db.execute(insert(Product), [
+                {"name": "".join(rnd.choices(string.ascii_lowercase, k=12)), "price": 100, "stock": 1}
+                for _ in range(min(CHUNK, rows - start))
+            ])
+        await db.commit()
+
+
+async def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+async def run(rows, page_size, repeat):
+    from sqlalchemy import select
+    from database import SessionLocal, init_db
+    from models.product import Product
+    from crud.product import get_products
+    from pagination import encode_cursor
+
+    await init_db()
+    await seed(rows)
+
+    results = []
+    async with SessionLocal() as db:
+        for depth in (0, rows // 100, rows // 10, rows // 2, rows - page_size - 1):
+            name, row_id = (await db.execute(
+                select(Product.name, Product.id).order_by(Product.name, Product.id).offset(depth).limit(1)
+            )).one()
+            by_id = encode_cursor("id", depth, depth)
+            by_name = encode_cursor("name", name, row_id)
+            results.append({
+                "depth": depth,
+                "offset_ms": await timed(lambda: get_products(db, limit=page_size, skip=depth), repeat),
+                "keyset_id_ms": await timed(lambda: get_products(db, limit=page_size, cursor=by_id), repeat),
+                "offset_name_ms": await timed(lambda: get_products(db, limit=page_size, sort="name", skip=depth), repeat),
+                "keyset_name_ms": await timed(lambda: get_products(db, limit=page_size, cursor=by_name, sort="name"), repeat),
+            })
+            print(results[-1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir()
+    print(json.dumps(asyncio.run(run(args.rows, args.page_size, args.repeat)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
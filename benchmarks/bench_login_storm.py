@@ -0,0 +1,84 @@
+"""Login storm: many concurrent POST /auth/token while the catalog is polled.
+
+Reports login latency, 503 back-pressure rejections and the latency of a
+concurrent GET /product/ poller, which shows whether bcrypt is blocking the
+event loop. Run with --cache-ttl to enable the verified-credential cache
+and repeat logins for the same users.
+
+    python -m benchmarks.bench_login_storm --logins 200 --users 50 --cache-ttl 60
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import asgi_client, summarize, workdir
+
+
+async def run(logins, users, concurrency, cache_ttl):
+    from sqlalchemy import insert
+    from database import SessionLocal, init_db
+    from main import app
+    from models.user import User
+    import hashing
+
+    hashing.VERIFY_CACHE_TTL = cache_ttl
+    await init_db()
+    hashed = hashing.password_context().hash("secret")
+    async with SessionLocal() as db:
+        await db.execute(insert(User), [
+            {"username": f"player-{i}", "hashed_password": hashed, "points": 0} for i in range(users)
+        ])
+        await db.commit()
+
+    async with asgi_client(app) as client:
+        sem = asyncio.Semaphore(concurrency)
+        login_samples, statuses, poll_samples = [], [], []
+        done = asyncio.Event()
+
+        async def login(i):
+            async with sem:
+                start = time.perf_counter()
+                r = await client.post("/auth/token", data={"username": f"player-{i % users}", "password": "secret"})
+                login_samples.append(time.perf_counter() - start)
+                statuses.append(r.status_code)
+
+        async def poll_catalog():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/product/")
+                poll_samples.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        poller = asyncio.create_task(poll_catalog())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await poller
+        stats = (await client.get("/auth/hashing/stats")).json()
+
+    hashing.shutdown()
+    return {
+        "login": dict(summarize(login_samples, elapsed), ok=statuses.count(200), rejected_503=statuses.count(503)),
+        "catalog_during_storm": summarize(poll_samples, elapsed),
+        "hashing": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--cache-ttl", type=float, default=0)
+    args = parser.parse_args()
+
+    workdir()
+    print(json.dumps(asyncio.run(run(args.logins, args.users, args.concurrency, args.cache_ttl)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Cost of the metrics middleware and a check of what it reports.
+
+First wraps a trivial ASGI app in MetricsMiddleware and reports the added
+time per request with sampling off, with Server-Timing and with the
+slowest-N sampler on. Then drives the real app and asserts that /metrics
+has the route histogram, that a handler issuing one SELECT per row is
+reported as N+1 and that the sampler keeps the slowest request with its SQL.
+
+    python -m benchmarks.bench_metrics_overhead --calls 20000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import asgi_client, workdir
+
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def time_calls(app, calls):
+    scope = {"type": "http", "method": "GET", "path": "/"}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+async def overhead(calls):
+    from metrics import Metrics, MetricsMiddleware
+
+    base = await time_calls(bare_app, calls)
+    results = {"bare_us": round(base, 2)}
+    for name, registry, timing in (
+        ("metrics", Metrics(slow_sample_size=0), False),
+        ("metrics_server_timing", Metrics(slow_sample_size=0), True),
+        ("metrics_slow_sampler", Metrics(slow_sample_size=20), True),
+    ):
+        per_call = await time_calls(MetricsMiddleware(bare_app, registry, server_timing=timing), calls)
+        results[f"{name}_overhead_us"] = round(per_call - base, 2)
+    return results
+
+
+async def check_reports(products):
+    from sqlalchemy import select
+    from fastapi import Depends
+    from database import get_db, init_db
+    from main import app
+    from metrics import metrics, N_PLUS_ONE_THRESHOLD
+    from models.product import Product
+
+    # Намеренный N+1: по запросу на каждый товар
+    async def one_query_per_product(db=Depends(get_db)):
+        ids = (await db.execute(select(Product.id))).scalars().all()
+        return [(await db.execute(select(Product.name).filter(Product.id == i))).scalar_one() for i in ids]
+
+    app.add_api_route("/bench/n-plus-one", one_query_per_product)
+    await init_db()
+    metrics.slow_sample_size = 3
+    async with asgi_client(app) as client:
+        for i in range(max(products, N_PLUS_ONE_THRESHOLD)):
+            await client.post("/product/", json={"name": f"product-{i}", "price": 10, "stock": 1})
+        for _ in range(20):
+            await client.get("/product/1")
+        await client.get("/bench/n-plus-one")
+        text = (await client.get("/metrics")).text
+        slowest = (await client.get("/metrics/slow")).json()
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/product/{product_id}",status="2xx"} 20' in text
+    assert 'db_n_plus_one_requests_total{method="GET",route="/bench/n-plus-one"} 1' in text
+    assert "catalog_cache_hits_total" in text and "bcrypt_pool_submitted_total" in text
+    assert len(slowest) == 3 and all(sample["queries"] for sample in slowest), slowest
+    return {"metrics_lines": len(text.splitlines()), "slowest": [(s["method"], s["route"], s["duration_ms"]) for s in slowest]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir()
+    results = asyncio.run(overhead(args.calls))
+    results["reports"] = asyncio.run(check_reports(args.products))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Order history and stats: rollup tables vs GROUP BY over raw orders.
+
+Seeds --orders orders (a fifth of them with two items) for --users users and
+--products products, with the rollup tables filled to match. Then:
+
+1. Times the stats reads against the naive aggregation they replace:
+   one user's totals, the first page of per-user totals and the first page
+   of per-product totals (a GROUP BY over every order item).
+2. Times the first and a deep page of GET /order/user/{id}.
+3. Places and deletes random orders over HTTP and asserts the rollup tables
+   equal a GROUP BY over orders and order_items afterwards.
+4. Times POST /order/ with and without the rollup upserts, with order side
+   effects run inline in the order transaction (JOBS_INLINE).
+
+    python -m benchmarks.bench_order_stats --orders 5000000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from benchmarks.common import asgi_client, workdir
+
+CHUNK = 100_000
+POINTS_RATE = 0.25
+
+NAIVE = {
+    "user_totals": (
+        "SELECT count(*), coalesce(sum(quantity), 0), coalesce(sum(total), 0), coalesce(sum(points), 0) "
+        "FROM orders WHERE user_id = :user_id"
+    ),
+    "users_page": (
+        "SELECT user_id, count(*), sum(quantity), sum(total), sum(points) "
+        "FROM orders GROUP BY user_id ORDER BY user_id LIMIT :limit"
+    ),
+    "products_page": (
+        "SELECT product_id, count(DISTINCT order_id), sum(quantity), sum(quantity * price), "
+        f"sum(CAST(quantity * price * {POINTS_RATE} AS INTEGER)) "
+        "FROM order_items GROUP BY product_id ORDER BY product_id LIMIT :limit"
+    ),
+}
+
+
+async def seed(cwd, orders, users, products):
+    from sqlalchemy import insert
+    from database import make_engine
+    from migrations import upgrade
+    from models.product import Product
+    from models.user import User
+
+    rng = random.Random(5)
+    prices = [rng.randint(10, 500) for _ in range(products)]
+    user_stats, product_stats = {}, {}
+    seed_engine = make_engine(f"sqlite+aiosqlite:///{cwd}/test.db")
+    await upgrade(seed_engine)
+    async with seed_engine.begin() as conn:
+        await conn.execute(insert(User), [{"username": f"user-{i}", "hashed_password": "-", "points": 0} for i in range(users)])
+        await conn.execute(insert(Product), [
+            {"name": f"product-{i}", "price": price, "stock": 10_000_000} for i, price in enumerate(prices)
+        ])
+        item_id = 0
+        for start in range(1, orders + 1, CHUNK):
+            order_rows, item_rows = [], []
+            for order_id in range(start, min(orders + 1, start + CHUNK)):
+                user_id = rng.randint(1, users)
+                lines = {rng.randint(1, products): rng.randint(1, 3) for _ in range(2 if rng.random() < 0.2 else 1)}
+                total = sum(qty * prices[product_id - 1] for product_id, qty in lines.items())
+                points = int(total * POINTS_RATE)
+                quantity = sum(lines.values())
+                order_rows.append((order_id, user_id, next(iter(lines)) if len(lines) == 1 else None, quantity, total, points))
+                stats = user_stats.setdefault(user_id, [0, 0, 0, 0])
+                for i, value in enumerate((1, quantity, total, points)):
+                    stats[i] += value
+                for product_id, qty in lines.items():
+                    item_id += 1
+                    item_rows.append((item_id, order_id, product_id, qty, prices[product_id - 1]))
+                    value = qty * prices[product_id - 1]
+                    stats = product_stats.setdefault(product_id, [0, 0, 0, 0])
+                    for i, delta in enumerate((1, qty, value, int(value * POINTS_RATE))):
+                        stats[i] += delta
+            # Кортежи через драйвер: миллионы строк через insert(Model) сеялись бы в разы дольше
+            await conn.exec_driver_sql(
+                "INSERT INTO orders (id, user_id, product_id, quantity, total, points) VALUES (?, ?, ?, ?, ?, ?)", order_rows
+            )
+            await conn.exec_driver_sql(
+                "INSERT INTO order_items (id, order_id, product_id, quantity, price) VALUES (?, ?, ?, ?, ?)", item_rows
+            )
+        await conn.exec_driver_sql(
+            "INSERT INTO user_order_stats (user_id, orders, quantity, revenue, points) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, *stats) for user_id, stats in user_stats.items()],
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO product_order_stats (product_id, orders, quantity, revenue, points) VALUES (?, ?, ?, ?, ?)",
+            [(product_id, *stats) for product_id, stats in product_stats.items()],
+        )
+        await conn.exec_driver_sql("ANALYZE")
+    await seed_engine.dispose()
+
+
+async def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+async def reads(users, limit, repeat):
+    from sqlalchemy import text
+    from database import SessionLocal
+    from crud.order import get_order_stats_json, get_orders_json, get_user_order_stats
+
+    rng = random.Random(9)
+    results = {}
+    async with SessionLocal() as db:
+        sample = [rng.randint(1, users) for _ in range(repeat)]
+        picks = iter(sample * 2)
+        rollup = await timed(lambda: get_user_order_stats(db, next(picks)), repeat)
+        naive = await timed(lambda: db.execute(text(NAIVE["user_totals"]), {"user_id": next(picks)}), repeat)
+        results["user_totals"] = {"rollup_ms": rollup, "group_by_ms": naive}
+        for name, by in (("users_page", "user"), ("products_page", "product")):
+            rollup = await timed(lambda: get_order_stats_json(db, by, limit=limit), repeat)
+            naive = await timed(lambda: db.execute(text(NAIVE[name]), {"limit": limit}), max(1, repeat // 10))
+            page = json.loads(await get_order_stats_json(db, by, limit=limit))["items"]
+            expected = (await db.execute(text(NAIVE[name]), {"limit": limit})).all()
+            assert [tuple(item.values()) for item in page] == [tuple(row) for row in expected], name
+            results[name] = {"rollup_ms": rollup, "group_by_ms": naive}
+            print(name, results[name])
+
+        # История самого активного пользователя: первая и глубокая страница
+        user_id = (await db.execute(text("SELECT user_id FROM user_order_stats ORDER BY orders DESC LIMIT 1"))).scalar()
+        first = await timed(lambda: get_orders_json(db, limit=limit, user_id=user_id), repeat)
+        cursor, pages = None, 0
+        while True:
+            page = json.loads(await get_orders_json(db, limit=limit, cursor=cursor, user_id=user_id))
+            assert all(item["user_id"] == user_id for item in page["items"])
+            pages += 1
+            if not page["next_cursor"]:
+                break
+            cursor = page["next_cursor"]
+        deep = await timed(lambda: get_orders_json(db, limit=limit, cursor=cursor, user_id=user_id), repeat)
+        results["history"] = {"user_id": user_id, "pages": pages, "first_page_ms": first, "last_page_ms": deep}
+    return results
+
+
+async def consistency(users, products, requests):
+    from sqlalchemy import text
+    from database import SessionLocal
+    from jobs import run_pending
+    from main import app
+
+    rng = random.Random(11)
+    placed = []
+    async with asgi_client(app) as client:
+        for _ in range(requests):
+            if placed and rng.random() < 0.2:
+                r = await client.delete(f"/order/{placed.pop(rng.randrange(len(placed)))}")
+            else:
+                items = [{"product_id": rng.randint(1, products), "quantity": rng.randint(1, 3)} for _ in range(rng.randint(1, 3))]
+                r = await client.post("/order/", json={"user_id": rng.randint(1, users), "items": items})
+                placed.append(r.json()["order_id"])
+            assert r.status_code == 200, r.text
+    # Итоги обновляют задачи очереди: ASGI-клиент не запускает воркеров
+    await run_pending()
+    async with SessionLocal() as db:
+        for rollup, naive in (
+            ("SELECT user_id, orders, quantity, revenue, points FROM user_order_stats WHERE orders > 0 ORDER BY user_id",
+             NAIVE["users_page"].replace(" LIMIT :limit", "")),
+            ("SELECT product_id, orders, quantity, revenue, points FROM product_order_stats WHERE orders > 0 ORDER BY product_id",
+             NAIVE["products_page"].replace(" LIMIT :limit", "")),
+        ):
+            assert (await db.execute(text(rollup))).all() == (await db.execute(text(naive))).all()
+    return {"requests": requests}
+
+
+async def checkout(users, products, requests):
+    # Побочные эффекты заказа в его транзакции, как без очереди задач
+    import crud.order
+    import jobs
+    from main import app
+
+    jobs.JOBS_INLINE = True
+
+    async def skip_stats(*args, **kwargs):
+        return None
+
+    rng = random.Random(13)
+    results = {}
+    add_order_stats = crud.order.add_order_stats
+    async with asgi_client(app) as client:
+        for name in ("without_rollups", "with_rollups", "without_rollups_again", "with_rollups_again"):
+            crud.order.add_order_stats = add_order_stats if name.startswith("with_") else skip_stats
+            samples = []
+            for _ in range(requests):
+                items = [{"product_id": rng.randint(1, products), "quantity": 1} for _ in range(2)]
+                start = time.perf_counter()
+                r = await client.post("/order/", json={"user_id": rng.randint(1, users), "items": items})
+                samples.append(time.perf_counter() - start)
+                assert r.status_code == 200, r.text
+            results[name.removesuffix("_again")] = results.get(name.removesuffix("_again"), []) + samples
+    crud.order.add_order_stats = add_order_stats
+    return {name: round(statistics.median(samples) * 1000, 3) for name, samples in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=5_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=300, help="HTTP orders for the consistency and checkout runs")
+    args = parser.parse_args()
+
+    cwd = workdir()
+    start = time.perf_counter()
+    asyncio.run(seed(cwd, args.orders, args.users, args.products))
+    print(f"seeded {args.orders} orders in {time.perf_counter() - start:.1f}s")
+    results = {"reads": asyncio.run(reads(args.users, args.limit, args.repeat))}
+    results["consistency"] = asyncio.run(consistency(args.users, args.products, args.requests))
+    results["checkout_p50_ms"] = asyncio.run(checkout(args.users, args.products, args.requests))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Awarding points to many users: per-user /points/add loop vs /points/batch.
+
+    python -m benchmarks.bench_points_batch --users 10000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import asgi_client, seed_users, workdir
+
+
+async def run(users):
+    from database import init_db
+    from main import app
+
+    await init_db()
+    await seed_users(users)
+    ids = range(1, users + 1)
+
+    async with asgi_client(app) as client:
+        start = time.perf_counter()
+        for user_id in ids:
+            r = await client.post("/points/add", params={"user_id": user_id, "points": 10})
+            r.raise_for_status()
+        loop_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        r = await client.post("/points/batch", json=[{"user_id": user_id, "points": 10} for user_id in ids])
+        r.raise_for_status()
+        batch_elapsed = time.perf_counter() - start
+        assert r.json()["applied"] == users
+
+        for user_id in (1, users):
+            assert (await client.get(f"/points/{user_id}")).json()["points"] == 20
+
+    return {
+        "users": users,
+        "loop_s": round(loop_elapsed, 3),
+        "batch_s": round(batch_elapsed, 3),
+        "speedup": round(loop_elapsed / batch_elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    args = parser.parse_args()
+
+    workdir()
+    print(json.dumps(asyncio.run(run(args.users)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
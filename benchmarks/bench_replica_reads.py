@@ -0,0 +1,103 @@
+"""Read scaling with N replica engines, using SQLite file copies.
+
+Seeds a primary database, copies it to N replica files and starts uvicorn
+with DATABASE_REPLICA_URLS pointing at them, then measures GET /points/{id}
+(a replica-routed read) for 0..N replicas. The copies never receive
+writes, which also lets us check read-your-writes: after POST /points/add
+the client gets the sticky cookie and reads the new balance from the
+primary, while a client without the cookie still sees the replica's value.
+
+    python -m benchmarks.bench_replica_reads --replicas 3 --requests 2000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import time
+
+import httpx
+
+from benchmarks.common import free_port, start_server, summarize, workdir
+
+
+async def seed(cwd, users):
+    from sqlalchemy import insert
+    from database import make_engine
+    from migrations import upgrade
+    from models.user import User
+
+    seed_engine = make_engine(f"sqlite+aiosqlite:///{cwd}/test.db")
+    await upgrade(seed_engine)
+    async with seed_engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {"username": f"user-{i}", "hashed_password": "-", "points": 100} for i in range(users)
+        ])
+    await seed_engine.dispose()
+
+
+async def read_load(base_url, total, concurrency, users):
+    rng = random.Random(7)
+    samples = []
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def one():
+            async with sem:
+                start = time.perf_counter()
+                r = await client.get(f"/points/{rng.randint(1, users)}")
+                r.raise_for_status()
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+    return summarize(samples, elapsed)
+
+
+def check_read_your_writes(base_url, user_id):
+    with httpx.Client(base_url=base_url) as writer, httpx.Client(base_url=base_url) as other:
+        r = writer.post("/points/add", params={"user_id": user_id, "points": 5})
+        r.raise_for_status()
+        assert "db_primary" in r.cookies, r.headers
+        assert writer.get(f"/points/{user_id}").json()["points"] == 105
+        assert other.get(f"/points/{user_id}").json()["points"] == 100
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    cwd = workdir()
+    asyncio.run(seed(cwd, args.users))
+    replicas = []
+    for i in range(args.replicas):
+        path = os.path.join(cwd, f"replica-{i}.db")
+        shutil.copyfile(os.path.join(cwd, "test.db"), path)
+        replicas.append(f"sqlite+aiosqlite:///{path}")
+
+    results = {}
+    for count in range(args.replicas + 1):
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(cwd, port, env={"DATABASE_REPLICA_URLS": ",".join(replicas[:count])})
+        try:
+            results[count] = asyncio.run(read_load(base_url, args.requests, args.concurrency, args.users))
+            if count:
+                check_read_your_writes(base_url, user_id=count)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"replicas={count}: {results[count]}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
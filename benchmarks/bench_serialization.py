@@ -0,0 +1,162 @@
+"""ORM + Pydantic serialization vs column rows encoded straight to JSON.
+
+Seeds products, billboards and orders, then times building one response
+body of 1k and 10k rows both ways: the old path (ORM objects validated
+through Page[...Response] with from_attributes, or order dicts re-validated
+as OrderResponse like FastAPI's response_model does) and the fast path used
+by the endpoints now (select() by columns, pydantic_core.to_json). Asserts
+the fast path produces the same JSON, byte for byte for the catalog.
+
+    python -m benchmarks.bench_serialization --sizes 1000 10000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import asgi_client, workdir
+
+
+async def seed(cwd, rows):
+    from sqlalchemy import insert
+    from database import make_engine
+    from migrations import upgrade
+    from models.billboard import Billboard
+    from models.order import Order, OrderItem
+    from models.product import Product
+    from models.user import User
+
+    seed_engine = make_engine(f"sqlite+aiosqlite:///{cwd}/test.db")
+    await upgrade(seed_engine)
+    async with seed_engine.begin() as conn:
+        await conn.execute(insert(User), [{"username": "bench", "hashed_password": "-"}])
+        await conn.execute(insert(Product), [
+            {"name": f"product-{i:06d}", "description": "Описание товара", "price": 100 + i % 900, "stock": i % 7}
+            for i in range(rows)
+        ])
+        await conn.execute(insert(Billboard), [
+            {"name": f"billboard-{i:06d}", "text_color": "#fff", "background_color": "#000"} for i in range(rows)
+        ])
+        await conn.execute(insert(Order), [{"id": i + 1, "user_id": 1, "quantity": 3} for i in range(rows)])
+        await conn.execute(insert(OrderItem), [
+            {"order_id": i // 2 + 1, "product_id": i % rows + 1, "quantity": 1 + i % 2, "price": 100}
+            for i in range(rows * 2)
+        ])
+    await seed_engine.dispose()
+
+
+async def legacy_catalog_json(db, model, schema, limit):
+    # Как было: ORM-объекты через Page[Response].model_validate(from_attributes)
+    from sqlalchemy import select
+    from pagination import fetch_page
+    from schemas.pagination import Page
+
+    objects, next_cursor = await fetch_page(db, select(model), model.id, model.id, "id", None, limit)
+    page = Page[schema].model_validate({"items": objects, "next_cursor": next_cursor}, from_attributes=True)
+    return page.model_dump_json().encode()
+
+
+async def legacy_orders_json(db, limit):
+    # Как было: selectinload, словари и повторная валидация как у response_model
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from models.order import Order
+    from pagination import fetch_page
+    from routers.order_router import order_to_dict
+    from schemas.order import OrderResponse
+    from schemas.pagination import Page
+
+    stmt = select(Order).options(selectinload(Order.items))
+    orders, next_cursor = await fetch_page(db, stmt, Order.id, Order.id, "id", None, limit)
+    content = {"items": [order_to_dict(order) for order in orders], "next_cursor": next_cursor}
+    page = Page[OrderResponse].model_validate(content)
+    return json.dumps(page.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def timed(fn, repeat, session_factory):
+    # Новая сессия на каждый повтор: identity map не должна помогать ORM-пути
+    best, data = float("inf"), None
+    for _ in range(repeat):
+        async with session_factory() as db:
+            start = time.perf_counter()
+            data = await fn(db)
+            best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2), data
+
+
+def normalized(data):
+    # Порядок позиций заказа в старом пути не задан
+    page = json.loads(data)
+    for order in page["items"]:
+        order["items"].sort(key=lambda item: (item["product_id"], item["quantity"]))
+    return page
+
+
+async def run(sizes, repeat):
+    from database import SessionLocal
+    from crud.billboard import billboard_cache, get_billboards_json
+    from crud.order import get_orders_json
+    from crud.product import product_cache, get_products_json
+    from main import app
+    from pagination import MAX_PAGE_SIZE
+    from models.billboard import Billboard
+    from models.product import Product
+    from schemas.billboard import BillboardResponse
+    from schemas.product import ProductResponse
+
+    def uncached(cache, load):
+        async def fn(db, limit):
+            cache.clear()
+            return await load(db, limit=limit)
+        return fn
+
+    cases = {
+        "products": (
+            lambda db, limit: legacy_catalog_json(db, Product, ProductResponse, limit),
+            uncached(product_cache, get_products_json),
+        ),
+        "billboards": (
+            lambda db, limit: legacy_catalog_json(db, Billboard, BillboardResponse, limit),
+            uncached(billboard_cache, get_billboards_json),
+        ),
+        "orders": (legacy_orders_json, lambda db, limit: get_orders_json(db, limit=limit)),
+    }
+    results = {}
+    for size in sizes:
+        for name, (legacy, fast) in cases.items():
+            legacy_ms, expected = await timed(lambda db: legacy(db, size), repeat, SessionLocal)
+            fast_ms, data = await timed(lambda db: fast(db, size), repeat, SessionLocal)
+            if name == "orders":
+                assert normalized(data) == normalized(expected), name
+            else:
+                assert data == expected, name
+            results[f"{name}_{size}"] = {
+                "orm_pydantic_ms": legacy_ms, "fast_ms": fast_ms,
+                "speedup": round(legacy_ms / fast_ms, 1), "bytes": len(data),
+            }
+            print(name, size, results[f"{name}_{size}"])
+
+    # Эндпоинт отдаёт то же, что функция быстрого пути
+    async with asgi_client(app) as client:
+        limit = min(min(sizes), MAX_PAGE_SIZE)
+        r = await client.get("/order/", params={"limit": limit})
+        async with SessionLocal() as db:
+            assert r.json() == json.loads(await get_orders_json(db, limit=limit))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cwd = workdir()
+    asyncio.run(seed(cwd, max(args.sizes)))
+    print(json.dumps(asyncio.run(run(args.sizes, args.repeat)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Mixed read/write throughput under different SQLite settings.
+
+For each configuration a fresh database is seeded and uvicorn is started
+with the matching SQLITE_* environment. Clients then issue a mix of reads
+(GET /points/{id}, GET /order/) and writes (POST /points/add, POST /order/)
+and we report latency, throughput and how many requests failed, e.g. with
+"database is locked".
+
+    python -m benchmarks.bench_sqlite_mixed --requests 2000 --workers 2
+
+Configurations: baseline (rollback journal, synchronous=FULL, no mmap, the
+SQLite default cache), tuned (database.py defaults) and single_writer (tuned
+plus SQLITE_SINGLE_WRITER=1).
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+from benchmarks.common import free_port, start_server, summarize, workdir
+
+CONFIGS = {
+    "baseline": {
+        "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_MMAP_SIZE": "0", "SQLITE_CACHE_SIZE": "-2000",
+    },
+    "tuned": {},
+    "single_writer": {"SQLITE_SINGLE_WRITER": "1"},
+}
+
+
+async def seed(cwd, users):
+    from sqlalchemy import insert
+    from database import make_engine
+    from migrations import upgrade
+    from models.product import Product
+    from models.user import User
+
+    seed_engine = make_engine(f"sqlite+aiosqlite:///{cwd}/test.db")
+    await upgrade(seed_engine)
+    async with seed_engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {"username": f"user-{i}", "hashed_password": "-", "points": 1_000_000} for i in range(users)
+        ])
+        await conn.execute(insert(Product), [{"name": "mixed", "price": 10, "stock": 10_000_000}])
+    await seed_engine.dispose()
+
+
+async def run_mix(base_url, total, concurrency, users, write_ratio):
+    rng = random.Random(42)
+    samples = {"read": [], "write": []}
+    errors = {}
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def one(i):
+            user_id = rng.randint(1, users)
+            write = rng.random() < write_ratio
+            async with sem:
+                start = time.perf_counter()
+                if write and i % 2:
+                    r = await client.post("/points/add", params={"user_id": user_id, "points": 1})
+                elif write:
+                    r = await client.post("/order/", json={"user_id": user_id, "product_id": 1, "quantity": 1})
+                elif i % 2:
+                    r = await client.get(f"/points/{user_id}")
+                else:
+                    r = await client.get("/order/", params={"limit": 20})
+                samples["write" if write else "read"].append(time.perf_counter() - start)
+                if r.status_code != 200:
+                    errors[r.status_code] = errors.get(r.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    return {
+        "total": summarize(samples["read"] + samples["write"], elapsed),
+        "read": summarize(samples["read"], elapsed),
+        "write": summarize(samples["write"], elapsed),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--configs", default=",".join(CONFIGS))
+    args = parser.parse_args()
+
+    root = workdir()
+    results = {}
+    for name in args.configs.split(","):
+        cwd = os.path.join(root, name)
+        os.mkdir(cwd)
+        asyncio.run(seed(cwd, args.users))
+        port = free_port()
+        server = start_server(cwd, port, workers=args.workers, env=CONFIGS[name])
+        try:
+            results[name] = asyncio.run(run_mix(
+                f"http://127.0.0.1:{port}", args.requests, args.concurrency, args.users, args.write_ratio,
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{name}: {results[name]['total']} errors={results[name]['errors']}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
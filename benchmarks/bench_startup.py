@@ -0,0 +1,145 @@
+"""Startup cost of an application worker: imports and time to first request.
+
+1. Runs `python -X importtime -c "import main"` --runs times and reports the
+   median cumulative import time of main, plus the packages with the largest
+   self time in the last run.
+2. Checks that modules only some requests need (jose/cryptography, passlib/
+   bcrypt, the process pools, the PostgreSQL dialect, Pillow) are not
+   imported by `import main`.
+3. Starts `uvicorn main:create_app --factory` --runs times on a migrated
+   database and measures the time from spawning the process to the first
+   200 from GET /product/ (interpreter start, imports, lifespan with schema
+   check and pool warm-up, the request itself).
+
+Exits with status 1 when the medians exceed --import-budget-ms or
+--first-request-budget-ms. Both are machine-specific: the defaults leave
+headroom for one worker on a 1-CPU container. With --workers the workers
+import in parallel and on few CPUs the first request comes later, so raise
+the budget accordingly.
+
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --workers 4
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import ROOT, free_port, workdir
+
+# Импортируются при первом запросе, которому они нужны, а не при старте
+LAZY_MODULES = (
+    "jose",
+    "cryptography",
+    "passlib",
+    "bcrypt",
+    "multiprocessing",
+    "concurrent.futures.process",
+    "sqlalchemy.dialects.postgresql",
+    "PIL",
+)
+
+
+def import_times(env, runs):
+    totals = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        packages = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            package = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0) + int(self_us)
+            if name.strip() == "main":
+                totals.append(int(cumulative_us) / 1000)
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:10]
+    return round(statistics.median(totals), 1), {name: round(us / 1000, 1) for name, us in top}
+
+
+def loaded_lazy_modules(env):
+    check = f"import sys, main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", check], env=env, capture_output=True, text=True, check=True)
+    return [name for name in output.stdout.strip().split(",") if name]
+
+
+def first_request(cwd, env, workers, runs):
+    samples = []
+    for _ in range(runs):
+        port = free_port()
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:create_app", "--factory", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=cwd, env=env,
+        )
+        # Один клиент на все попытки: httpx.get на каждую создавал бы SSL-контекст
+        # и отнимал CPU у запускающегося сервера
+        client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if client.get("/product/?limit=1").status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline or proc.poll() is not None:
+                    raise RuntimeError("uvicorn did not serve a request")
+                time.sleep(0.005)
+            samples.append(time.perf_counter() - start)
+        finally:
+            client.close()
+            proc.terminate()
+            proc.wait()
+    return round(statistics.median(samples) * 1000, 1), round(max(samples) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--import-budget-ms", type=float, default=1500)
+    parser.add_argument("--first-request-budget-ms", type=float, default=2000)
+    args = parser.parse_args()
+
+    cwd = workdir()
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, "-m", "migrations"], cwd=cwd, env=env, check=True, capture_output=True)
+
+    import_ms, top_packages = import_times(env, args.runs)
+    lazy = loaded_lazy_modules(env)
+    first_ms, first_max_ms = first_request(cwd, env, args.workers, args.runs)
+    results = {
+        "import_main_ms": import_ms,
+        "import_self_ms_by_package": top_packages,
+        "lazy_modules_imported": lazy,
+        "first_request_ms": first_ms,
+        "first_request_max_ms": first_max_ms,
+        "workers": args.workers,
+    }
+    print(json.dumps(results, indent=2))
+
+    assert not lazy, f"imported at startup: {lazy}"
+    over = []
+    if import_ms > args.import_budget_ms:
+        over.append(f"import main {import_ms} ms > {args.import_budget_ms} ms")
+    if first_ms > args.first_request_budget_ms:
+        over.append(f"first request {first_ms} ms > {args.first_request_budget_ms} ms")
+    if over:
+        print("over budget: " + "; ".join(over), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
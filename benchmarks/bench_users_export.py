@@ -0,0 +1,96 @@
+"""Query counts and peak memory for listing users with their orders.
+
+Asserts that GET /auth/users issues a fixed number of queries per page (no
+N+1) and that the streaming export keeps peak memory flat compared with
+materializing the whole result.
+
+    python -m benchmarks.bench_users_export --users 100000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+import tracemalloc
+
+from benchmarks.common import QueryCounter, asgi_client, seed_users, workdir
+
+
+async def seed_orders(users, per_user):
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models.order import Order
+    from models.product import Product
+
+    async with SessionLocal() as db:
+        await db.execute(insert(Product), [{"name": "p", "price": 10, "stock": 0}])
+        await db.execute(insert(Order), [
+            {"user_id": user_id, "product_id": 1, "quantity": 1}
+            for user_id in range(1, users + 1)
+            for _ in range(per_user)
+        ])
+        await db.commit()
+
+
+async def peak_memory(consume):
+    tracemalloc.start()
+    start = time.perf_counter()
+    await consume()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 2**20, 2), round(elapsed, 3)
+
+
+async def run(users, per_user):
+    from database import engine, init_db
+    from main import app
+    from routers.auth_router import USERS_EXPORT_BATCH_SIZE, iter_users_with_orders
+    from streaming import ndjson_stream
+
+    await init_db()
+    await seed_users(users)
+    await seed_orders(users, per_user)
+
+    results = {}
+    async with asgi_client(app) as client:
+        with QueryCounter(engine) as counter:
+            r = await client.get("/auth/users", params={"limit": 1000})
+            r.raise_for_status()
+        results["users_page_queries"] = counter.count
+        assert counter.count == 2, f"N+1 in /auth/users: {counter.count} queries"
+
+    async def stream():
+        total = 0
+        async for chunk in ndjson_stream(iter_users_with_orders()):
+            total += len(chunk)
+        results["export_bytes"] = total
+
+    async def materialize():
+        rows = [row async for row in iter_users_with_orders()]
+        results["materialized_bytes"] = len(json.dumps(rows))
+
+    with QueryCounter(engine) as counter:
+        results["stream_peak_mb"], results["stream_s"] = await peak_memory(stream)
+    expected = 2 * math.ceil(users / USERS_EXPORT_BATCH_SIZE) + 1
+    results["export_queries"] = counter.count
+    assert counter.count == expected, f"export issued {counter.count} queries, expected {expected}"
+
+    results["materialized_peak_mb"], results["materialized_s"] = await peak_memory(materialize)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--orders-per-user", type=int, default=2)
+    args = parser.parse_args()
+
+    workdir()
+    print(json.dumps(asyncio.run(run(args.users, args.orders_per_user)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Leaderboard ranks against a brute-force reference under random updates.
+
+1. RankedList with tiny buckets (so they split and empty out constantly)
+   against a plain sorted list: random add/remove/bisect/slice.
+2. The API against the database: random add/redeem/batch/order/register/
+   delete requests, plus ledger writes made directly in the database as if
+   by another worker. After each round every checked user's
+   GET /points/{id}/rank and a full walk of GET /points/leaderboard must
+   equal ranks computed from a SELECT of all users. After each round the
+   whole ledger is compacted, so the next round's writes from the other
+   worker follow a compaction (ledger ids must not be reused).
+3. Latency of one rank lookup and one top-20 page: in memory vs SQL
+   (COUNT(*) WHERE points > ? and ORDER BY points DESC over the index).
+
+    python -m benchmarks.check_leaderboard --users 100000
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import random
+import time
+
+from benchmarks.common import asgi_client, workdir
+
+
+def check_ranked_list(ops, seed):
+    from leaderboard import RankedList
+
+    rng = random.Random(seed)
+    ranked, reference = RankedList(bucket_size=4), []
+    for _ in range(ops):
+        key = (-rng.randint(0, 50), rng.randint(1, 200))
+        if key in reference:
+            ranked.remove(key)
+            reference.remove(key)
+        else:
+            ranked.add(key)
+            bisect.insort(reference, key)
+        probe = (-rng.randint(0, 50), rng.randint(0, 201))
+        assert ranked.bisect_left(probe) == bisect.bisect_left(reference, probe)
+        assert ranked.bisect_right(probe) == bisect.bisect_right(reference, probe)
+        start, count = rng.randint(0, len(reference) + 2), rng.randint(0, 30)
+        assert ranked.slice(start, count) == reference[start:start + count]
+        assert len(ranked) == len(reference)
+    return {"ops": ops, "final_size": len(reference)}
+
+
+async def seed(cwd, users, prefix="user"):
+    from sqlalchemy import insert
+    from database import make_engine
+    from migrations import upgrade
+    from models.product import Product
+    from models.user import User
+
+    rng = random.Random(1)
+    seed_engine = make_engine(f"sqlite+aiosqlite:///{cwd}/test.db")
+    await upgrade(seed_engine)
+    async with seed_engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {"username": f"{prefix}-{i}", "hashed_password": "-", "points": rng.choice([0, 0, 10, 50, rng.randint(0, 5000)])}
+            for i in range(users)
+        ])
+        if prefix == "user":
+            await conn.execute(insert(Product), [{"name": "ticket", "price": 40, "stock": 10_000_000}])
+    await seed_engine.dispose()
+
+
+async def reference(db):
+    from sqlalchemy import select
+    from models.user import User
+
+    rows = (await db.execute(select(User.id, User.points))).all()
+    order = sorted(((-(points or 0), user_id) for user_id, points in rows))
+    negatives = [negative for negative, _ in order]
+    ranks = {user_id: bisect.bisect_left(negatives, negative) + 1 for negative, user_id in order}
+    return order, ranks
+
+
+async def other_worker_write(db, user_id, delta):
+    # Запись мимо этого процесса: баланс и журнал, как у apply_points в другом воркере
+    from sqlalchemy import insert, update
+    from models.points import PointsLedgerEntry
+    from models.user import User
+
+    balance = (await db.execute(
+        update(User).filter(User.id == user_id).values(points=User.points + delta).returning(User.points)
+    )).scalar_one_or_none()
+    if balance is None or balance < 0:
+        await db.rollback()
+        return
+    await db.execute(insert(PointsLedgerEntry).values(user_id=user_id, delta=delta, balance_after=balance, reason="other"))
+    await db.commit()
+
+
+async def check_api(rounds, ops_per_round, probes, seed_value):
+    from datetime import datetime, timedelta
+    import leaderboard as leaderboard_module
+    from crud.points import compact_ledger
+    from database import SessionLocal
+    from jobs import run_pending
+    from main import app
+
+    # Журнал других воркеров дочитывается при каждом запросе
+    refresh_interval = leaderboard_module.LEADERBOARD_REFRESH_INTERVAL
+    leaderboard_module.LEADERBOARD_REFRESH_INTERVAL = 0.0
+    rng = random.Random(seed_value)
+    registered = 0
+    checked = 0
+    # Удаление пользователя с заказами не поддерживается (orders.user_id NOT NULL)
+    ordered = set()
+    async with asgi_client(app) as client:
+        async with SessionLocal() as db:
+            _, ranks = await reference(db)
+        for _ in range(rounds):
+            user_ids = list(ranks)
+            for _ in range(ops_per_round):
+                user_id = rng.choice(user_ids)
+                op = rng.random()
+                if op < 0.3:
+                    await client.post("/points/add", params={"user_id": user_id, "points": rng.randint(1, 300)})
+                elif op < 0.45:
+                    await client.post("/points/redeem", params={"user_id": user_id, "points": rng.randint(1, 300)})
+                elif op < 0.6:
+                    await client.post("/points/batch", json=[
+                        {"user_id": rng.choice(user_ids), "points": rng.randint(-100, 200)} for _ in range(5)
+                    ])
+                elif op < 0.75:
+                    r = await client.post("/order/", json={"user_id": user_id, "product_id": 1, "quantity": rng.randint(1, 3)})
+                    if r.status_code == 200:
+                        ordered.add(user_id)
+                elif op < 0.9:
+                    async with SessionLocal() as db:
+                        await other_worker_write(db, user_id, rng.randint(-50, 500))
+                elif op < 0.95:
+                    registered += 1
+                    await client.post("/auth/register", json={"username": f"new-{registered}", "password": "pw"})
+                elif user_id not in ordered:
+                    await client.delete(f"/auth/users/{user_id}")
+
+            # Баллы за заказы начисляют задачи очереди: ASGI-клиент не запускает воркеров
+            await run_pending()
+            async with SessionLocal() as db:
+                order, ranks = await reference(db)
+            for user_id in rng.sample(list(ranks), min(probes, len(ranks))):
+                body = (await client.get(f"/points/{user_id}/rank")).json()
+                assert body["rank"] == ranks[user_id] and body["points"] == -order[ranks[user_id] - 1][0], (user_id, body)
+                assert body["total"] == len(order), body
+                checked += 1
+            walked, cursor = [], None
+            while True:
+                page = (await client.get("/points/leaderboard", params={"limit": 500, **({"cursor": cursor} if cursor else {})})).json()
+                walked += page["items"]
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            assert [(-item["points"], item["user_id"]) for item in walked] == order
+            assert all(item["rank"] == ranks[item["user_id"]] for item in walked)
+            # Как compact_ledger_periodically через сутки: журнал удаляется целиком
+            async with SessionLocal() as db:
+                await compact_ledger(db, before=datetime.utcnow() + timedelta(days=1))
+    leaderboard_module.LEADERBOARD_REFRESH_INTERVAL = refresh_interval
+    return {"rounds": rounds, "rank_checks": checked, "users": len(order)}
+
+
+async def timings(repeat):
+    from sqlalchemy import func, select
+    from database import SessionLocal
+    from crud.points import get_rank
+    from leaderboard import leaderboard
+    from models.user import User
+
+    async with SessionLocal() as db:
+        await leaderboard.load(db)
+        user_ids = (await db.execute(select(User.id))).scalars().all()
+        rng = random.Random(3)
+        sample = [rng.choice(user_ids) for _ in range(repeat)]
+
+        start = time.perf_counter()
+        for user_id in sample:
+            leaderboard.rank(leaderboard.points(user_id))
+        memory_rank = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for user_id in sample:
+            await get_rank(db, user_id)
+        endpoint_rank = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for user_id in sample:
+            points = await db.scalar(select(User.points).filter(User.id == user_id))
+            await db.scalar(select(func.count()).select_from(User).filter(User.points > points))
+        sql_rank = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            leaderboard.page(20)
+        memory_top = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            (await db.execute(select(User.id, User.points).order_by(User.points.desc(), User.id).limit(20))).all()
+        sql_top = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        await leaderboard.load(db)
+        load = time.perf_counter() - start
+    return {
+        "rank_in_memory_us": round(memory_rank * 1e6, 2),
+        "rank_crud_us": round(endpoint_rank * 1e6, 2),
+        "rank_sql_count_us": round(sql_rank * 1e6, 2),
+        "top20_in_memory_us": round(memory_top * 1e6, 2),
+        "top20_sql_us": round(sql_top * 1e6, 2),
+        "full_load_ms": round(load * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--api-users", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--ops", type=int, default=100, help="random API requests per round")
+    parser.add_argument("--probes", type=int, default=50, help="rank checks per round")
+    parser.add_argument("--list-ops", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # До первого импорта database: движок запоминает абсолютный путь к ./test.db
+    cwd = workdir()
+    results = {"ranked_list": check_ranked_list(args.list_ops, args.seed)}
+    print(results["ranked_list"])
+
+    asyncio.run(seed(cwd, args.api_users))
+    results["api"] = asyncio.run(check_api(args.rounds, args.ops, args.probes, args.seed))
+    print(results["api"])
+
+    asyncio.run(seed(cwd, args.users, prefix="bulk"))
+    results["timings"] = asyncio.run(timings(args.repeat))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Fail if a hot endpoint query scans a whole table.
+
+Runs the hot endpoints in-process against a seeded, migrated database,
+records every statement they execute and runs EXPLAIN QUERY PLAN on each
+SELECT/UPDATE/DELETE. A SCAN step (with or without an index) is a
+violation unless the statement has a LIMIT and SQLite walks rows already
+in the requested order, i.e. the first page of a keyset listing. A MATCH
+lookup in an FTS5 table is reported as a virtual table SCAN but reads the
+full-text index, so it does not count.
+
+    python -m benchmarks.check_query_plans [--show]
+
+Exits with status 1 and prints the offending plans on failure.
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import re
+import sqlite3
+import sys
+
+from benchmarks.common import QueryCounter, asgi_client, workdir
+
+SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(?!\S+ VIRTUAL TABLE INDEX \d+:M)")
+LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+HOT_STATEMENT = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+async def exercise(users, products):
+    from database import engine, init_db
+    from jobs import run_pending
+    from main import app
+    from benchmarks.common import seed_users
+
+    await init_db()
+    await seed_users(users, points=1000)
+    async with asgi_client(app) as client:
+        for i in range(products):
+            await client.post("/product/", json={"name": f"product-{i}", "description": "changed", "price": 10, "stock": 1000})
+            await client.post("/billboards/", json={"name": f"billboard-{i}"})
+        for i in range(users):
+            await client.post("/order/", json={"user_id": i + 1, "items": [
+                {"product_id": i % products + 1, "quantity": 1}, {"product_id": (i + 1) % products + 1, "quantity": 2},
+            ]})
+
+        await client.post("/auth/register", json={"username": "plan-check", "password": "secret"})
+        token = (await client.post("/auth/token", data={"username": "plan-check", "password": "secret"})).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+        # Полная загрузка таблицы лидеров читает всех пользователей раз в
+        # LEADERBOARD_RELOAD_INTERVAL, а не на каждый запрос
+        await client.get("/points/leaderboard", params={"limit": 1})
+
+        with QueryCounter(engine) as recorder:
+            for prefix in ("/product", "/billboards"):
+                page = (await client.get(f"{prefix}/", params={"limit": 5})).json()
+                await client.get(f"{prefix}/", params={"limit": 5, "cursor": page["next_cursor"]})
+                page = (await client.get(f"{prefix}/", params={"limit": 5, "sort": "name"})).json()
+                await client.get(f"{prefix}/", params={"limit": 5, "sort": "name", "cursor": page["next_cursor"]})
+                await client.get(f"{prefix}/3")
+                await client.put(f"{prefix}/3", json={"description": "changed"})
+                page = (await client.get(f"{prefix}/search", params={"q": "changed", "limit": 1})).json()
+                await client.get(f"{prefix}/search", params={"q": "changed", "limit": 1, "cursor": page["next_cursor"]})
+            await client.post("/order/", json={"user_id": 1, "product_id": 2, "quantity": 1})
+            page = (await client.get("/order/", params={"limit": 5})).json()
+            await client.get("/order/", params={"limit": 5, "cursor": page["next_cursor"]})
+            await client.get("/order/2")
+            page = (await client.get("/order/user/1", params={"limit": 1})).json()
+            await client.get("/order/user/1", params={"limit": 1, "cursor": page["next_cursor"]})
+            await client.get("/order/user/1/stats")
+            for by in ("user", "product"):
+                page = (await client.get("/order/stats", params={"by": by, "limit": 5})).json()
+                await client.get("/order/stats", params={"by": by, "limit": 5, "cursor": page["next_cursor"]})
+            await client.get("/points/2")
+            await client.post("/points/add", params={"user_id": 2, "points": 5}, headers={"Idempotency-Key": "plan-1"})
+            await client.post("/points/redeem", params={"user_id": 2, "points": 5})
+            await client.post("/points/batch", json=[{"user_id": 3, "points": 5}, {"user_id": 4, "points": -5}])
+            await client.get("/points/leaderboard", params={"limit": 5})
+            await client.get("/points/2/rank")
+            page = (await client.get("/auth/users", params={"limit": 5})).json()
+            await client.get("/auth/users", params={"limit": 5, "cursor": page["next_cursor"]})
+            await client.get("/auth/users/me", headers=auth)
+            await client.post("/auth/logout", headers=auth)
+            await client.delete(f"/auth/users/{users + 1}")
+            await client.delete("/order/3")
+            # Задачи заказов: выборка из очереди и обработчики
+            await run_pending()
+    await engine.dispose()
+    return recorder.statements
+
+
+def check(statements, show):
+    violations = []
+    seen = set()
+    with sqlite3.connect("test.db") as conn:
+        for statement, parameters in statements:
+            if not HOT_STATEMENT.match(statement) or statement in seen:
+                continue
+            seen.add(statement)
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            bounded = LIMIT.search(statement) and not any("TEMP B-TREE" in step for step in plan)
+            bad = [step for step in plan if SCAN.match(step) and not bounded]
+            if show or bad:
+                print(("FULL SCAN" if bad else "ok").ljust(10), " ".join(statement.split()))
+                for step in plan:
+                    print("           ", step)
+            if bad:
+                violations.append(statement)
+    return len(seen), violations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--show", action="store_true", help="print every plan, not only violations")
+    args = parser.parse_args()
+
+    workdir()
+    statements = asyncio.run(exercise(args.users, args.products))
+    checked, violations = check(statements, args.show)
+    print(f"{checked} distinct statements checked, {len(violations)} full table scans")
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
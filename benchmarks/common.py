@@ -0,0 +1,104 @@
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def workdir():
+    # database.py использует относительный путь ./test.db, поэтому каждый
+    # бенчмарк работает в собственном временном каталоге
+    path = tempfile.mkdtemp(prefix="mafia-bench-")
+    os.chdir(path)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return path
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(cwd, port, workers=1, env=None):
+    # WEB_CONCURRENCY: пулы процессов делят CPU между воркерами (process_pool.py)
+    server_env = dict(os.environ, PYTHONPATH=ROOT, WEB_CONCURRENCY=str(workers))
+    server_env.update(env or {})
+    # Приложение само схему не создаёт
+    subprocess.run([sys.executable, "-m", "migrations"], cwd=cwd, env=server_env, check=True, capture_output=True)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=cwd, env=server_env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def summarize(samples, elapsed):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+        "p50_ms": round(pct(0.50), 2),
+        "p95_ms": round(pct(0.95), 2),
+        "p99_ms": round(pct(0.99), 2),
+    }
+
+
+def asgi_client(app):
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+
+
+async def seed_users(count, points=0):
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models.user import User
+
+    async with SessionLocal() as db:
+        await db.execute(insert(User), [
+            {"username": f"user-{i}", "hashed_password": "-", "points": points}
+            for i in range(count)
+        ])
+        await db.commit()
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self.statements = []
+        self._engine = engine.sync_engine
+        self._event = event
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append((statement, parameters[0] if executemany else parameters))
+
+    def __enter__(self):
+        self._event.listen(self._engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        self._event.remove(self._engine, "before_cursor_execute", self._on_execute)
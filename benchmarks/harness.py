@@ -0,0 +1,282 @@
+"""Reproducible mixed-workload load test for every router.
+
+Seeds a fresh database with the requested volumes, then replays a fixed,
+seeded sequence of operations against the app, either in-process through
+ASGI or against a uvicorn subprocess:
+
+    browse   GET /product/, /product/{id}, /billboards/, /billboards/{id}
+    login    POST /auth/token (bcrypt)
+    order    POST /order/
+    redeem   POST /points/redeem
+    points   GET /points/{id}
+    orders   GET /order/ with a cursor
+
+Per scenario it reports p50/p95/p99 latency and throughput, plus peak
+memory (RSS high-water mark of the process serving requests), as JSON.
+With --baseline the run is compared against stored results and the script
+exits with status 1 when a scenario's p95 or throughput regresses by more
+than --tolerance.
+
+    python -m benchmarks.harness --mode asgi --output run.json
+    python -m benchmarks.harness --mode both --baseline benchmarks/baseline.json
+    python -m benchmarks.harness --mode both --save-baseline benchmarks/baseline.json
+
+SQLITE_* and DATABASE_* environment variables apply to both modes, e.g.
+SQLITE_SINGLE_WRITER=1 to compare write serialization.
+
+Baselines are machine-specific: regenerate them on the machine that runs
+the comparison. The stored file records where it was produced.
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import asgi_client, free_port, start_server, summarize, workdir
+
+PASSWORD = "secret"
+# Доли операций в смешанной нагрузке
+WORKLOAD = {
+    "browse": 0.55,
+    "points": 0.15,
+    "orders": 0.08,
+    "order": 0.12,
+    "redeem": 0.08,
+    "login": 0.02,
+}
+
+
+async def seed(cwd, volumes):
+    from sqlalchemy import insert
+    from database import make_engine
+    from migrations import upgrade
+    from models.billboard import Billboard
+    from models.order import Order, OrderItem
+    from models.product import Product
+    from models.user import User
+    import hashing
+
+    seed_engine = make_engine(f"sqlite+aiosqlite:///{cwd}/test.db")
+    await upgrade(seed_engine)
+    hashed = hashing.password_context().hash(PASSWORD)
+    rng = random.Random(0)
+    async with seed_engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {"username": f"user-{i}", "hashed_password": hashed, "points": 1_000_000}
+            for i in range(volumes["users"])
+        ])
+        await conn.execute(insert(Product), [
+            {"name": f"product-{i:06d}", "price": rng.randint(10, 1000), "stock": 1_000_000, "is_available": True}
+            for i in range(volumes["products"])
+        ])
+        await conn.execute(insert(Billboard), [
+            {"name": f"billboard-{i:06d}", "description": "seeded"} for i in range(volumes["billboards"])
+        ])
+        orders = [
+            {"id": i + 1, "user_id": rng.randint(1, volumes["users"]), "product_id": None, "quantity": 1}
+            for i in range(volumes["orders"])
+        ]
+        if orders:
+            await conn.execute(insert(Order), orders)
+            await conn.execute(insert(OrderItem), [
+                {"order_id": order["id"], "product_id": rng.randint(1, volumes["products"]), "quantity": 1, "price": 100}
+                for order in orders
+            ])
+    await seed_engine.dispose()
+
+
+def plan(count, volumes, seed):
+    # Последовательность операций фиксирована сидом, чтобы прогоны были сравнимы
+    rng = random.Random(seed)
+    names = list(WORKLOAD)
+    weights = [WORKLOAD[name] for name in names]
+    ops = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        ops.append((name, rng.randint(1, volumes["users"]), rng.randint(1, volumes["products"]),
+                    rng.randint(1, volumes["billboards"]), rng.random()))
+    return ops
+
+
+async def perform(client, op, cursors):
+    name, user_id, product_id, billboard_id, roll = op
+    if name == "browse":
+        if roll < 0.3:
+            return await client.get("/product/", params={"limit": 20, "sort": "name" if roll < 0.1 else "id"})
+        if roll < 0.7:
+            return await client.get(f"/product/{product_id}")
+        if roll < 0.85:
+            return await client.get("/billboards/", params={"limit": 20})
+        return await client.get(f"/billboards/{billboard_id}")
+    if name == "points":
+        return await client.get(f"/points/{user_id}")
+    if name == "orders":
+        r = await client.get("/order/", params={"limit": 50, **({"cursor": cursors["orders"]} if cursors["orders"] else {})})
+        cursors["orders"] = r.json().get("next_cursor") if r.status_code == 200 else None
+        return r
+    if name == "order":
+        return await client.post("/order/", json={"user_id": user_id, "items": [
+            {"product_id": product_id, "quantity": 1}, {"product_id": product_id % 50 + 1, "quantity": 2},
+        ]})
+    if name == "redeem":
+        return await client.post("/points/redeem", params={"user_id": user_id, "points": 1})
+    return await client.post("/auth/token", data={"username": f"user-{user_id - 1}", "password": PASSWORD})
+
+
+async def drive(client, ops, concurrency):
+    samples = {name: [] for name in WORKLOAD}
+    errors = {}
+    cursors = {"orders": None}
+    queue = iter(ops)
+
+    async def worker():
+        for op in queue:
+            start = time.perf_counter()
+            try:
+                status = (await perform(client, op, cursors)).status_code
+            except Exception as exc:
+                # Упавший обработчик: uvicorn рвёт соединение, ASGITransport
+                # пробрасывает исключение. Считаем ошибкой, прогон продолжаем
+                status = type(exc).__name__
+            samples[op[0]].append(time.perf_counter() - start)
+            if status != 200:
+                key = f"{op[0]}:{status}"
+                errors[key] = errors.get(key, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    scenarios = {name: summarize(values, elapsed) for name, values in samples.items() if values}
+    total = summarize([value for values in samples.values() for value in values], elapsed)
+    return {"total": total, "scenarios": scenarios, "errors": errors}
+
+
+def peak_rss_mb(pid=None):
+    # VmHWM — максимальный RSS процесса; ru_maxrss в Linux в КиБ
+    if pid is not None and os.path.exists(f"/proc/{pid}/status"):
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+async def run_asgi(ops, concurrency):
+    from main import app
+
+    async with asgi_client(app) as client:
+        async with app.router.lifespan_context(app):
+            await drive(client, ops[: min(len(ops), 50)], concurrency)  # прогрев
+            result = await drive(client, ops, concurrency)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+async def run_http(base_url, ops, concurrency):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await drive(client, ops[: min(len(ops), 50)], concurrency)
+        return await drive(client, ops, concurrency)
+
+
+def run_uvicorn(cwd, ops, concurrency):
+    port = free_port()
+    server = start_server(cwd, port)
+    try:
+        result = asyncio.run(run_http(f"http://127.0.0.1:{port}", ops, concurrency))
+        result["peak_rss_mb"] = peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for mode, result in results["modes"].items():
+        reference = baseline.get("modes", {}).get(mode)
+        if reference is None:
+            continue
+        for name, stats in result["scenarios"].items():
+            before = reference["scenarios"].get(name)
+            if before is None:
+                continue
+            if stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{mode}/{name}: p95 {before['p95_ms']} -> {stats['p95_ms']} ms")
+            if stats["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{mode}/{name}: throughput {before['throughput_rps']} -> {stats['throughput_rps']} rps")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["asgi", "uvicorn", "both"], default="asgi")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--billboards", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results JSON here as well as to stdout")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    volumes = {"users": args.users, "products": args.products, "billboards": args.billboards, "orders": args.orders}
+    ops = plan(args.requests, volumes, args.seed)
+    results = {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "volumes": volumes, "requests": args.requests, "concurrency": args.concurrency, "seed": args.seed,
+        },
+        "modes": {},
+    }
+
+    root = workdir()
+    modes = ["asgi", "uvicorn"] if args.mode == "both" else [args.mode]
+    # uvicorn первым: ASGI-прогон загружает приложение в этот процесс
+    for mode in sorted(modes, reverse=True):
+        # SQLAlchemy делает путь ./test.db абсолютным при импорте database,
+        # поэтому ASGI-прогон работает в корне workdir, uvicorn — в подкаталоге
+        cwd = root if mode == "asgi" else os.path.join(root, mode)
+        os.makedirs(cwd, exist_ok=True)
+        asyncio.run(seed(cwd, volumes))
+        if mode == "asgi":
+            results["modes"][mode] = asyncio.run(run_asgi(ops, args.concurrency))
+        else:
+            results["modes"][mode] = run_uvicorn(cwd, ops, args.concurrency)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        differs = [key for key, value in results["meta"].items() if baseline.get("meta", {}).get(key) != value]
+        if differs:
+            print(f"Warning: baseline was recorded with different {', '.join(differs)}", file=sys.stderr)
+        results["regressions"] = compare(results, baseline, args.tolerance)
+    text = json.dumps(results, indent=2)
+    print(text)
+    for path in filter(None, (output, save_path)):
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    if results.get("regressions"):
+        print("\n".join(["Regressions:", *results["regressions"]]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Concurrent /points/redeem stress check for the points ledger.
+
+Seeds one user, fires many concurrent redeems (each sent twice with the same
+Idempotency-Key to simulate client retries) and verifies that no update is
+lost, retries are applied once and the balance never goes negative. Then
+runs --compactions ledger compactions at once, as every uvicorn worker
+does, interleaved with more additions, and checks that the ledger balance
+(snapshot plus remaining entries) still equals the user's points.
+
+    python -m benchmarks.stress_points_redeem --requests 500 --concurrency 50
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from benchmarks.common import asgi_client, workdir
+
+
+async def run(total, concurrency, balance, cost, compactions):
+    from datetime import datetime, timedelta
+    from database import SessionLocal, init_db
+    from main import app
+    from models.user import User
+    from crud.points import compact_ledger, get_ledger_balance
+
+    await init_db()
+    async with SessionLocal() as db:
+        user = User(username="stress", hashed_password="-", points=0)
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    async with asgi_client(app) as client:
+        r = await client.post("/points/add", params={"user_id": user_id, "points": balance})
+        r.raise_for_status()
+
+        sem = asyncio.Semaphore(concurrency)
+        statuses = {}
+
+        async def redeem():
+            key = str(uuid.uuid4())
+            async with sem:
+                codes = []
+                for _ in range(2):
+                    r = await client.post(
+                        "/points/redeem",
+                        params={"user_id": user_id, "points": cost},
+                        headers={"Idempotency-Key": key},
+                    )
+                    codes.append(r.status_code)
+                    if r.status_code == 200:
+                        assert r.json()["points"] >= 0, r.json()
+                assert codes[0] == codes[1], codes
+                statuses[key] = codes[0]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(redeem() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+        # Свёртка всего журнала сразу из нескольких «воркеров», вперемешку с
+        # начислениями: снимок баланса не должен задвоиться
+        async def compact():
+            async with SessionLocal() as db:
+                await compact_ledger(db, before=datetime.utcnow() + timedelta(days=1))
+
+        async def add():
+            r = await client.post("/points/add", params={"user_id": user_id, "points": cost})
+            r.raise_for_status()
+
+        for _ in range(compactions):
+            await asyncio.gather(*(compact() for _ in range(compactions)), *(add() for _ in range(compactions)))
+        added = compactions * compactions * cost
+
+        final = (await client.get(f"/points/{user_id}")).json()["points"]
+
+    async with SessionLocal() as db:
+        ledger = await get_ledger_balance(db, user_id)
+
+    succeeded = sum(1 for code in statuses.values() if code == 200)
+    rejected = sum(1 for code in statuses.values() if code == 400)
+    errors = total - succeeded - rejected
+    print(f"{total} redeems x2 in {elapsed:.2f}s: {succeeded} applied, {rejected} rejected, {errors} errors")
+    print(f"final balance {final}, ledger balance {ledger}")
+
+    assert errors == 0, "unexpected status codes"
+    assert final == balance - succeeded * cost + added, "lost update"
+    assert final >= 0, "negative balance"
+    assert ledger == final, "ledger out of sync"
+    assert succeeded == min(total, balance // cost), "redeem rejected while points remained"
+    print("OK")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--balance", type=int, default=3000)
+    parser.add_argument("--cost", type=int, default=10)
+    parser.add_argument("--compactions", type=int, default=4, help="concurrent compactions per round")
+    args = parser.parse_args()
+
+    workdir()
+    asyncio.run(run(args.requests, args.concurrency, args.balance, args.cost, args.compactions))
+
+
+if __name__ == "__main__":
+    main()
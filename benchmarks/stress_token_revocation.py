@@ -0,0 +1,113 @@
+"""Token revocation across uvicorn workers and restarts.
+
+Starts several workers, warms every worker's token cache, logs one token
+out and then polls with fresh connections (spread across workers by the
+kernel). Asserts that after REVOCATION_REFRESH_INTERVAL every worker rejects
+the revoked token while another token of the same user keeps working, that
+the revocation survives a restart and that purge_expired drops the row.
+Then, with the workers still running, logs the second token out: after the
+purge emptied the table every worker must still pick up the new revocation
+(ids of revoked_tokens are not reused).
+
+    python -m benchmarks.stress_token_revocation --workers 3
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.common import free_port, start_server, workdir
+
+
+def status(base_url, token):
+    # Новое соединение на каждый запрос, чтобы попадать в разные воркеры
+    return httpx.get(f"{base_url}/auth/users/me", headers={"Authorization": f"Bearer {token}"}).status_code
+
+
+def poll(base_url, token, probes):
+    return [status(base_url, token) for _ in range(probes)]
+
+
+async def purge():
+    from sqlalchemy import func, select
+    from database import SessionLocal
+    from models.revoked_token import RevokedToken
+    from revocation import purge_expired
+
+    async with SessionLocal() as db:
+        purged = await purge_expired(db, now=int(time.time()) + 24 * 3600)
+        left = await db.scalar(select(func.count()).select_from(RevokedToken))
+    return purged, left
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--probes", type=int, default=60)
+    args = parser.parse_args()
+
+    cwd = workdir()
+    from revocation import REVOCATION_REFRESH_INTERVAL
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(cwd, port, workers=args.workers)
+    results = {}
+    try:
+        httpx.post(f"{base_url}/auth/register", json={"username": "alice", "password": "secret"}).raise_for_status()
+        tokens = [
+            httpx.post(f"{base_url}/auth/token", data={"username": "alice", "password": "secret"}).json()["access_token"]
+            for _ in range(2)
+        ]
+        revoked, kept = tokens
+        assert set(poll(base_url, revoked, args.probes)) == {200}
+
+        r = httpx.post(f"{base_url}/auth/logout", headers={"Authorization": f"Bearer {revoked}"})
+        assert r.status_code == 200, r.text
+        logged_out = time.monotonic()
+
+        stale = []
+        while time.monotonic() - logged_out < REVOCATION_REFRESH_INTERVAL + 0.5:
+            if status(base_url, revoked) == 200:
+                stale.append(time.monotonic() - logged_out)
+        after = poll(base_url, revoked, args.probes)
+        assert set(after) == {403}, after
+        assert set(poll(base_url, kept, args.probes)) == {200}
+        r = httpx.post(f"{base_url}/auth/logout", headers={"Authorization": f"Bearer {revoked}"})
+        assert r.status_code == 403, r.text
+        results["stale_accepts"] = len(stale)
+        results["max_stale_s"] = round(max(stale, default=0.0), 3)
+    finally:
+        server.terminate()
+        server.wait()
+
+    server = start_server(cwd, port, workers=args.workers)
+    try:
+        after_restart = poll(base_url, revoked, args.probes)
+        assert set(after_restart) == {403}, after_restart
+        assert set(poll(base_url, kept, args.probes)) == {200}
+        results["after_restart"] = "revoked"
+
+        # Воркеры уже прочитали отзыв с наибольшим id; после очистки таблицы
+        # новый отзыв должен получить id больше него
+        purged, left = asyncio.run(purge())
+        assert (purged, left) == (1, 0), (purged, left)
+        results["purged"] = purged
+        r = httpx.post(f"{base_url}/auth/logout", headers={"Authorization": f"Bearer {kept}"})
+        assert r.status_code == 200, r.text
+        time.sleep(REVOCATION_REFRESH_INTERVAL + 0.5)
+        after_purge = poll(base_url, kept, args.probes)
+        assert set(after_purge) == {403}, after_purge
+        results["after_purge"] = "revoked"
+    finally:
+        server.terminate()
+        server.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
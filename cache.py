@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+
+# Размер и время жизни кешей каталога (в секундах). Кеш локален для
+# процесса, поэтому TTL ограничивает расхождение между воркерами uvicorn
+CATALOG_CACHE_SIZE = 1024
+CATALOG_CACHE_TTL = 30.0
+
+caches = {}
+
+class CatalogCache:
+    """TTL + LRU кеш готовых JSON-ответов каталога.
+
+    Ключи вида ("item", id) хранят одну запись, ("list", ...) — страницы
+    списка. Любое изменение записи сбрасывает её ключ и все страницы.
+    Изменения из других воркеров видны по версии таблицы: ответ отдаётся
+    только для той версии, при которой он собран.
+    """
+
+    def __init__(self, name: str, maxsize: int = CATALOG_CACHE_SIZE, ttl: float = CATALOG_CACHE_TTL):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        caches[name] = self
+
+    def get(self, key, version=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, entry_version, value = entry
+        # Другая версия — таблицу изменил другой воркер: ETag новой версии
+        # не должен уйти со старым телом
+        if expires < time.monotonic() or entry_version != version:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value: bytes, generation: int, version=None):
+        # Если пока шёл запрос к БД запись изменили, результат уже устарел
+        if generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *item_ids):
+        self.generation += 1
+        for item_id in item_ids:
+            self._entries.pop(("item", item_id), None)
+        for key in [key for key in self._entries if key[0] == "list"]:
+            del self._entries[key]
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
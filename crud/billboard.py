@@ -1,34 +1,99 @@
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import CatalogCache
+from images import with_variant_urls
+from crud.catalog import commit_catalog, import_rows, iter_rows, search_rows
+from crud.version import bump_version
+from pagination import fetch_page
 from models.billboard import Billboard
 from schemas.billboard import BillboardCreate, BillboardUpdate
+from serialization import page_json, row_json, rows_to_dicts
 
-def create_billboard(db: Session, billboard: BillboardCreate):
+billboard_cache = CatalogCache("billboard")
+BILLBOARD_SORT_COLUMNS = {"id": Billboard.id, "name": Billboard.name}
+# Колонки ответа в порядке полей BillboardResponse
+BILLBOARD_RESPONSE_COLUMNS = (
+    Billboard.name, Billboard.description, Billboard.image,
+    Billboard.text_color, Billboard.background_color, Billboard.id,
+)
+
+async def create_billboard(db: AsyncSession, billboard: BillboardCreate):
     db_billboard = Billboard(**billboard.dict())
     db.add(db_billboard)
-    db.commit()
-    db.refresh(db_billboard)
+    await bump_version(db, Billboard.__tablename__)
+    await commit_catalog(db)
+    await db.refresh(db_billboard)
+    billboard_cache.invalidate()
     return db_billboard
 
-def get_billboard(db: Session, billboard_id: int):
-    return db.query(Billboard).filter(Billboard.id == billboard_id).first()
+async def get_billboard(db: AsyncSession, billboard_id: int):
+    result = await db.execute(select(Billboard).filter(Billboard.id == billboard_id))
+    return result.scalars().first()
+
+async def get_billboards(db: AsyncSession, limit: int = 10, cursor: Optional[str] = None, sort: str = "id", skip: int = 0):
+    return await fetch_page(
+        db, select(Billboard), BILLBOARD_SORT_COLUMNS[sort], Billboard.id, sort, cursor, limit, skip
+    )
+
+async def get_billboard_json(db: AsyncSession, billboard_id: int, version: Optional[int] = None):
+    # version — версия таблицы, под которой ответ отдаётся (ETag)
+    key = ("item", billboard_id)
+    data = billboard_cache.get(key, version)
+    if data is None:
+        generation = billboard_cache.generation
+        result = await db.execute(select(*BILLBOARD_RESPONSE_COLUMNS).filter(Billboard.id == billboard_id))
+        row = result.first()
+        if row is None:
+            return None
+        data = row_json(row, with_variant_urls)
+        billboard_cache.set(key, data, generation, version)
+    return data
 
-def get_billboards(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(Billboard).offset(skip).limit(limit).all()
+async def get_billboards_json(
+    db: AsyncSession, limit: int = 10, cursor: Optional[str] = None, sort: str = "id", skip: int = 0,
+    version: Optional[int] = None,
+):
+    key = ("list", sort, cursor, limit, skip)
+    data = billboard_cache.get(key, version)
+    if data is None:
+        generation = billboard_cache.generation
+        rows, next_cursor = await fetch_page(
+            db, select(*BILLBOARD_RESPONSE_COLUMNS), BILLBOARD_SORT_COLUMNS[sort], Billboard.id,
+            sort, cursor, limit, skip, scalars=False,
+        )
+        data = page_json(rows_to_dicts(rows, with_variant_urls), next_cursor)
+        billboard_cache.set(key, data, generation, version)
+    return data
 
-def update_billboard(db: Session, billboard_id: int, billboard_update: BillboardUpdate):
-    db_billboard = get_billboard(db, billboard_id)
+async def update_billboard(db: AsyncSession, billboard_id: int, billboard_update: BillboardUpdate):
+    db_billboard = await get_billboard(db, billboard_id)
     if not db_billboard:
         return None
     for key, value in billboard_update.dict(exclude_unset=True).items():
         setattr(db_billboard, key, value)
-    db.commit()
-    db.refresh(db_billboard)
+    await bump_version(db, Billboard.__tablename__)
+    await commit_catalog(db)
+    await db.refresh(db_billboard)
+    billboard_cache.invalidate(billboard_id)
     return db_billboard
 
-def delete_billboard(db: Session, billboard_id: int):
-    db_billboard = get_billboard(db, billboard_id)
+async def delete_billboard(db: AsyncSession, billboard_id: int):
+    db_billboard = await get_billboard(db, billboard_id)
     if not db_billboard:
         return None
-    db.delete(db_billboard)
-    db.commit()
+    await db.delete(db_billboard)
+    await bump_version(db, Billboard.__tablename__)
+    await db.commit()
+    billboard_cache.invalidate(billboard_id)
     return db_billboard
+
+async def import_billboards(db: AsyncSession, batches):
+    return await import_rows(db, Billboard, BillboardCreate, batches, billboard_cache)
+
+def iter_billboards():
+    return iter_rows(Billboard, BILLBOARD_RESPONSE_COLUMNS)
+
+async def search_billboards_json(db: AsyncSession, text: str, limit: int = 20, cursor: Optional[str] = None):
+    rows, next_cursor = await search_rows(db, Billboard, BILLBOARD_RESPONSE_COLUMNS, text, cursor, limit)
+    return page_json(rows_to_dicts(rows, with_variant_urls), next_cursor)
@@ -0,0 +1,126 @@
+import re
+from pydantic import ValidationError
+from sqlalchemy import column, literal_column, select, table
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal, dialect_insert, engine
+from crud.version import bump_version
+from pagination import fetch_page
+from uploads import InvalidUpload
+
+# Сколько ошибок по строкам вернуть в отчёте об импорте; остальные только считаются
+MAX_REPORTED_ERRORS = 100
+# Строк в одном запросе потоковой выгрузки
+EXPORT_BATCH_SIZE = 1000
+
+SEARCH_TERM = re.compile(r"\w+")
+
+class NameTaken(Exception):
+    pass
+
+class SearchUnavailable(Exception):
+    pass
+
+async def commit_catalog(db: AsyncSession):
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Единственное уникальное поле товара и билборда кроме id — имя
+        await db.rollback()
+        raise NameTaken()
+
+def upsert_by_name(model, columns):
+    # INSERT ... ON CONFLICT(name) DO UPDATE есть и в SQLite, и в PostgreSQL.
+    # У существующей записи меняются только columns
+    stmt = dialect_insert(model.__table__)
+    columns = [column for column in columns if column != "name"]
+    if not columns:
+        return stmt.on_conflict_do_nothing(index_elements=["name"])
+    return stmt.on_conflict_do_update(
+        index_elements=["name"], set_={column: stmt.excluded[column] for column in columns}
+    )
+
+def _describe(exc: ValidationError):
+    return "; ".join(f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in exc.errors())
+
+async def import_rows(db: AsyncSession, model, schema, batches, cache):
+    # Каждая пачка — отдельная транзакция: длинный импорт не держит блокировку
+    # записи SQLite целиком. Строка меняет у записи с тем же именем только
+    # поля, которые в ней есть: CSV из name и price не сбрасывает остальные
+    # поля к значениям по умолчанию. Новая запись получает значения по умолчанию
+    report = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(line, error):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "error": error})
+
+    try:
+        async for batch in batches:
+            rows = {}
+            for line, record, error in batch:
+                if error is not None:
+                    fail(line, error)
+                    continue
+                try:
+                    item = schema.model_validate(record)
+                except ValidationError as exc:
+                    fail(line, _describe(exc))
+                    continue
+                # Повтор имени внутри пачки: остаётся последняя строка
+                rows[item.name] = item
+            if rows:
+                # Один запрос на каждый набор полей, встретившийся в пачке
+                groups = {}
+                for item in rows.values():
+                    groups.setdefault(frozenset(item.model_fields_set), []).append(item.model_dump())
+                for fields, values in groups.items():
+                    await db.execute(upsert_by_name(model, sorted(fields)), values)
+                await bump_version(db, model.__tablename__)
+                await db.commit()
+                cache.invalidate()
+                report["imported"] += len(rows)
+    except InvalidUpload as exc:
+        fail(None, f"Unreadable file, import stopped: {exc}")
+    return report
+
+async def iter_rows(model, columns, batch_size: int = EXPORT_BATCH_SIZE):
+    # Пачками по id, в памяти только текущая пачка. Сессия своя: тело ответа
+    # отдаётся уже после выхода из зависимостей
+    last_id = 0
+    async with SessionLocal() as db:
+        while True:
+            rows = (await db.execute(
+                select(*columns).filter(model.id > last_id).order_by(model.id).limit(batch_size)
+            )).all()
+            if not rows:
+                return
+            for row in rows:
+                yield row._asdict()
+            last_id = rows[-1].id
+
+def match_query(text: str):
+    # Каждое слово ищется как префикс, слова объединяются через AND.
+    # Кавычки не дают пользовательскому вводу стать синтаксисом FTS5 (OR, NEAR, *)
+    return " ".join(f'"{term}"*' for term in SEARCH_TERM.findall(text))
+
+async def search_rows(db: AsyncSession, model, columns, text: str, cursor, limit: int, filters=()):
+    # FTS5-таблицы есть только в SQLite (миграция 0005)
+    if engine.dialect.name != "sqlite":
+        raise SearchUnavailable()
+    query = match_query(text)
+    if not query:
+        return [], None
+    # Сначала страница (rowid, rank) из одного полнотекстового индекса: bm25
+    # считается для каждого совпадения, и без фильтров незачем читать строки
+    # таблицы для всех совпадений. Колонки ответа — вторым запросом по id.
+    # Курсор по (rank, id): rank — bm25, чем меньше, тем релевантнее
+    fts = table(f"{model.__tablename__}_fts", column("rowid"), column("rank"))
+    hits = select(fts.c.rowid, fts.c.rank).filter(literal_column(fts.name).op("MATCH")(query))
+    if filters:
+        hits = hits.join(model, model.id == fts.c.rowid).filter(*filters)
+    hits, next_cursor = await fetch_page(db, hits, fts.c.rank, fts.c.rowid, "rank", cursor, limit, scalars=False)
+    if not hits:
+        return [], next_cursor
+    rows = {row.id: row for row in await db.execute(select(*columns).filter(model.id.in_([hit.rowid for hit in hits])))}
+    return [rows[hit.rowid] for hit in hits if hit.rowid in rows], next_cursor
@@ -0,0 +1,210 @@
+import json
+import os
+import urllib.request
+from sqlalchemy import case, select, update, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from database import dialect_insert
+from jobs import enqueue, handler
+from models.order import Order, OrderItem, UserOrderStats, ProductOrderStats
+from models.product import Product
+from models.user import User
+from schemas.order import OrderCreate
+from crud.points import apply_points, UserNotFound
+from crud.product import product_cache
+from crud.version import bump_version
+from pagination import fetch_page
+from serialization import page_json
+
+# Доля стоимости заказа, возвращаемая баллами
+POINTS_RATE = 0.25
+# Поля итогов, которые заказ прибавляет, а удаление заказа вычитает
+STATS_FIELDS = ("orders", "quantity", "revenue", "points")
+# Куда отправлять уведомление о заказе (бот); пусто — не отправлять
+ORDER_WEBHOOK_URL = os.getenv("ORDER_WEBHOOK_URL", "")
+ORDER_WEBHOOK_TIMEOUT = 10.0
+
+class ProductNotFound(Exception):
+    pass
+
+class OutOfStock(Exception):
+    pass
+
+async def get_prices(db: AsyncSession, product_ids):
+    result = await db.execute(select(Product.id, Product.price).filter(Product.id.in_(product_ids)))
+    return {product_id: price for product_id, price in result}
+
+async def reserve_stock(db: AsyncSession, lines: dict):
+    # Условное списание остатка: при конкуренции заказ отклоняется,
+    # а не продаёт больше, чем есть на складе. Все позиции — один UPDATE,
+    # количество по id через CASE; списанные строки считаются по RETURNING:
+    # rowcount у executemany в asyncpg всегда -1
+    products = Product.__table__
+    quantity = case(lines, value=products.c.id)
+    stmt = (
+        update(products)
+        .where(
+            products.c.id.in_(list(lines)),
+            products.c.stock >= quantity,
+            products.c.is_available.is_(True),
+        )
+        .values(stock=products.c.stock - quantity)
+        .returning(products.c.id)
+    )
+    reserved = (await db.execute(stmt)).all()
+    if len(reserved) != len(lines):
+        raise OutOfStock()
+
+async def place_order(db: AsyncSession, order: OrderCreate):
+    lines = order.lines()
+    try:
+        # Баллы начисляются позже, в задаче: пользователя проверяем здесь
+        if await db.scalar(select(User.id).filter(User.id == order.user_id)) is None:
+            raise UserNotFound()
+        prices = await get_prices(db, list(lines))
+        if len(prices) != len(lines):
+            raise ProductNotFound()
+        await reserve_stock(db, lines)
+
+        quantity = sum(lines.values())
+        order_value = sum(qty * prices[product_id] for product_id, qty in lines.items())
+        points_to_add = int(order_value * POINTS_RATE)
+        db_order = Order(
+            user_id=order.user_id, product_id=order.product_id, quantity=quantity,
+            total=order_value, points=points_to_add,
+        )
+        db.add(db_order)
+        await db.flush()
+        items = [
+            {"order_id": db_order.id, "product_id": product_id, "quantity": qty, "price": prices[product_id]}
+            for product_id, qty in lines.items()
+        ]
+        await db.execute(insert(OrderItem), items)
+
+        # Баллы, итоги и уведомление — задачи в той же транзакции, что и заказ
+        lines_payload = [{key: item[key] for key in ("product_id", "quantity", "price")} for item in items]
+        await enqueue(db, "order_points", {"order_id": db_order.id, "user_id": order.user_id, "points": points_to_add})
+        await enqueue(db, "order_stats", {
+            "user_id": order.user_id, "quantity": quantity, "items": lines_payload,
+            "total": order_value, "points": points_to_add,
+        })
+        if ORDER_WEBHOOK_URL:
+            await enqueue(db, "order_notify", {
+                "order_id": db_order.id, "user_id": order.user_id, "order_price": order_value,
+                "points_added": points_to_add, "items": lines_payload,
+            })
+        await bump_version(db, Product.__tablename__)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    # Остатки изменились: кешированные карточки товаров устарели
+    product_cache.invalidate(*lines)
+    return db_order, items, order_value, points_to_add
+
+# Готовые INSERT ... ON CONFLICT DO UPDATE: сборка такого выражения на каждый
+# заказ стоила дороже самого запроса
+_stats_upserts = {}
+
+def _add_to_stats(model, key: str):
+    # orders = orders + excluded.orders, ...
+    stmt = _stats_upserts.get(model)
+    if stmt is None:
+        stmt = dialect_insert(model.__table__)
+        columns = model.__table__.c
+        stmt = _stats_upserts[model] = stmt.on_conflict_do_update(
+            index_elements=[key], set_={name: columns[name] + stmt.excluded[name] for name in STATS_FIELDS}
+        )
+    return stmt
+
+async def add_order_stats(db: AsyncSession, user_id: int, quantity: int, items, total: int, points: int, sign: int = 1):
+    # sign=-1 — заказ удалён, его вклад вычитается
+    await db.execute(
+        _add_to_stats(UserOrderStats, "user_id"),
+        {"user_id": user_id, "orders": sign, "quantity": sign * quantity, "revenue": sign * total, "points": sign * points},
+    )
+    if items:
+        await db.execute(_add_to_stats(ProductOrderStats, "product_id"), [
+            {
+                "product_id": item["product_id"], "orders": sign, "quantity": sign * item["quantity"],
+                "revenue": sign * item["quantity"] * item["price"],
+                "points": sign * int(item["quantity"] * item["price"] * POINTS_RATE),
+            }
+            for item in items
+        ])
+
+@handler("order_points")
+async def accrue_order_points(db: AsyncSession, payload):
+    # Ключ от id заказа: повтор задачи не начислит баллы второй раз
+    await apply_points(
+        db, payload["user_id"], payload["points"], "order",
+        idempotency_key=f"order:{payload['order_id']}", commit=False,
+    )
+
+@handler("order_stats")
+async def record_order_stats(db: AsyncSession, payload):
+    await add_order_stats(db, payload["user_id"], payload["quantity"], payload["items"], payload["total"], payload["points"])
+
+def _post_json(url: str, body: dict, idempotency_key: str):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), method="POST", headers={
+        "Content-Type": "application/json", "Idempotency-Key": idempotency_key,
+    })
+    with urllib.request.urlopen(request, timeout=ORDER_WEBHOOK_TIMEOUT) as response:
+        response.read()
+
+@handler("order_notify")
+async def notify_order(db: AsyncSession, payload):
+    # Получатель отбрасывает повторы по Idempotency-Key
+    await run_in_threadpool(_post_json, ORDER_WEBHOOK_URL, payload, f"order:{payload['order_id']}")
+
+async def remove_order(db: AsyncSession, order: Order):
+    # order загружен с позициями (selectinload(Order.items))
+    items = [{"product_id": item.product_id, "quantity": item.quantity, "price": item.price} for item in order.items]
+    await add_order_stats(db, order.user_id, order.quantity or 0, items, order.total or 0, order.points or 0, sign=-1)
+    await db.delete(order)
+    await db.commit()
+
+async def get_orders_json(db: AsyncSession, limit: int = 100, cursor=None, user_id=None):
+    # Страница заказов и их позиции двумя запросами по колонкам, сразу в JSON
+    # в форме Page[OrderResponse]. С user_id — история одного пользователя
+    # по индексу ix_orders_user_id
+    stmt = select(Order.id, Order.user_id, Order.product_id, Order.quantity, Order.total, Order.points)
+    if user_id is not None:
+        stmt = stmt.filter(Order.user_id == user_id)
+    orders, next_cursor = await fetch_page(db, stmt, Order.id, Order.id, "id", cursor, limit, scalars=False)
+    if not orders and user_id is not None and await db.get(User, user_id) is None:
+        raise UserNotFound()
+    items = {}
+    if orders:
+        result = await db.execute(
+            select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.price)
+            .filter(OrderItem.order_id.in_([order.id for order in orders]))
+            .order_by(OrderItem.id)
+        )
+        for order_id, product_id, quantity, price in result:
+            items.setdefault(order_id, []).append({"product_id": product_id, "quantity": quantity, "price": price})
+    return page_json([
+        {
+            "order_id": order_id, "user_id": order_user_id, "product_id": product_id, "quantity": quantity,
+            "order_price": total, "points_added": points, "items": items.get(order_id, []),
+        }
+        for order_id, order_user_id, product_id, quantity, total, points in orders
+    ], next_cursor)
+
+async def get_order_stats_json(db: AsyncSession, by: str, limit: int = 100, cursor=None):
+    # Итоги по пользователям или товарам в порядке id, из таблиц итогов
+    model, key = (UserOrderStats, UserOrderStats.user_id) if by == "user" else (ProductOrderStats, ProductOrderStats.product_id)
+    rows, next_cursor = await fetch_page(
+        db, select(key, *(getattr(model, name) for name in STATS_FIELDS)), key, key, by, cursor, limit, scalars=False,
+    )
+    return page_json([dict(zip(("id",) + STATS_FIELDS, row)) for row in rows], next_cursor)
+
+async def get_user_order_stats(db: AsyncSession, user_id: int):
+    row = (await db.execute(
+        select(*(getattr(UserOrderStats, name) for name in STATS_FIELDS)).filter(UserOrderStats.user_id == user_id)
+    )).first()
+    if row is None:
+        if await db.get(User, user_id) is None:
+            raise UserNotFound()
+        return {"id": user_id, **dict.fromkeys(STATS_FIELDS, 0)}
+    return {"id": user_id, **row._asdict()}
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import case, literal, select, update, delete, insert, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal, dialect_insert
+from crud.version import bump_version
+from leaderboard import leaderboard, stage
+from pagination import encode_cursor
+from models.user import User
+from models.points import PointsLedgerEntry, PointsBalance
+
+# Записи журнала моложе этого срока не сворачиваются: по ним распознаются
+# повторные запросы с тем же Idempotency-Key
+LEDGER_RETENTION = timedelta(days=1)
+LEDGER_COMPACT_INTERVAL = 60 * 60
+BATCH_CHUNK_SIZE = 500
+BATCH_RETRIES = 3
+
+logger = logging.getLogger(__name__)
+
+class UserNotFound(Exception):
+    pass
+
+class InsufficientPoints(Exception):
+    pass
+
+class IdempotencyConflict(Exception):
+    pass
+
+class BatchConflict(Exception):
+    pass
+
+async def get_entry_by_key(db: AsyncSession, idempotency_key: str):
+    result = await db.execute(
+        select(PointsLedgerEntry).filter(PointsLedgerEntry.idempotency_key == idempotency_key)
+    )
+    return result.scalars().first()
+
+def _check_replay(entry: PointsLedgerEntry, user_id: int, delta: int):
+    if entry.user_id != user_id or entry.delta != delta:
+        raise IdempotencyConflict()
+    return entry
+
+async def apply_points(
+    db: AsyncSession,
+    user_id: int,
+    delta: int,
+    reason: str,
+    idempotency_key: Optional[str] = None,
+    commit: bool = True,
+):
+    if idempotency_key:
+        existing = await get_entry_by_key(db, idempotency_key)
+        if existing:
+            return _check_replay(existing, user_id, delta)
+
+    # Одно условное UPDATE вместо чтения, изменения в Python и записи:
+    # параллельные запросы не теряют обновления, баланс не уходит в минус
+    stmt = update(User).filter(User.id == user_id)
+    if delta < 0:
+        stmt = stmt.filter(User.points >= -delta)
+    stmt = stmt.values(points=User.points + delta).returning(User.points)
+    balance = (await db.execute(stmt)).scalar_one_or_none()
+    if balance is None:
+        exists = await db.scalar(select(User.id).filter(User.id == user_id))
+        if commit:
+            await db.rollback()
+        if exists is None:
+            raise UserNotFound()
+        raise InsufficientPoints()
+    stage(db, user_id, balance)
+
+    entry = PointsLedgerEntry(
+        user_id=user_id,
+        delta=delta,
+        balance_after=balance,
+        reason=reason,
+        idempotency_key=idempotency_key,
+    )
+    db.add(entry)
+    if not commit:
+        return entry
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Тот же ключ успел записать параллельный запрос: наш UPDATE откатан
+        await db.rollback()
+        existing = await get_entry_by_key(db, idempotency_key) if idempotency_key else None
+        if existing is None:
+            raise
+        return _check_replay(existing, user_id, delta)
+    return entry
+
+async def _load_balances(db: AsyncSession, user_ids):
+    ids = list(user_ids)
+    balances = {}
+    for i in range(0, len(ids), BATCH_CHUNK_SIZE):
+        rows = await db.execute(
+            select(User.id, User.points).filter(User.id.in_(ids[i:i + BATCH_CHUNK_SIZE]))
+        )
+        for user_id, points in rows:
+            balances[user_id] = points
+    return balances
+
+async def _update_balances(db: AsyncSession, user_ids, original, balances):
+    # Сравнение со снимком в WHERE: если баланс успели изменить параллельно,
+    # строка не обновится, число строк не сойдётся и пакет будет пересчитан
+    # заново. Один UPDATE с CASE по id на пачку пользователей; строки
+    # считаются по RETURNING: rowcount у executemany в asyncpg всегда -1
+    users = User.__table__
+    updated = 0
+    for i in range(0, len(user_ids), BATCH_CHUNK_SIZE):
+        chunk = user_ids[i:i + BATCH_CHUNK_SIZE]
+        stmt = (
+            update(users)
+            .where(
+                users.c.id.in_(chunk),
+                users.c.points == case({user_id: original[user_id] for user_id in chunk}, value=users.c.id),
+            )
+            .values(points=case({user_id: balances[user_id] for user_id in chunk}, value=users.c.id))
+            .returning(users.c.id)
+        )
+        updated += len((await db.execute(stmt)).all())
+    return updated
+
+async def apply_points_batch(db: AsyncSession, transactions):
+    for _ in range(BATCH_RETRIES):
+        balances = await _load_balances(db, {t.user_id for t in transactions})
+        original = dict(balances)
+        results = []
+        entries = []
+        for t in transactions:
+            balance = balances.get(t.user_id)
+            if balance is None:
+                results.append({"user_id": t.user_id, "points": None, "status": "error", "detail": "User not found"})
+                continue
+            if balance + t.points < 0:
+                results.append({"user_id": t.user_id, "points": balance, "status": "error", "detail": "Not enough points"})
+                continue
+            balance += t.points
+            balances[t.user_id] = balance
+            entries.append({
+                "user_id": t.user_id,
+                "delta": t.points,
+                "balance_after": balance,
+                "reason": "batch",
+            })
+            results.append({"user_id": t.user_id, "points": balance, "status": "ok", "detail": None})
+
+        changed = [user_id for user_id, balance in balances.items() if balance != original[user_id]]
+        if changed and await _update_balances(db, changed, original, balances) != len(changed):
+            await db.rollback()
+            continue
+        for user_id in changed:
+            stage(db, user_id, balances[user_id])
+        if entries:
+            await db.execute(insert(PointsLedgerEntry), entries)
+        await db.commit()
+        return results
+    raise BatchConflict()
+
+async def get_leaderboard_page(db: AsyncSession, limit: int, after=None):
+    # after — (points, user_id) из курсора предыдущей страницы
+    await leaderboard.refresh(db)
+    entries = leaderboard.page(limit + 1, after)
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        user_id, points = entries[-1]
+        next_cursor = encode_cursor("points", points, user_id)
+    usernames = dict((await db.execute(
+        select(User.id, User.username).filter(User.id.in_([user_id for user_id, _ in entries]))
+    )).all()) if entries else {}
+    items = []
+    for user_id, points in entries:
+        if user_id not in usernames:
+            # Удалён в другом воркере после последнего перечитывания
+            leaderboard.set(user_id, None)
+            continue
+        items.append({"rank": leaderboard.rank(points), "user_id": user_id, "username": usernames[user_id], "points": points})
+    return items, next_cursor
+
+async def get_rank(db: AsyncSession, user_id: int):
+    await leaderboard.refresh(db)
+    points = leaderboard.points(user_id)
+    if points is None:
+        # Зарегистрирован в другом воркере после последнего перечитывания
+        points = await db.scalar(select(func.coalesce(User.points, 0)).filter(User.id == user_id))
+        if points is None:
+            raise UserNotFound()
+        leaderboard.set(user_id, points)
+    return {"user_id": user_id, "points": points, "rank": leaderboard.rank(points), "total": len(leaderboard)}
+
+async def get_ledger_balance(db: AsyncSession, user_id: int):
+    snapshot = await db.scalar(
+        select(PointsBalance.balance).filter(PointsBalance.user_id == user_id)
+    )
+    recent = await db.scalar(
+        select(func.coalesce(func.sum(PointsLedgerEntry.delta), 0))
+        .filter(PointsLedgerEntry.user_id == user_id)
+    )
+    return (snapshot or 0) + recent
+
+async def compact_ledger(db: AsyncSession, before: Optional[datetime] = None):
+    # compact_ledger_periodically работает в каждом воркере. Первый запрос —
+    # запись версии журнала: она держит блокировку (SQLite — базы, PostgreSQL —
+    # строки) до commit, так что свёртки идут по очереди и каждая видит
+    # результат предыдущей
+    await bump_version(db, PointsLedgerEntry.__tablename__)
+    before = before or datetime.utcnow() - LEDGER_RETENTION
+    last_id = await db.scalar(
+        select(func.max(PointsLedgerEntry.id)).filter(PointsLedgerEntry.created_at < before)
+    )
+    if last_id is None:
+        await db.rollback()
+        return 0
+
+    # Итоги прибавляются к снимку в самой базе одним INSERT ... SELECT, а
+    # условие по last_entry_id не даёт прибавить одни и те же записи дважды
+    ledger = PointsLedgerEntry.__table__
+    balances = PointsBalance.__table__
+    totals = (
+        select(ledger.c.user_id, func.sum(ledger.c.delta), literal(last_id))
+        .where(ledger.c.id <= last_id)
+        .group_by(ledger.c.user_id)
+    )
+    stmt = dialect_insert(balances).from_select(["user_id", "balance", "last_entry_id"], totals)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "balance": balances.c.balance + stmt.excluded.balance,
+            "last_entry_id": stmt.excluded.last_entry_id,
+            "compacted_at": func.now(),
+        },
+        where=balances.c.last_entry_id < stmt.excluded.last_entry_id,
+    )
+    await db.execute(stmt)
+    result = await db.execute(delete(PointsLedgerEntry).filter(PointsLedgerEntry.id <= last_id))
+    await db.commit()
+    return result.rowcount
+
+async def compact_ledger_periodically(interval: int = LEDGER_COMPACT_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with SessionLocal() as db:
+                await compact_ledger(db)
+        except Exception:
+            logger.exception("Points ledger compaction failed")
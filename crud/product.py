@@ -1,34 +1,109 @@
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import select, cast, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import CatalogCache
+from images import with_variant_urls
+from crud.catalog import commit_catalog, import_rows, iter_rows, search_rows
+from crud.version import bump_version
+from pagination import fetch_page
 from models.product import Product
 from schemas.product import ProductCreate, ProductUpdate
+from serialization import page_json, row_json, rows_to_dicts
 
-def create_product(db: Session, product: ProductCreate):
+product_cache = CatalogCache("product")
+PRODUCT_SORT_COLUMNS = {"id": Product.id, "name": Product.name}
+# Колонки ответа в порядке полей ProductResponse
+PRODUCT_RESPONSE_COLUMNS = (
+    Product.name, Product.description, Product.image, cast(Product.price, Float).label("price"),
+    Product.is_available, Product.stock, Product.id,
+)
+
+async def create_product(db: AsyncSession, product: ProductCreate):
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await bump_version(db, Product.__tablename__)
+    await commit_catalog(db)
+    await db.refresh(db_product)
+    product_cache.invalidate()
     return db_product
 
-def get_product(db: Session, product_id: int):
-    return db.query(Product).filter(Product.id == product_id).first()
+async def get_product(db: AsyncSession, product_id: int):
+    result = await db.execute(select(Product).filter(Product.id == product_id))
+    return result.scalars().first()
+
+async def get_products(db: AsyncSession, limit: int = 10, cursor: Optional[str] = None, sort: str = "id", skip: int = 0):
+    return await fetch_page(
+        db, select(Product), PRODUCT_SORT_COLUMNS[sort], Product.id, sort, cursor, limit, skip
+    )
+
+async def get_product_json(db: AsyncSession, product_id: int, version: Optional[int] = None):
+    # version — версия таблицы, под которой ответ отдаётся (ETag)
+    key = ("item", product_id)
+    data = product_cache.get(key, version)
+    if data is None:
+        generation = product_cache.generation
+        result = await db.execute(select(*PRODUCT_RESPONSE_COLUMNS).filter(Product.id == product_id))
+        row = result.first()
+        if row is None:
+            return None
+        data = row_json(row, with_variant_urls)
+        product_cache.set(key, data, generation, version)
+    return data
 
-def get_products(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(Product).offset(skip).limit(limit).all()
+async def get_products_json(
+    db: AsyncSession, limit: int = 10, cursor: Optional[str] = None, sort: str = "id", skip: int = 0,
+    version: Optional[int] = None,
+):
+    key = ("list", sort, cursor, limit, skip)
+    data = product_cache.get(key, version)
+    if data is None:
+        generation = product_cache.generation
+        rows, next_cursor = await fetch_page(
+            db, select(*PRODUCT_RESPONSE_COLUMNS), PRODUCT_SORT_COLUMNS[sort], Product.id,
+            sort, cursor, limit, skip, scalars=False,
+        )
+        data = page_json(rows_to_dicts(rows, with_variant_urls), next_cursor)
+        product_cache.set(key, data, generation, version)
+    return data
 
-def update_product(db: Session, product_id: int, product_update: ProductUpdate):
-    db_product = get_product(db, product_id)
+async def update_product(db: AsyncSession, product_id: int, product_update: ProductUpdate):
+    db_product = await get_product(db, product_id)
     if not db_product:
         return None
     for key, value in product_update.dict(exclude_unset=True).items():
         setattr(db_product, key, value)
-    db.commit()
-    db.refresh(db_product)
+    await bump_version(db, Product.__tablename__)
+    await commit_catalog(db)
+    await db.refresh(db_product)
+    product_cache.invalidate(product_id)
     return db_product
 
-def delete_product(db: Session, product_id: int):
-    db_product = get_product(db, product_id)
+async def delete_product(db: AsyncSession, product_id: int):
+    db_product = await get_product(db, product_id)
     if not db_product:
         return None
-    db.delete(db_product)
-    db.commit()
+    await db.delete(db_product)
+    await bump_version(db, Product.__tablename__)
+    await db.commit()
+    product_cache.invalidate(product_id)
     return db_product
+
+async def import_products(db: AsyncSession, batches):
+    return await import_rows(db, Product, ProductCreate, batches, product_cache)
+
+def iter_products():
+    return iter_rows(Product, PRODUCT_RESPONSE_COLUMNS)
+
+async def search_products_json(
+    db: AsyncSession, text: str, limit: int = 20, cursor: Optional[str] = None,
+    available: Optional[bool] = None, min_price: Optional[float] = None, max_price: Optional[float] = None,
+):
+    filters = []
+    if available is not None:
+        filters.append(Product.is_available == available)
+    if min_price is not None:
+        filters.append(Product.price >= min_price)
+    if max_price is not None:
+        filters.append(Product.price <= max_price)
+    rows, next_cursor = await search_rows(db, Product, PRODUCT_RESPONSE_COLUMNS, text, cursor, limit, filters)
+    return page_json(rows_to_dicts(rows, with_variant_urls), next_cursor)
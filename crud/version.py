@@ -0,0 +1,35 @@
+import time
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import dialect_insert
+from models.table_version import TableVersion
+
+# Сколько секунд воркер доверяет прочитанной версии, не обращаясь к БД.
+# Столько же может длиться расхождение между воркерами после записи
+VERSION_CACHE_TTL = 1.0
+
+_versions = {}
+
+async def bump_version(db: AsyncSession, table: str):
+    # Вызывается до commit, в той же транзакции, что и изменение данных.
+    # Один upsert: первые записи в таблицу из двух воркеров не сталкиваются
+    # на INSERT строки версии
+    _versions.pop(table, None)
+    now = datetime.utcnow()
+    versions = TableVersion.__table__
+    stmt = dialect_insert(versions).values(name=table, version=1, updated_at=now)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["name"], set_={"version": versions.c.version + 1, "updated_at": now}
+    ))
+
+async def get_version(db: AsyncSession, table: str):
+    cached = _versions.get(table)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    row = (await db.execute(
+        select(TableVersion.version, TableVersion.updated_at).filter(TableVersion.name == table)
+    )).first()
+    version, updated_at = row if row else (0, None)
+    _versions[table] = (time.monotonic() + VERSION_CACHE_TTL, version, updated_at)
+    return version, updated_at
@@ -0,0 +1,99 @@
+import functools
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+from process_pool import DEFAULT_WORKERS, PoolBusy, ProcessPool
+
+# Хеши с меньшим числом раундов считаются устаревшими и пересчитываются при входе
+BCRYPT_ROUNDS = 12
+
+# bcrypt выполняется в пуле процессов (process_pool.py)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(DEFAULT_WORKERS)))
+# Сколько операций может одновременно выполняться или ждать в очереди пула
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(HASH_WORKERS * 8)))
+# Сколько секунд запрос ждёт места в очереди, прежде чем получить 503
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "2.0"))
+
+# Кеш недавних успешных проверок пароля, секунды. 0 отключает кеш. В кеше
+# лежат только HMAC-дайджесты с ключом процесса, а не пароли
+VERIFY_CACHE_TTL = float(os.getenv("VERIFY_CACHE_TTL", "0"))
+VERIFY_CACHE_SIZE = int(os.getenv("VERIFY_CACHE_SIZE", "10000"))
+
+class HashingBusy(PoolBusy):
+    pass
+
+# passlib и bcrypt импортируются при первом хешировании: они нужны только
+# процессам пула, а не каждому воркеру приложения при старте
+@functools.cache
+def password_context():
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+    )
+
+_pool = ProcessPool(HASH_WORKERS, HASH_QUEUE_LIMIT, HASH_QUEUE_TIMEOUT, busy=HashingBusy)
+_cache_key = secrets.token_bytes(32)
+_verified = OrderedDict()
+
+stats = {
+    "cache_hits": 0,
+    "cache_misses": 0,
+    "rehashed": 0,
+}
+
+def shutdown():
+    _pool.shutdown()
+
+# Функции верхнего уровня, чтобы их можно было передать в процесс пула
+def _hash(password: str):
+    return password_context().hash(password)
+
+def _verify_and_update(password: str, hashed_password: str):
+    return password_context().verify_and_update(password, hashed_password)
+
+def _cache_digest(username: str, password: str, hashed_password: str):
+    message = "\0".join((username, password, hashed_password)).encode()
+    return hmac.new(_cache_key, message, hashlib.sha256).digest()
+
+def _cache_lookup(digest: bytes):
+    expires = _verified.get(digest)
+    if expires is None or expires < time.monotonic():
+        _verified.pop(digest, None)
+        stats["cache_misses"] += 1
+        return False
+    _verified.move_to_end(digest)
+    stats["cache_hits"] += 1
+    return True
+
+def _cache_store(digest: bytes):
+    _verified[digest] = time.monotonic() + VERIFY_CACHE_TTL
+    _verified.move_to_end(digest)
+    while len(_verified) > VERIFY_CACHE_SIZE:
+        _verified.popitem(last=False)
+
+async def hash_password(password: str):
+    return await _pool.run(_hash, password)
+
+async def verify_password(username: str, password: str, hashed_password: str):
+    """Проверяет пароль. Возвращает (valid, new_hash), где new_hash — новый
+    хеш, если текущий устарел (сменились схема или work factor)."""
+    digest = None
+    if VERIFY_CACHE_TTL > 0:
+        digest = _cache_digest(username, password, hashed_password)
+        if _cache_lookup(digest):
+            return True, None
+    valid, new_hash = await _pool.run(_verify_and_update, password, hashed_password)
+    if new_hash is not None:
+        stats["rehashed"] += 1
+    if valid and new_hash is None and digest is not None:
+        _cache_store(digest)
+    return valid, new_hash
+
+def hashing_stats():
+    return dict(_pool.stats(), **stats, cache_size=len(_verified))
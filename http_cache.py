@@ -0,0 +1,48 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+
+# Клиенты перепроверяют каталог при каждом запросе, но получают 304,
+# пока версия таблицы не изменилась
+CATALOG_MAX_AGE = 0
+
+def make_etag(version: int, request: Request):
+    # Разные параметры запроса дают разные представления одной версии таблицы
+    digest = hashlib.sha1(f"{request.url.path}?{request.url.query}".encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+def matches_any(request: Request):
+    # If-None-Match: * совпадает с любым существующим представлением
+    return "*" in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+def is_not_modified(request: Request, etag: str, last_modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+async def conditional_json(request: Request, version: int, updated_at, load):
+    etag = make_etag(version, request)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CATALOG_MAX_AGE}, must-revalidate"}
+    last_modified = updated_at.replace(tzinfo=timezone.utc) if updated_at else None
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    not_modified = is_not_modified(request, etag, last_modified)
+    if not_modified and not matches_any(request):
+        return Response(status_code=304, headers=headers)
+    data = await load()
+    if data is None:
+        return None
+    # На "*" 304 только для записи, которая нашлась, иначе — 404
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="application/json", headers=headers)
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import re
+import tempfile
+from starlette.concurrency import run_in_threadpool
+from process_pool import DEFAULT_WORKERS, PoolBusy, ProcessPool
+
+# Картинки каталога на локальном диске, адресуемые по содержимому: путь —
+# sha256 файла, поэтому URL никогда не меняет смысла и отдаётся с immutable.
+# Уменьшенные варианты считаются в пуле процессов (Pillow, CPU) и
+# лежат рядом: <digest>-<size>.<ext>. Pillow импортируется только в этих процессах
+IMAGE_ROOT = os.getenv("IMAGE_ROOT", "./media/images")
+IMAGE_URL_PREFIX = "/images"
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+# Защита от «бомб»: картинка больше стольких пикселей не декодируется
+IMAGE_MAX_PIXELS = 50_000_000
+# Варианты: имя → наибольшая сторона в пикселях. Размер входит в URL, так что
+# новые размеры не конфликтуют с закешированными клиентами старыми
+IMAGE_VARIANTS = {"thumb": 160, "card": 480, "large": 1280}
+IMAGE_JPEG_QUALITY = 85
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(DEFAULT_WORKERS)))
+# Сколько картинок может одновременно обрабатываться или ждать пула
+IMAGE_QUEUE_LIMIT = int(os.getenv("IMAGE_QUEUE_LIMIT", str(IMAGE_WORKERS * 4)))
+# Сколько секунд запрос ждёт места в очереди, прежде чем получить 503
+IMAGE_QUEUE_TIMEOUT = float(os.getenv("IMAGE_QUEUE_TIMEOUT", "5.0"))
+READ_CHUNK = 1024 * 1024
+
+# Расширение → формат Pillow и Content-Type
+FORMATS = {
+    "jpg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+}
+IMAGE_URL = re.compile(rf"^{IMAGE_URL_PREFIX}/([0-9a-f]{{64}})\.({'|'.join(FORMATS)})$")
+
+class InvalidImage(Exception):
+    pass
+
+class ImageTooLarge(Exception):
+    pass
+
+class ImagesBusy(PoolBusy):
+    pass
+
+_pool = ProcessPool(IMAGE_WORKERS, IMAGE_QUEUE_LIMIT, IMAGE_QUEUE_TIMEOUT, busy=ImagesBusy)
+
+stats = {
+    "uploaded": 0,
+    "deduplicated": 0,
+    "variants_generated": 0,
+    "rejected": 0,
+}
+
+def _sniff(head: bytes):
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def original_path(digest: str, ext: str):
+    return os.path.join(IMAGE_ROOT, digest[:2], f"{digest}.{ext}")
+
+def variant_path(digest: str, size: int, ext: str):
+    return os.path.join(IMAGE_ROOT, digest[:2], f"{digest}-{size}.{ext}")
+
+def variant_urls(image):
+    # Для загруженных через /images/ картинок — URL вариантов; внешние
+    # ссылки, которые были в image раньше, остаются как есть (None)
+    match = IMAGE_URL.match(image) if image else None
+    if match is None:
+        return None
+    digest, ext = match.groups()
+    urls = {"original": image}
+    for name, size in IMAGE_VARIANTS.items():
+        urls[name] = f"{IMAGE_URL_PREFIX}/{digest}/{size}.{ext}"
+    return urls
+
+def with_variant_urls(item: dict):
+    # Для быстрого пути каталога: поле images в конце, как у computed_field схемы
+    item["images"] = variant_urls(item["image"])
+    return item
+
+def _store_original(file):
+    # Пишется во временный файл рядом и переносится на место атомарно;
+    # одинаковое содержимое оказывается в одном и том же файле
+    head = file.read(12)
+    ext = _sniff(head)
+    if ext is None:
+        raise InvalidImage("Unsupported image format, expected JPEG, PNG or WebP")
+    os.makedirs(IMAGE_ROOT, exist_ok=True)
+    digest = hashlib.sha256(head)
+    size = len(head)
+    fd, tmp_path = tempfile.mkstemp(dir=IMAGE_ROOT, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(head)
+            while chunk := file.read(READ_CHUNK):
+                size += len(chunk)
+                if size > IMAGE_MAX_BYTES:
+                    raise ImageTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+        digest = digest.hexdigest()
+        path = original_path(digest, ext)
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+            return digest, ext, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return digest, ext, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+# Функция верхнего уровня, чтобы её можно было передать в процесс пула
+def _make_variants(digest: str, ext: str, sizes):
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+    try:
+        with Image.open(original_path(digest, ext)) as image:
+            if image.width * image.height > IMAGE_MAX_PIXELS:
+                raise InvalidImage(f"Image is larger than {IMAGE_MAX_PIXELS} pixels")
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+            if FORMATS[ext][0] == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            for size in sizes:
+                path = variant_path(digest, size, ext)
+                if os.path.exists(path):
+                    continue
+                variant = image.copy()
+                # thumbnail не увеличивает: маленький оригинал остаётся своего размера
+                variant.thumbnail((size, size), Image.LANCZOS)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+                try:
+                    with os.fdopen(fd, "wb") as out:
+                        variant.save(out, FORMATS[ext][0], quality=IMAGE_JPEG_QUALITY, optimize=True)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as exc:
+        raise InvalidImage(f"Unreadable image: {exc}")
+    return width, height
+
+def shutdown():
+    _pool.shutdown()
+
+async def make_variants(digest: str, ext: str, sizes=None):
+    return await _pool.run(_make_variants, digest, ext, tuple(sizes or IMAGE_VARIANTS.values()))
+
+async def store_image(file):
+    """Сохраняет загруженную картинку и её варианты. Возвращает
+    (digest, ext, width, height)."""
+    try:
+        digest, ext, created = await run_in_threadpool(_store_original, file)
+    except (InvalidImage, ImageTooLarge):
+        stats["rejected"] += 1
+        raise
+    try:
+        width, height = await make_variants(digest, ext)
+    except (InvalidImage, ImagesBusy) as exc:
+        # Без вариантов загрузка не удалась: новый оригинал не оставляем,
+        # при ImagesBusy клиент повторит её позже
+        if isinstance(exc, InvalidImage):
+            stats["rejected"] += 1
+        if created:
+            os.unlink(original_path(digest, ext))
+        raise
+    stats["uploaded" if created else "deduplicated"] += 1
+    if created:
+        stats["variants_generated"] += len(IMAGE_VARIANTS)
+    return digest, ext, width, height
+
+def image_stats():
+    return dict(stats, pool=_pool.stats())
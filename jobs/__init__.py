@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import RoutingSession, SessionLocal
+from models.job import Job
+
+# Очередь фоновых задач в той же базе, что и данные. Задача записывается в
+# транзакции, которая её порождает (outbox): закоммитился заказ — есть и его
+# задачи, откатился — нет. Обработчик выполняется в одной транзакции с
+# отметкой status='done', поэтому его записи в базу применяются ровно один
+# раз; внешние вызовы должны быть идемпотентными сами (ключ от id заказа).
+# Воркеры запускаются в приложении (JOB_WORKERS > 0) или отдельно:
+# JOB_WORKERS=0 в приложении и python -m jobs
+
+# Сколько задач одновременно выполняет процесс
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# 1 — обработчики выполняются сразу в транзакции вызывающего, без очереди
+JOBS_INLINE = os.getenv("JOBS_INLINE", "0") == "1"
+# Сколько задач воркер забирает за один запрос
+JOB_CLAIM_BATCH = 10
+# Через сколько секунд задачу зависшего воркера заберёт другой
+JOB_LEASE = 60.0
+# Как часто свободный воркер проверяет очередь; свои задачи будят его сразу
+JOB_POLL_INTERVAL = 1.0
+JOB_MAX_ATTEMPTS = 8
+# Отсрочка после n-й ошибки: JOB_RETRY_BASE * 2**(n-1), не больше JOB_RETRY_MAX
+JOB_RETRY_BASE = 1.0
+JOB_RETRY_MAX = 300.0
+# Сколько хранятся выполненные задачи
+JOB_RETENTION = timedelta(days=1)
+JOB_PURGE_INTERVAL = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+stats = {"completed": 0, "retried": 0, "failed": 0}
+
+_wakeup = None
+
+def handler(kind: str):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+async def enqueue(db: AsyncSession, kind: str, payload: dict):
+    # Без commit: задача появится вместе с остальными изменениями сессии
+    if JOBS_INLINE:
+        await HANDLERS[kind](db, payload)
+        return
+    db.add(Job(kind=kind, payload=payload, run_at=time.time()))
+    db.info["jobs_enqueued"] = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def _wake_workers(session):
+    if session.info.pop("jobs_enqueued", False) and _wakeup is not None:
+        _wakeup.set()
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_enqueued(session):
+    session.info.pop("jobs_enqueued", None)
+
+def retry_delay(attempts: int):
+    delay = min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (attempts - 1))
+    # Разброс, чтобы упавшие вместе задачи не повторялись тоже вместе
+    return delay * random.uniform(0.5, 1.0)
+
+async def claim(db: AsyncSession, limit: int = JOB_CLAIM_BATCH):
+    now = time.time()
+    due = (Job.status.in_(("pending", "running")), Job.run_at <= now)
+    # Сначала чтение: пустой опрос не должен брать блокировку записи SQLite
+    if await db.scalar(select(Job.id).filter(*due).limit(1)) is None:
+        return []
+    ids = select(Job.id).filter(*due).order_by(Job.run_at).limit(limit).scalar_subquery()
+    # Условие повторяется снаружи: в PostgreSQL параллельный воркер,
+    # дождавшись блокировки строки, увидит новый run_at и пропустит её
+    result = await db.execute(
+        update(Job).filter(Job.id.in_(ids), *due)
+        .values(status="running", attempts=Job.attempts + 1, run_at=now + JOB_LEASE)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts)
+    )
+    jobs = result.all()
+    await db.commit()
+    return jobs
+
+async def run_job(job_id: int, kind: str, payload, attempts: int):
+    # attempts в условии: если аренда истекла и задачу забрал другой
+    # воркер, её результат не затирается
+    owned = (Job.id == job_id, Job.status == "running", Job.attempts == attempts)
+    async with SessionLocal() as db:
+        try:
+            await HANDLERS[kind](db, payload)
+            done = await db.execute(
+                update(Job).filter(*owned).values(status="done", last_error=None, finished_at=func.now())
+            )
+            if done.rowcount != 1:
+                await db.rollback()
+                return
+            await db.commit()
+            stats["completed"] += 1
+            return
+        except Exception as exc:
+            await db.rollback()
+            error = f"{type(exc).__name__}: {exc}"[:1000]
+        if attempts >= JOB_MAX_ATTEMPTS:
+            logger.error("Job %s (%s) failed after %s attempts: %s", job_id, kind, attempts, error)
+            values = {"status": "failed", "last_error": error, "finished_at": func.now()}
+            stats["failed"] += 1
+        else:
+            logger.warning("Job %s (%s) attempt %s failed, will retry: %s", job_id, kind, attempts, error)
+            values = {"status": "pending", "last_error": error, "run_at": time.time() + retry_delay(attempts)}
+            stats["retried"] += 1
+        await db.execute(update(Job).filter(*owned).values(**values))
+        await db.commit()
+
+async def run_pending():
+    # Выполняет все задачи, срок которых наступил; для бенчмарков и скриптов
+    processed = 0
+    while True:
+        async with SessionLocal() as db:
+            jobs = await claim(db)
+        if not jobs:
+            return processed
+        for job in jobs:
+            await run_job(*job)
+        processed += len(jobs)
+
+async def purge_finished(db: AsyncSession, before: datetime = None):
+    before = before or datetime.utcnow() - JOB_RETENTION
+    result = await db.execute(delete(Job).filter(Job.status == "done", Job.finished_at < before))
+    await db.commit()
+    return result.rowcount
+
+async def _work():
+    while True:
+        # Сбрасываем до запроса: задача, закоммиченная после него, снова взведёт событие
+        _wakeup.clear()
+        try:
+            async with SessionLocal() as db:
+                jobs = await claim(db)
+            for job in jobs:
+                await run_job(*job)
+        except Exception:
+            logger.exception("Job worker iteration failed")
+            jobs = None
+        if not jobs:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+async def _purge_periodically():
+    while True:
+        await asyncio.sleep(JOB_PURGE_INTERVAL)
+        try:
+            async with SessionLocal() as db:
+                await purge_finished(db)
+        except Exception:
+            logger.exception("Finished jobs purge failed")
+
+def start_workers(workers: int = JOB_WORKERS):
+    global _wakeup
+    _wakeup = asyncio.Event()
+    return [asyncio.create_task(_work()) for _ in range(workers)] + [asyncio.create_task(_purge_periodically())]
+
+async def stop_workers(tasks):
+    global _wakeup
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _wakeup = None
+
+def jobs_stats():
+    return dict(stats, workers=JOB_WORKERS, inline=int(JOBS_INLINE))
@@ -0,0 +1,31 @@
+import argparse
+import asyncio
+import logging
+
+import jobs
+
+
+async def main(workers):
+    from database import engine
+    from migrations import check_schema
+    # Модули, регистрирующие обработчики задач
+    import crud.order  # noqa: F401
+
+    await check_schema()
+    tasks = jobs.start_workers(workers)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await jobs.stop_workers(tasks)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--workers", type=int, default=max(jobs.JOB_WORKERS, 1))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main(args.workers))
+    except KeyboardInterrupt:
+        pass
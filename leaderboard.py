@@ -0,0 +1,237 @@
+import bisect
+import time
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import RoutingSession
+from models.user import User
+from models.points import PointsLedgerEntry
+
+# Как часто воркер дочитывает журнал баллов, записанный другими воркерами
+LEADERBOARD_REFRESH_INTERVAL = 1.0
+# Сколько последних id журнала перечитывается при каждом обновлении: в
+# PostgreSQL запись с меньшим id может закоммититься позже большей
+LEADERBOARD_REFRESH_OVERLAP = 100
+# Как часто перечитывает всех пользователей целиком: регистрации и удаления
+# в других воркерах в журнал не попадают
+LEADERBOARD_RELOAD_INTERVAL = 600.0
+# Размер корзины упорядоченного списка; при двойном размере корзина делится
+LEADERBOARD_BUCKET_SIZE = 512
+
+class RankedList:
+    """Упорядоченный список уникальных ключей из отсортированных корзин.
+
+    Поиск корзины — бинпоиск по их максимумам, позиция — дерево Фенвика по
+    длинам корзин: позиция ключа и k-й элемент за O(log n), вставка и
+    удаление — O(log n) плюс сдвиг внутри одной корзины.
+    """
+
+    def __init__(self, keys=(), bucket_size: int = LEADERBOARD_BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        keys = sorted(keys)
+        self._buckets = [keys[i:i + bucket_size] for i in range(0, len(keys), bucket_size)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(keys)
+        self._rebuild_tree()
+
+    def __len__(self):
+        return self._len
+
+    def _rebuild_tree(self):
+        tree = [0] + [len(bucket) for bucket in self._buckets]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _grow(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _before(self, bucket: int):
+        # Сколько ключей в корзинах левее данной
+        total, i = 0, bucket
+        while i:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position: int):
+        # Корзина и смещение в ней для позиции 0 <= position < len
+        bucket, step = 0, 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            if bucket + step < len(self._tree) and self._tree[bucket + step] <= position:
+                bucket += step
+                position -= self._tree[bucket]
+            step >>= 1
+        return bucket, position
+
+    def add(self, key):
+        if not self._buckets:
+            self._buckets, self._maxes, self._len = [[key]], [key], 1
+            self._rebuild_tree()
+            return
+        i = min(bisect.bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        bisect.insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        self._len += 1
+        if len(bucket) > 2 * self.bucket_size:
+            self._buckets[i:i + 1] = [bucket[:self.bucket_size], bucket[self.bucket_size:]]
+            self._maxes[i:i + 1] = [self._buckets[i][-1], self._buckets[i + 1][-1]]
+            self._rebuild_tree()
+        else:
+            self._grow(i, 1)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        del bucket[bisect.bisect_left(bucket, key)]
+        self._len -= 1
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._grow(i, -1)
+        else:
+            del self._buckets[i], self._maxes[i]
+            self._rebuild_tree()
+
+    def bisect_left(self, key):
+        # Сколько ключей меньше key
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            return self._len
+        return self._before(i) + bisect.bisect_left(self._buckets[i], key)
+
+    def bisect_right(self, key):
+        i = bisect.bisect_right(self._maxes, key)
+        if i == len(self._buckets):
+            return self._len
+        return self._before(i) + bisect.bisect_right(self._buckets[i], key)
+
+    def slice(self, start: int, count: int):
+        if start >= self._len or count <= 0:
+            return []
+        bucket, offset = self._locate(start)
+        result = []
+        while bucket < len(self._buckets) and len(result) < count:
+            result.extend(self._buckets[bucket][offset:offset + count - len(result)])
+            bucket, offset = bucket + 1, 0
+        return result
+
+class Leaderboard:
+    # Баллы всех пользователей в памяти воркера, ключ (-points, user_id):
+    # первые — у кого больше баллов, при равенстве — кто раньше
+    # зарегистрировался. Свои изменения применяются после commit, чужие
+    # дочитываются из журнала баллов по возрастанию id
+    def __init__(self):
+        self.refreshes = 0
+        self.reloads = 0
+        self._ranked = RankedList()
+        self._points = {}
+        self._last_entry_id = 0
+        self._loaded_at = None
+        self._refreshed_at = 0.0
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def set(self, user_id: int, points):
+        # points=None — пользователь удалён
+        old = self._points.pop(user_id, None)
+        if old is not None:
+            self._ranked.remove((-old, user_id))
+        if points is not None:
+            self._points[user_id] = points
+            self._ranked.add((-points, user_id))
+
+    async def load(self, db: AsyncSession):
+        started = time.monotonic()
+        if self._loaded_at is not None:
+            # Пока идёт перечитывание, остальные запросы отвечают по старой копии
+            self._loaded_at = started
+        # id журнала до чтения пользователей: что закоммитят между двумя
+        # запросами, догрузит refresh, баланс в журнале абсолютный
+        last_entry_id = await db.scalar(select(func.coalesce(func.max(PointsLedgerEntry.id), 0)))
+        rows = (await db.execute(
+            select(User.id, User.points).order_by(User.points.desc(), User.id)
+        )).all()
+        self._points = {user_id: points or 0 for user_id, points in rows}
+        self._ranked = RankedList((-points, user_id) for user_id, points in self._points.items())
+        self._last_entry_id = last_entry_id
+        self._loaded_at = self._refreshed_at = started
+        self.reloads += 1
+
+    async def refresh(self, db: AsyncSession):
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at >= LEADERBOARD_RELOAD_INTERVAL:
+            await self.load(db)
+            return
+        if now - self._refreshed_at < LEADERBOARD_REFRESH_INTERVAL:
+            return
+        self._refreshed_at = now
+        rows = (await db.execute(
+            select(PointsLedgerEntry.id, PointsLedgerEntry.user_id, PointsLedgerEntry.balance_after)
+            .filter(PointsLedgerEntry.id > self._last_entry_id - LEADERBOARD_REFRESH_OVERLAP)
+            .order_by(PointsLedgerEntry.id)
+        )).all()
+        self.refreshes += 1
+        if not rows:
+            return
+        # Журнал читается целиком, со своими записями: последний баланс
+        # каждого пользователя. UPDATE users блокирует строку до вставки в
+        # журнал, так что у одного пользователя больший id — более поздний
+        # баланс, и перечитанные старые записи его не откатят. Незнакомых
+        # проверяем по users — запись могла остаться от удалённого пользователя
+        balances = {user_id: balance for _, user_id, balance in rows}
+        unknown = [user_id for user_id in balances if user_id not in self._points]
+        if unknown:
+            existing = set((await db.execute(select(User.id).filter(User.id.in_(unknown)))).scalars())
+            for user_id in unknown:
+                if user_id not in existing:
+                    del balances[user_id]
+        for user_id, balance in balances.items():
+            if self._points.get(user_id) != balance:
+                self.set(user_id, balance)
+        self._last_entry_id = max(self._last_entry_id, rows[-1][0])
+
+    def points(self, user_id: int):
+        return self._points.get(user_id)
+
+    def rank(self, points: int):
+        # Место с учётом равенства: 1 + сколько пользователей набрали больше
+        return self._ranked.bisect_left((-points, 0)) + 1
+
+    def page(self, limit: int, after=None):
+        # after — (points, user_id) последней записи предыдущей страницы
+        start = self._ranked.bisect_right((-after[0], after[1])) if after else 0
+        return [(user_id, -negative) for negative, user_id in self._ranked.slice(start, limit)]
+
+    def __len__(self):
+        return len(self._ranked)
+
+    def clear(self):
+        self.__init__()
+
+    def stats(self):
+        return {"users": len(self._ranked), "last_entry_id": self._last_entry_id,
+                "refreshes": self.refreshes, "reloads": self.reloads}
+
+leaderboard = Leaderboard()
+
+def stage(db: AsyncSession, user_id: int, points):
+    # Изменение попадёт в таблицу после commit этой сессии, при откате пропадёт
+    db.info.setdefault("leaderboard", {})[user_id] = points
+
+@event.listens_for(RoutingSession, "after_commit")
+def _apply_staged(session):
+    staged = session.info.pop("leaderboard", None)
+    if staged and leaderboard.loaded:
+        for user_id, points in staged.items():
+            leaderboard.set(user_id, points)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _drop_staged(session):
+    session.info.pop("leaderboard", None)
@@ -1,28 +1,108 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routers.auth_router import auth_router
 from routers.product_router import product_router
 from routers.billboard_router import billboard_router
-from database import Base, engine
+from database import DB_POOL_WARM, engine, read_engine, replica_engines, mark_sticky, warm_pool
+from migrations import check_schema
+from cache import cache_stats
+from metrics import MetricsMiddleware, instrument_engine, metrics, render_metrics
+from security import token_cache
+import hashing
+import images
+from crud.points import compact_ledger_periodically
+from revocation import purge_expired_periodically, revoked_tokens
+from leaderboard import leaderboard
+import jobs
 from routers.points_router import points_router
 from routers.order_router import order_router
-# Создание таблиц в базе данных
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
-
-# Настройка CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Подключение маршрутов
-app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
-app.include_router(product_router, prefix="/product", tags=["Products"])
-app.include_router(billboard_router, prefix="/billboards", tags=["billboards"])
-app.include_router(points_router, prefix="/points", tags=["points"])
-app.include_router(order_router, prefix="/order", tags=["order"])
+from routers.image_router import image_router
+
+# Схема создаётся и обновляется отдельно: python -m migrations.
+# Всё, что раньше делали startup/shutdown, — здесь: задачи отменяются и
+# дожидаются до закрытия пулов bcrypt и картинок
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await check_schema()
+    for pooled in {engine, read_engine, *replica_engines}:
+        await warm_pool(pooled, DB_POOL_WARM)
+    tasks = [
+        asyncio.create_task(compact_ledger_periodically()),
+        asyncio.create_task(purge_expired_periodically()),
+    ]
+    # Воркеры очереди задач; при JOB_WORKERS=0 задачи выполняет python -m jobs
+    job_workers = jobs.start_workers() if jobs.JOB_WORKERS > 0 else []
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await jobs.stop_workers(job_workers)
+        hashing.shutdown()
+        images.shutdown()
+
+service_router = APIRouter()
+
+# Счётчики попаданий и промахов кешей каталога
+@service_router.get("/cache/stats", tags=["cache"])
+async def get_cache_stats():
+    return cache_stats()
+
+# Метрики в формате Prometheus
+@service_router.get("/metrics", tags=["metrics"], response_class=PlainTextResponse)
+async def get_metrics():
+    extra = [("catalog_cache", stats, {"cache": name}) for name, stats in cache_stats().items()]
+    extra += [
+        ("bcrypt_pool", hashing.hashing_stats(), {}),
+        ("token_cache", token_cache.stats(), {}),
+        ("token_revocations", revoked_tokens.stats(), {}),
+        ("leaderboard", leaderboard.stats(), {}),
+        ("jobs", jobs.jobs_stats(), {}),
+        ("images", images.image_stats(), {}),
+    ]
+    return PlainTextResponse(render_metrics(extra=extra), media_type="text/plain; version=0.0.4")
+
+# Самые медленные запросы с текстом SQL (METRICS_SLOW_SAMPLE_SIZE > 0)
+@service_router.get("/metrics/slow", tags=["metrics"])
+async def get_slow_requests():
+    return metrics.slowest()
+
+# После записи клиент на время читает с основной базы, а не с реплик
+async def read_your_writes(request: Request, call_next):
+    return mark_sticky(request, await call_next(request))
+
+# uvicorn main:create_app --factory; main:app — то же приложение, собранное при импорте
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+
+    # Настройка CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(read_your_writes)
+
+    # Гистограммы задержек и счётчики SQL по маршрутам; подключается последним,
+    # чтобы учитывать время всех остальных middleware
+    for instrumented in {engine, read_engine, *replica_engines}:
+        instrument_engine(instrumented)
+    app.add_middleware(MetricsMiddleware)
+
+    # Подключение маршрутов
+    app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
+    app.include_router(product_router, prefix="/product", tags=["Products"])
+    app.include_router(billboard_router, prefix="/billboards", tags=["billboards"])
+    app.include_router(points_router, prefix="/points", tags=["points"])
+    app.include_router(order_router, prefix="/order", tags=["order"])
+    app.include_router(image_router, prefix=images.IMAGE_URL_PREFIX, tags=["images"])
+    app.include_router(service_router)
+    return app
+
+app = create_app()
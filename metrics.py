@@ -0,0 +1,213 @@
+import bisect
+import contextvars
+import heapq
+import logging
+import os
+import re
+import time
+import weakref
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Столько одинаковых SELECT за запрос считаем признаком N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "10"))
+# Заголовок Server-Timing с временем в базе и в приложении
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "0") == "1"
+# Сколько самых медленных запросов хранить вместе с текстом SQL; 0 — выключено
+SLOW_SAMPLE_SIZE = int(os.getenv("METRICS_SLOW_SAMPLE_SIZE", "0"))
+
+_instrumented = weakref.WeakSet()
+_IN_LIST = re.compile(r"\((?:\?|%\(\w+\)s|\$\d+)(?:, (?:\?|%\(\w+\)s|\$\d+))*\)")
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class RequestStats:
+    __slots__ = ("queries", "query_seconds", "statements", "sampled")
+
+    def __init__(self, sampled: bool):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.statements = {}
+        self.sampled = [] if sampled else None
+
+class Metrics:
+    def __init__(self, slow_sample_size: int = SLOW_SAMPLE_SIZE):
+        self.slow_sample_size = slow_sample_size
+        self.latency = {}
+        self.queries = {}
+        self.query_seconds = {}
+        self.n_plus_one = {}
+        self._slowest = []
+        self._seq = 0
+
+    def record(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        key = (method, route, f"{status // 100}xx")
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram()
+        histogram.observe(elapsed)
+        self.queries[key[:2]] = self.queries.get(key[:2], 0) + stats.queries
+        self.query_seconds[key[:2]] = self.query_seconds.get(key[:2], 0.0) + stats.query_seconds
+
+        repeated = [sql for sql, count in stats.statements.items() if count >= N_PLUS_ONE_THRESHOLD]
+        if repeated:
+            if key[:2] not in self.n_plus_one:
+                logger.warning("Possible N+1 in %s %s: %d x %s", method, route, stats.statements[repeated[0]], repeated[0])
+            self.n_plus_one[key[:2]] = self.n_plus_one.get(key[:2], 0) + 1
+
+        if stats.sampled is not None and (
+            len(self._slowest) < self.slow_sample_size or elapsed > self._slowest[0][0]
+        ):
+            self._seq += 1
+            sample = (elapsed, self._seq, {
+                "method": method, "route": route, "status": status,
+                "duration_ms": round(elapsed * 1000, 2), "queries": stats.sampled,
+            })
+            if len(self._slowest) < self.slow_sample_size:
+                heapq.heappush(self._slowest, sample)
+            else:
+                heapq.heapreplace(self._slowest, sample)
+
+    def slowest(self):
+        return [sample for _, _, sample in sorted(self._slowest, reverse=True)]
+
+    def reset(self):
+        self.__init__(self.slow_sample_size)
+
+metrics = Metrics()
+current_request = contextvars.ContextVar("current_request", default=None)
+
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+    # Повторный вызов (второе приложение из create_app) не должен удваивать счёт
+    if sync_engine in _instrumented:
+        return
+    _instrumented.add(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = current_request.get()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        if statement.lstrip()[:6].upper() == "SELECT":
+            shape = _IN_LIST.sub("(...)", statement)
+            stats.statements[shape] = stats.statements.get(shape, 0) + 1
+        if stats.sampled is not None:
+            stats.sampled.append({"sql": " ".join(statement.split()), "duration_ms": round(elapsed * 1000, 3)})
+
+class MetricsMiddleware:
+    # Чистый ASGI, без BaseHTTPMiddleware: не создаёт лишнюю задачу на запрос
+    def __init__(self, app, registry: Metrics = metrics, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.registry = registry
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(sampled=self.registry.slow_sample_size > 0)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    app_ms = (time.perf_counter() - start) * 1000
+                    value = (
+                        f'db;dur={stats.query_seconds * 1000:.2f};desc="{stats.queries} queries", '
+                        f"app;dur={app_ms:.2f}"
+                    )
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            # Шаблон пути, а не сам путь: иначе по метке на каждый id
+            self.registry.record(
+                scope["method"], route.path if route is not None else "unmatched",
+                status, time.perf_counter() - start, stats,
+            )
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+# Поля *_stats(), которые только растут
+COUNTER_FIELDS = {
+    "hits", "misses", "evictions", "submitted", "completed", "rejected",
+    "busy_seconds", "cache_hits", "cache_misses", "rehashed", "refreshes", "reloads",
+    "retried", "failed", "uploaded", "deduplicated", "variants_generated",
+}
+
+def _collect_stats(families, prefix, stats, labels):
+    for field, value in stats.items():
+        if isinstance(value, dict):
+            _collect_stats(families, f"{prefix}_{field}", value, labels)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            counter = field in COUNTER_FIELDS
+            name = f"{prefix}_{field}_total" if counter else f"{prefix}_{field}"
+            kind, samples = families.setdefault(name, ("counter" if counter else "gauge", []))
+            samples.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+def render_metrics(registry: Metrics = metrics, extra=()):
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route, status), histogram in sorted(registry.latency.items()):
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+            cumulative += count
+            labels = _labels(method=method, route=route, status=status, le=bound)
+            lines.append(f"http_request_duration_seconds_bucket{labels} {cumulative}")
+        labels = _labels(method=method, route=route, status=status)
+        lines.append(f"http_request_duration_seconds_sum{labels} {histogram.sum}")
+        lines.append(f"http_request_duration_seconds_count{labels} {histogram.count}")
+
+    for name, help_text, values in (
+        ("db_queries_total", "SQL statements executed while serving the route", registry.queries),
+        ("db_query_duration_seconds_total", "Time spent in SQL statements", registry.query_seconds),
+        ("db_n_plus_one_requests_total", f"Requests repeating one SELECT at least {N_PLUS_ONE_THRESHOLD} times", registry.n_plus_one),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (method, route), value in sorted(values.items()):
+            lines.append(f"{name}{_labels(method=method, route=route)} {value}")
+
+    # Счётчики кешей, пула bcrypt и токенов
+    families = {}
+    for prefix, stats, labels in extra:
+        _collect_stats(families, prefix, stats, labels)
+    for name, (kind, samples) in families.items():
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
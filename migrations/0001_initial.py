@@ -0,0 +1,18 @@
+from database import Base
+import models.user  # noqa: F401
+import models.product  # noqa: F401
+import models.billboard  # noqa: F401
+import models.order  # noqa: F401
+import models.points  # noqa: F401
+import models.table_version  # noqa: F401
+import models.revoked_token  # noqa: F401
+
+# Таблицы, которые раньше создавал create_all при старте приложения.
+# На существующей базе ничего не делает
+TABLES = [
+    "users", "products", "billboards", "orders", "order_items",
+    "points_transactions", "points_balances", "table_versions", "revoked_tokens",
+]
+
+def upgrade(conn):
+    Base.metadata.create_all(conn, tables=[Base.metadata.tables[name] for name in TABLES])
@@ -0,0 +1,34 @@
+from sqlalchemy import inspect, text
+
+# Базы, созданные до появления users.role и заказов из нескольких позиций:
+# create_all не менял существующие таблицы
+
+def upgrade(conn):
+    schema = inspect(conn)
+    if "role" not in {column["name"] for column in schema.get_columns("users")}:
+        conn.execute(text("ALTER TABLE users ADD COLUMN role VARCHAR DEFAULT 'default'"))
+
+    product_id = next(column for column in schema.get_columns("orders") if column["name"] == "product_id")
+    if product_id["nullable"]:
+        return
+    if conn.dialect.name != "sqlite":
+        conn.execute(text("ALTER TABLE orders ALTER COLUMN product_id DROP NOT NULL"))
+        return
+    # SQLite не умеет менять ограничения столбца: пересоздаём таблицу
+    conn.execute(text("""
+        CREATE TABLE _orders_new (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER,
+            quantity INTEGER,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id),
+            FOREIGN KEY(product_id) REFERENCES products (id)
+        )
+    """))
+    conn.execute(text(
+        "INSERT INTO _orders_new (id, user_id, product_id, quantity) SELECT id, user_id, product_id, quantity FROM orders"
+    ))
+    conn.execute(text("DROP TABLE orders"))
+    conn.execute(text("ALTER TABLE _orders_new RENAME TO orders"))
+    conn.execute(text("CREATE INDEX ix_orders_id ON orders (id)"))
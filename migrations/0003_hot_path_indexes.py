@@ -0,0 +1,16 @@
+from sqlalchemy import text
+
+# Индексы под горячие запросы. В SQLite каждый индекс неявно заканчивается
+# rowid, так что (user_id) уже работает как (user_id, id) для keyset-пагинации
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_product_id ON orders (product_id)",
+    "CREATE INDEX IF NOT EXISTS ix_products_is_available ON products (is_available)",
+    "CREATE INDEX IF NOT EXISTS ix_products_is_available_name ON products (is_available, name)",
+]
+
+def upgrade(conn):
+    for statement in INDEXES:
+        conn.execute(text(statement))
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("ANALYZE"))
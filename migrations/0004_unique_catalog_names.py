@@ -0,0 +1,26 @@
+import logging
+from sqlalchemy import inspect, text
+
+# Импорт каталога обновляет товары и билборды по имени (INSERT ... ON CONFLICT),
+# поэтому имя должно быть уникальным. Дубликаты не удаляются — на них могут
+# ссылаться заказы: первая запись с именем остаётся как есть, остальные
+# переименовываются в "<name> (<id>)"
+TABLES = ("products", "billboards")
+
+logger = logging.getLogger(__name__)
+
+def upgrade(conn):
+    schema = inspect(conn)
+    for table in TABLES:
+        index = next((index for index in schema.get_indexes(table) if index["name"] == f"ix_{table}_name"), None)
+        if index is not None and index["unique"]:
+            continue
+        renamed = conn.execute(text(
+            f"UPDATE {table} SET name = name || ' (' || id || ')' "
+            f"WHERE id NOT IN (SELECT min(id) FROM {table} GROUP BY name) RETURNING id, name"
+        )).all()
+        for row_id, name in renamed:
+            logger.warning("Duplicate name in %s: row %s renamed to %r", table, row_id, name)
+        if index is not None:
+            conn.execute(text(f"DROP INDEX ix_{table}_name"))
+        conn.execute(text(f"CREATE UNIQUE INDEX ix_{table}_name ON {table} (name)"))
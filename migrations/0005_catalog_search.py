@@ -0,0 +1,41 @@
+from sqlalchemy import text
+
+# Полнотекстовый поиск по name и description: FTS5-таблицы с внешним
+# содержимым (текст не дублируется, хранится только индекс) и триггеры,
+# которые держат их в синхронизации с products и billboards. Триггеры
+# срабатывают и на INSERT ... ON CONFLICT DO UPDATE из импорта каталога.
+# prefix='2 3' — отдельные индексы префиксов для быстрых запросов "ша"*, "шап"*
+TABLES = ("products", "billboards")
+# Совпадение в названии весит больше, чем в описании
+RANK = "bm25(10.0, 1.0)"
+
+def upgrade(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        fts = f"{table}_fts"
+        conn.execute(text(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                name, description, content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """))
+        conn.execute(text(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', '{RANK}')"))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description);
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF name, description ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+                INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description);
+            END
+        """))
+        # Индекс для уже существующих строк
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
@@ -0,0 +1,6 @@
+from sqlalchemy import text
+
+# Таблица лидеров читает пользователей в порядке (points DESC, id)
+
+def upgrade(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_points ON users (points DESC, id)"))
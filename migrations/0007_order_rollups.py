@@ -0,0 +1,41 @@
+from sqlalchemy import inspect, text
+from database import Base
+from migrations import backfill_legacy_order_items
+import models.order  # noqa: F401
+
+# Стоимость и баллы в самом заказе и итоги по пользователям и товарам.
+# Существующие заказы считаются один раз здесь, дальше итоги ведёт place_order.
+# Старые заказы из одной позиции сначала получают позицию в order_items, чтобы
+# оба итога считались по одним и тем же заказам. Баллы старых заказов — по
+# той же доле 0.25 от стоимости
+POINTS_RATE = 0.25
+
+def upgrade(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("orders")}
+    for name in ("total", "points"):
+        if name not in columns:
+            conn.execute(text(f"ALTER TABLE orders ADD COLUMN {name} INTEGER"))
+    backfill_legacy_order_items(conn)
+    conn.execute(text("""
+        UPDATE orders SET total = (
+            SELECT sum(order_items.quantity * order_items.price) FROM order_items WHERE order_items.order_id = orders.id
+        ) WHERE total IS NULL
+    """))
+    conn.execute(text(f"UPDATE orders SET points = CAST(total * {POINTS_RATE} AS INTEGER) WHERE points IS NULL AND total IS NOT NULL"))
+
+    Base.metadata.create_all(conn, tables=[
+        Base.metadata.tables["user_order_stats"], Base.metadata.tables["product_order_stats"],
+    ])
+    if conn.execute(text("SELECT 1 FROM user_order_stats LIMIT 1")).first() is None:
+        conn.execute(text("""
+            INSERT INTO user_order_stats (user_id, orders, quantity, revenue, points)
+            SELECT user_id, count(*), coalesce(sum(quantity), 0), coalesce(sum(total), 0), coalesce(sum(points), 0)
+            FROM orders GROUP BY user_id
+        """))
+    if conn.execute(text("SELECT 1 FROM product_order_stats LIMIT 1")).first() is None:
+        conn.execute(text(f"""
+            INSERT INTO product_order_stats (product_id, orders, quantity, revenue, points)
+            SELECT product_id, count(DISTINCT order_id), sum(quantity), sum(quantity * price),
+                   sum(CAST(quantity * price * {POINTS_RATE} AS INTEGER))
+            FROM order_items GROUP BY product_id
+        """))
@@ -0,0 +1,7 @@
+from database import Base
+import models.job  # noqa: F401
+
+# Очередь фоновых задач (outbox заказов)
+
+def upgrade(conn):
+    Base.metadata.create_all(conn, tables=[Base.metadata.tables["jobs"]])
@@ -0,0 +1,10 @@
+from database import Base
+from migrations import rebuild_with_autoincrement
+import models.revoked_token  # noqa: F401
+
+# RevocationSet догружает отзывы с id больше последнего прочитанного, а
+# purge_expired удаляет истёкшие строки. Без AUTOINCREMENT SQLite после
+# очистки снова выдаёт маленькие id, и другие воркеры новых отзывов не видят
+
+def upgrade(conn):
+    rebuild_with_autoincrement(conn, Base.metadata.tables["revoked_tokens"])
@@ -0,0 +1,12 @@
+from database import Base
+from migrations import rebuild_with_autoincrement
+import models.user  # noqa: F401
+import models.points  # noqa: F401
+
+# Leaderboard.refresh дочитывает журнал баллов с id больше последнего
+# прочитанного, а compact_ledger удаляет записи старше суток вплоть до
+# последней. Без AUTOINCREMENT SQLite снова выдаёт удалённые id, и новые
+# начисления другие воркеры пропускают
+
+def upgrade(conn):
+    rebuild_with_autoincrement(conn, Base.metadata.tables["points_transactions"])
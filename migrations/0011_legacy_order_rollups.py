@@ -0,0 +1,49 @@
+from sqlalchemy import text
+from migrations import backfill_legacy_order_items
+
+# 0007 до исправления строила итоги по пользователям из orders, а по товарам —
+# из order_items, где старых заказов из одной позиции нет: у них не было ни
+# выручки, ни баллов, ни строк в product_order_stats. Здесь им добавляются
+# позиции, и их доля прибавляется к итогам. Такие заказы узнаются по пустому
+# total: новые заказы записывают его сразу. Итоги новых заказов не
+# пересчитываются — их ведут задачи очереди
+POINTS_RATE = 0.25
+
+LEGACY_ORDERS = """
+    SELECT orders.id, orders.user_id, sum(order_items.quantity * order_items.price) AS total
+    FROM orders JOIN order_items ON order_items.order_id = orders.id
+    WHERE orders.total IS NULL GROUP BY orders.id, orders.user_id
+"""
+
+def upgrade(conn):
+    backfill_legacy_order_items(conn)
+    conn.execute(text(f"""
+        UPDATE user_order_stats SET
+            revenue = revenue + coalesce((
+                SELECT sum(legacy.total) FROM ({LEGACY_ORDERS}) legacy WHERE legacy.user_id = user_order_stats.user_id
+            ), 0),
+            points = points + coalesce((
+                SELECT sum(CAST(legacy.total * {POINTS_RATE} AS INTEGER)) FROM ({LEGACY_ORDERS}) legacy
+                WHERE legacy.user_id = user_order_stats.user_id
+            ), 0)
+        WHERE user_id IN (SELECT user_id FROM orders WHERE total IS NULL)
+    """))
+    conn.execute(text(f"""
+        INSERT INTO product_order_stats (product_id, orders, quantity, revenue, points)
+        SELECT order_items.product_id, count(DISTINCT order_items.order_id), sum(order_items.quantity),
+               sum(order_items.quantity * order_items.price),
+               sum(CAST(order_items.quantity * order_items.price * {POINTS_RATE} AS INTEGER))
+        FROM order_items JOIN orders ON orders.id = order_items.order_id
+        WHERE orders.total IS NULL GROUP BY order_items.product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            orders = product_order_stats.orders + excluded.orders,
+            quantity = product_order_stats.quantity + excluded.quantity,
+            revenue = product_order_stats.revenue + excluded.revenue,
+            points = product_order_stats.points + excluded.points
+    """))
+    conn.execute(text("""
+        UPDATE orders SET total = (
+            SELECT sum(order_items.quantity * order_items.price) FROM order_items WHERE order_items.order_id = orders.id
+        ) WHERE total IS NULL
+    """))
+    conn.execute(text(f"UPDATE orders SET points = CAST(total * {POINTS_RATE} AS INTEGER) WHERE points IS NULL AND total IS NOT NULL"))
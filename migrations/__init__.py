@@ -0,0 +1,99 @@
+import importlib
+import logging
+import pkgutil
+import re
+from sqlalchemy import Column, DateTime, MetaData, String, Table, func, insert, select, text
+
+logger = logging.getLogger(__name__)
+
+# Миграции — модули вида NNNN_name.py с функцией upgrade(conn), где conn —
+# синхронный Connection. Каждая выполняется в своей транзакции и
+# записывается в schema_migrations. Запуск: python -m migrations
+MIGRATION_NAME = re.compile(r"^\d{4}_\w+$")
+
+metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", metadata,
+    Column("name", String, primary_key=True),
+    Column("applied_at", DateTime, server_default=func.now(), nullable=False),
+)
+
+class SchemaOutdated(Exception):
+    pass
+
+def available():
+    return sorted(info.name for info in pkgutil.iter_modules(__path__) if MIGRATION_NAME.match(info.name))
+
+async def applied(target_engine):
+    async with target_engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+        return set((await conn.execute(select(schema_migrations.c.name))).scalars())
+
+async def pending(target_engine=None):
+    from database import engine
+    done = await applied(target_engine or engine)
+    return [name for name in available() if name not in done]
+
+async def upgrade(target_engine=None):
+    from database import engine
+    target_engine = target_engine or engine
+    names = await pending(target_engine)
+    for name in names:
+        module = importlib.import_module(f"{__name__}.{name}")
+        async with target_engine.begin() as conn:
+            await conn.run_sync(module.upgrade)
+            await conn.execute(insert(schema_migrations).values(name=name))
+        logger.info("Applied migration %s", name)
+    return names
+
+def _table_sql(conn, name):
+    return conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+    ).scalar()
+
+def rebuild_with_autoincrement(conn, table):
+    # SQLite не добавляет AUTOINCREMENT к существующей таблице: старая
+    # переименовывается, новая создаётся по модели, строки копируются.
+    # Счётчик sqlite_sequence продолжается с наибольшего скопированного id.
+    # В PostgreSQL последовательности id не переиспользуют, но выдают id при
+    # INSERT, а не при commit: кто догружает таблицу по возрастанию id,
+    # перечитывает ещё и несколько последних (REVOCATION_REFRESH_OVERLAP,
+    # LEADERBOARD_REFRESH_OVERLAP)
+    if conn.dialect.name != "sqlite":
+        return
+    old = f"_{table.name}_old"
+    # pysqlite выполняет DDL вне транзакции миграции: если прошлый запуск
+    # прервался после переименования, пересоздание продолжается с _<name>_old
+    if _table_sql(conn, old) is None:
+        sql = _table_sql(conn, table.name)
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            return
+        indexes = conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"),
+            {"name": table.name},
+        ).scalars().all()
+        for index in indexes:
+            conn.execute(text(f"DROP INDEX {index}"))
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {old}"))
+    table.create(conn, checkfirst=True)
+    columns = ", ".join(column.name for column in table.columns)
+    conn.execute(text(f"INSERT OR IGNORE INTO {table.name} ({columns}) SELECT {columns} FROM {old}"))
+    conn.execute(text(f"DROP TABLE {old}"))
+
+def backfill_legacy_order_items(conn):
+    # Старые заказы из одной позиции хранили только product_id и quantity.
+    # Цена позиции — текущая цена товара: приближение, цена на момент заказа
+    # не сохранилась. Заказы удалённых товаров остаются без позиций
+    return conn.execute(text("""
+        INSERT INTO order_items (order_id, product_id, quantity, price)
+        SELECT orders.id, orders.product_id, coalesce(orders.quantity, 1), products.price
+        FROM orders JOIN products ON products.id = orders.product_id
+        WHERE orders.total IS NULL
+          AND NOT EXISTS (SELECT 1 FROM order_items WHERE order_items.order_id = orders.id)
+    """)).rowcount
+
+async def check_schema(target_engine=None):
+    # Приложение схему не меняет, только проверяет, что миграции применены
+    names = await pending(target_engine)
+    if names:
+        raise SchemaOutdated(f"Database schema is out of date, run `python -m migrations` (pending: {', '.join(names)})")
@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+import logging
+
+from migrations import available, pending, upgrade
+
+
+async def main(command):
+    from database import engine
+
+    if command == "status":
+        waiting = await pending()
+        for name in available():
+            print(f"{'pending' if name in waiting else 'applied'}  {name}")
+    else:
+        names = await upgrade()
+        print(f"Applied {len(names)} migration(s)" + (f": {', '.join(names)}" if names else ""))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m migrations")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status"], default="upgrade")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args().command))
@@ -5,7 +5,7 @@ class Billboard(Base):
     __tablename__ = "billboards"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
+    name = Column(String, index=True, unique=True, nullable=False)
     description = Column(String, nullable=True)
     image = Column(String, nullable=True)
     text_color = Column(String, nullable=True)
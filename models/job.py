@@ -0,0 +1,20 @@
+from sqlalchemy import JSON, Column, DateTime, Float, Index, Integer, String, func
+from database import Base
+
+# Очередь фоновых задач. run_at — когда задачу смотреть в следующий раз:
+# у pending — время запуска (с учётом отсрочки после ошибки), у running —
+# конец аренды, после которого задачу заберёт другой воркер
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    run_at = Column(Float, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+Index("ix_jobs_status_run_at", Job.status, Job.run_at)
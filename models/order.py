@@ -8,9 +8,49 @@ class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    # Заполняется только для заказов из одной позиции, состав заказа хранится в order_items
+    product_id = Column(Integer, ForeignKey("products.id"), index=True, nullable=True)
     quantity = Column(Integer, default=1)
+    # Стоимость и начисленные баллы на момент заказа; у старых заказов — по
+    # цене товара на момент миграции, у старых заказов удалённых товаров неизвестны
+    total = Column(Integer, nullable=True)
+    points = Column(Integer, nullable=True)
 
     user = relationship("User", back_populates="orders")
     product = relationship("Product")  # Adding relationship to Product
+    items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+
+# Позиция заказа
+class OrderItem(Base):
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True, nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False, default=1)
+    price = Column(Integer, nullable=False)
+
+    order = relationship("Order", back_populates="items")
+    product = relationship("Product")
+
+# Итоги по заказам, обновляются в транзакции заказа: статистика читается
+# одной строкой, без агрегации orders и order_items
+class UserOrderStats(Base):
+    __tablename__ = "user_order_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
+    points = Column(Integer, nullable=False, default=0)
+
+class ProductOrderStats(Base):
+    __tablename__ = "product_order_stats"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
+    # Баллы за позиции с этим товаром: POINTS_RATE от стоимости позиции
+    points = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from database import Base
+
+# Журнал операций с баллами (только добавление записей). Таблица лидеров
+# дочитывает его по возрастанию id, а compact_ledger удаляет старые записи,
+# поэтому id не должны повторяться: в SQLite это AUTOINCREMENT
+class PointsLedgerEntry(Base):
+    __tablename__ = "points_transactions"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    delta = Column(Integer, nullable=False)
+    balance_after = Column(Integer, nullable=False)
+    reason = Column(String, nullable=False)
+    idempotency_key = Column(String, unique=True, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+# Свёрнутый баланс по старым записям журнала
+class PointsBalance(Base):
+    __tablename__ = "points_balances"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    balance = Column(Integer, nullable=False, default=0)
+    last_entry_id = Column(Integer, nullable=False, default=0)
+    compacted_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
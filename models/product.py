@@ -1,13 +1,14 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean
+from sqlalchemy import Column, Integer, String, Float, Boolean, Index
 from database import Base
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (Index("ix_products_is_available_name", "is_available", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
+    name = Column(String, index=True, unique=True, nullable=False)
     description = Column(String, nullable=True)
     image = Column(String, nullable=True)
     price = Column(Integer, nullable=False)
-    is_available = Column(Boolean, default=True)
+    is_available = Column(Boolean, default=True, index=True)
     stock = Column(Integer, default=0)
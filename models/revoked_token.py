@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+# Отозванные токены; строка живёт до exp токена, потом удаляется.
+# Воркеры догружают таблицу по возрастанию id, поэтому id не должны
+# повторяться после удаления строк: в SQLite это AUTOINCREMENT
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String, unique=True, nullable=False)
+    expires_at = Column(Integer, nullable=False, index=True)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from database import Base
+
+# Счётчик изменений таблицы: из него строятся ETag и Last-Modified
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -11,4 +11,7 @@ class User(Base):
     hashed_password = Column(String)
     points = Column(Integer, default=0)  
     orders = relationship("Order", back_populates="user")
-    role = Column(String, default="default")
\ No newline at end of file
+    role = Column(String, default="default")
+
+# Таблица лидеров перечитывается в порядке (points DESC, id) прямо по индексу
+Index("ix_users_points", User.points.desc(), User.id)
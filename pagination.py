@@ -0,0 +1,51 @@
+import base64
+import binascii
+import json
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+MAX_PAGE_SIZE = 1000
+
+class InvalidCursor(Exception):
+    pass
+
+def encode_cursor(sort: str, value, row_id: int):
+    raw = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str, sort: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, row_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor()
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise InvalidCursor()
+    return value, row_id
+
+def keyset(stmt, sort_column, id_column, cursor, sort: str):
+    # Страница продолжается с последней записи предыдущей, а не с OFFSET:
+    # глубокие страницы читаются по индексу так же быстро, как первая
+    if sort_column is id_column:
+        if cursor:
+            _, row_id = decode_cursor(cursor, sort)
+            stmt = stmt.filter(id_column > row_id)
+        return stmt.order_by(id_column)
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort)
+        stmt = stmt.filter(tuple_(sort_column, id_column) > tuple_(value, row_id))
+    return stmt.order_by(sort_column, id_column)
+
+async def fetch_page(db: AsyncSession, stmt, sort_column, id_column, sort: str, cursor, limit: int, skip: int = 0, scalars: bool = True):
+    # scalars=False — для select() по колонкам: строки вместо ORM-объектов
+    stmt = keyset(stmt, sort_column, id_column, cursor, sort)
+    if skip:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt.limit(limit + 1))
+    rows = (result.scalars() if scalars else result).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
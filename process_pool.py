@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+
+# CPU-работа (bcrypt, Pillow) выполняется в отдельных процессах: она занимает
+# CPU на десятки миллисекунд и не должна блокировать event loop и GIL воркера.
+# Пул свой у каждого воркера uvicorn, поэтому по умолчанию CPU делятся между
+# воркерами; их число берётся из WEB_CONCURRENCY (его же читает uvicorn --workers)
+APP_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) // APP_WORKERS)
+
+class PoolBusy(Exception):
+    pass
+
+class ProcessPool:
+    # Не больше queue_limit операций одновременно выполняется или ждёт пула;
+    # кто не дождался места за queue_timeout секунд, получает busy — роутеры
+    # отвечают 503, а не держат запрос без ограничения
+    def __init__(self, workers: int, queue_limit: int, queue_timeout: float, busy=PoolBusy):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.busy = busy
+        self.counters = {"submitted": 0, "completed": 0, "rejected": 0, "in_flight": 0, "busy_seconds": 0.0}
+        self._executor = None
+        self._slots = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn, а не fork: в процессе уже работают потоки aiosqlite
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self._slots = asyncio.Semaphore(self.queue_limit)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+
+    async def run(self, func, *args):
+        # func — функция верхнего уровня модуля, чтобы её можно было передать в процесс
+        executor = self._get_executor()
+        slots = self._slots
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["rejected"] += 1
+            raise self.busy()
+        self.counters["submitted"] += 1
+        self.counters["in_flight"] += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            self.counters["in_flight"] -= 1
+            self.counters["completed"] += 1
+            self.counters["busy_seconds"] += time.perf_counter() - start
+            slots.release()
+
+    def stats(self):
+        return dict(self.counters, workers=self.workers, queue_limit=self.queue_limit)
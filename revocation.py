@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal
+from models.revoked_token import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Как часто воркер подтягивает новые отзывы из базы: столько секунд
+# отозванный токен ещё может пройти на другом воркере
+REVOCATION_REFRESH_INTERVAL = 1.0
+# Сколько последних id перечитывается при каждом обновлении. В PostgreSQL id
+# выдаётся при INSERT, а видна строка после commit: отзыв с меньшим id может
+# закоммититься позже большего. Запас — больше, чем одновременных транзакций
+REVOCATION_REFRESH_OVERLAP = 100
+REVOCATION_PURGE_INTERVAL = 600
+
+class RevocationSet:
+    # Локальная копия таблицы revoked_tokens: jti -> exp. Догружается по
+    # возрастанию id с перекрытием REVOCATION_REFRESH_OVERLAP, так что
+    # обновление — один запрос по индексу
+    def __init__(self, refresh_interval: float = REVOCATION_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.refreshes = 0
+        self._revoked = {}
+        self._last_id = 0
+        self._checked_at = 0.0
+
+    async def refresh(self, db: AsyncSession):
+        self._checked_at = time.monotonic()
+        rows = (await db.execute(
+            select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.id > self._last_id - REVOCATION_REFRESH_OVERLAP)
+            .order_by(RevokedToken.id)
+        )).all()
+        self.refreshes += 1
+        for row in rows:
+            self._revoked[row.jti] = row.expires_at
+            self._last_id = max(self._last_id, row.id)
+
+    async def is_revoked(self, db: AsyncSession, jti: str):
+        if time.monotonic() - self._checked_at >= self.refresh_interval:
+            await self.refresh(db)
+        return jti in self._revoked
+
+    def add(self, jti: str, expires_at: int):
+        self._revoked[jti] = expires_at
+
+    def prune(self, now: int):
+        # Истёкший токен и так не пройдёт jwt.decode
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+
+    def clear(self):
+        self._revoked.clear()
+        self._last_id = 0
+        self._checked_at = 0.0
+
+    def stats(self):
+        return {"size": len(self._revoked), "last_id": self._last_id, "refreshes": self.refreshes}
+
+revoked_tokens = RevocationSet()
+
+async def revoke_token(db: AsyncSession, jti: str, expires_at: int):
+    # Возвращает False, если токен уже был отозван
+    db.add(RevokedToken(jti=jti, expires_at=expires_at))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        revoked_tokens.add(jti, expires_at)
+        return False
+    revoked_tokens.add(jti, expires_at)
+    return True
+
+async def purge_expired(db: AsyncSession, now: int = None):
+    now = int(time.time()) if now is None else now
+    result = await db.execute(delete(RevokedToken).filter(RevokedToken.expires_at <= now))
+    await db.commit()
+    revoked_tokens.prune(now)
+    return result.rowcount
+
+async def purge_expired_periodically(interval: int = REVOCATION_PURGE_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with SessionLocal() as db:
+                await purge_expired(db)
+        except Exception:
+            logger.exception("Revoked tokens purge failed")
@@ -1,24 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 from pydantic import BaseModel
 from models.user import User
 from models.order import Order
-from database import get_db
-
-# Настройки безопасности и токенов
-SECRET_KEY = "your_secret_key"  # Замените на ваш секретный ключ
-ALGORITHM = "HS256"
+from database import get_db, SessionLocal
+from hashing import hash_password, verify_password, hashing_stats, HashingBusy
+from security import (
+    SECRET_KEY, ALGORITHM, oauth2_scheme, CurrentUser, authenticate_token, invalidate_user, token_cache, token_id
+)
+from revocation import revoke_token, revoked_tokens
+from leaderboard import stage
+from pagination import fetch_page, InvalidCursor, MAX_PAGE_SIZE
+from streaming import ndjson_stream, json_array_stream
+
+# Настройки токенов
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Blacklist для токенов
-token_blacklist = set()
+USERS_EXPORT_BATCH_SIZE = 1000
 
 # Инициализация роутера
 auth_router = APIRouter()
@@ -35,57 +39,128 @@ class Token(BaseModel):
     token_type: str
 
 # Утилиты
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+async def create_user(db: AsyncSession, user: UserCreate):
+    hashed_password = await hash_password(user.password)
     db_user = User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    stage(db, db_user.id, 0)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user_by_username(db, username)
-    if not user or not pwd_context.verify(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user_by_username(db, username)
+    if not user:
         return None
+    valid, new_hash = await verify_password(username, password, user.hashed_password)
+    if not valid:
+        return None
+    # Хеш со старыми параметрами bcrypt пересчитывается при успешном входе
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
+def hashing_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, try again later",
+        headers={"Retry-After": "1"},
+    )
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    from jose import jwt
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_all_users(db: Session):
-    return db.query(User).all()
+USER_SORT_COLUMNS = {"id": User.id, "username": User.username}
+
+async def get_all_users(db: AsyncSession, limit: int = 100, cursor: Optional[str] = None, sort: str = "id"):
+    return await fetch_page(db, select(User), USER_SORT_COLUMNS[sort], User.id, sort, cursor, limit)
 
-def delete_user_by_id(db: Session, user_id: int):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_orders_by_user(db: AsyncSession, user_ids):
+    # Заказы всей страницы пользователей одним запросом вместо запроса на каждого
+    orders = {}
+    rows = await db.execute(
+        select(Order.user_id, Order.id, Order.product_id, Order.quantity)
+        .filter(Order.user_id.in_(user_ids))
+        .order_by(Order.id)
+    )
+    for user_id, order_id, product_id, quantity in rows:
+        orders.setdefault(user_id, []).append(
+            {"order_id": order_id, "product_id": product_id, "quantity": quantity}
+        )
+    return orders
+
+async def iter_users_with_orders(batch_size: int = USERS_EXPORT_BATCH_SIZE):
+    # Выгрузка идёт пачками по id: на каждую пачку два запроса (пользователи
+    # и их заказы), в памяти держится только текущая пачка. Сессия открывается
+    # здесь, потому что тело ответа отдаётся уже после выхода из зависимостей
+    last_id = 0
+    async with SessionLocal() as db:
+        while True:
+            users = (await db.execute(
+                select(User.id, User.username, User.points)
+                .filter(User.id > last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+            )).all()
+            if not users:
+                return
+            orders = await get_orders_by_user(db, [user.id for user in users])
+            for user in users:
+                yield {
+                    "id": user.id,
+                    "username": user.username,
+                    "points": user.points,
+                    "orders": orders.get(user.id, []),
+                }
+            last_id = users[-1].id
+
+async def delete_user_by_id(db: AsyncSession, user_id: int):
+    result = await db.execute(select(User).options(selectinload(User.orders)).filter(User.id == user_id))
+    user = result.scalars().first()
     if user:
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        stage(db, user_id, None)
+        await db.commit()
+        invalidate_user(user_id)
         return True
     return False
 
-def delete_all_users(db: Session):
-    users = db.query(User).all()
+async def delete_all_users(db: AsyncSession):
+    result = await db.execute(select(User).options(selectinload(User.orders)))
+    users = result.scalars().all()
     for user in users:
-        db.delete(user)
-    db.commit()
+        await db.delete(user)
+        stage(db, user.id, None)
+    await db.commit()
+    token_cache.clear()
 # Маршруты
 @auth_router.post("/register", response_model=dict)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user_by_username(db, username=user.username)
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    create_user(db, user)
+    try:
+        await create_user(db, user)
+    except HashingBusy:
+        raise hashing_busy()
     return {"message": "User registered successfully"}
 
 @auth_router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except HashingBusy:
+        raise hashing_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -98,75 +173,77 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     return {"access_token": access_token, "token_type": "bearer"}
 
 @auth_router.get("/users/me", response_model=dict)
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=403, detail="Invalid token")
-        user = get_user_by_username(db, username=username)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return {"id": user.id, "username": user.username, "points": user.points}
-    except JWTError:
-        raise HTTPException(status_code=403, detail="Invalid or expired token")
-
-
-@auth_router.get("/verify-token/{token}")
-def verify_token(token: str, db: Session = Depends(get_db)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        
-        if not username:
-            raise HTTPException(status_code=403, detail="Invalid token")
-        
-        user = get_user_by_username(db, username=username)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        expiration = datetime.utcfromtimestamp(payload.get("exp"))
-        if expiration < datetime.utcnow():
-            raise HTTPException(status_code=401, detail="Token has expired")
-        
-        return {"message": "Token is valid"}
-    
-    except JWTError:
-        raise HTTPException(status_code=403, detail="Invalid or expired token")
+async def get_current_user(current_user: CurrentUser, db: AsyncSession = Depends(get_db)):
+    points = (await db.execute(select(User.points).filter(User.id == current_user.id))).first()
+    if points is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"id": current_user.id, "username": current_user.username, "points": points[0]}
+
+@auth_router.get("/verify-token")
+async def verify_current_token(current_user: CurrentUser):
+    return {"message": "Token is valid"}
+
+# Токен в пути попадает в логи прокси, используйте GET /verify-token с заголовком Authorization
+@auth_router.get("/verify-token/{token}", deprecated=True)
+async def verify_token(token: str, db: AsyncSession = Depends(get_db)):
+    await authenticate_token(token, db)
+    return {"message": "Token is valid"}
 
 @auth_router.post("/logout")
-def logout_user(token: str = Depends(oauth2_scheme)):
-    if token in token_blacklist:
+async def logout_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    # Уже отозванный токен отклоняется здесь же с 403
+    claims, _ = await authenticate_token(token, db)
+    if not await revoke_token(db, token_id(token, claims), claims["exp"]):
         raise HTTPException(status_code=403, detail="Token is already invalidated")
-    token_blacklist.add(token)
     return {"message": "User successfully logged out"}
 
-@auth_router.get("/users", response_model=list)
-def get_users(db: Session = Depends(get_db)):
-    users = get_all_users(db)
+@auth_router.get("/users", response_model=dict)
+async def get_users(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "username"] = "id",
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        users, next_cursor = await get_all_users(db, limit=limit, cursor=cursor, sort=sort)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    orders = await get_orders_by_user(db, [user.id for user in users])
     result = []
     for user in users:
-        orders = [{
-            "order_id": order.id,
-            "product_id": order.product_id,
-            "quantity": order.quantity
-        } for order in user.orders]
         result.append({
             "id": user.id,
             "username": user.username,
             "points": user.points,
-            "orders": orders
+            "orders": orders.get(user.id, [])
         })
-    return result
+    return {"items": result, "next_cursor": next_cursor}
+
+# Нагрузка на пул хеширования паролей
+@auth_router.get("/hashing/stats", response_model=dict)
+async def get_hashing_stats():
+    return hashing_stats()
+
+# Попадания в кеш проверенных токенов
+@auth_router.get("/tokens/stats", response_model=dict)
+async def get_token_cache_stats():
+    return {**token_cache.stats(), "revoked": revoked_tokens.stats()}
+
+# Потоковая выгрузка всех пользователей с заказами
+@auth_router.get("/users/export")
+async def export_users(format: Literal["ndjson", "json"] = "ndjson"):
+    if format == "ndjson":
+        return StreamingResponse(ndjson_stream(iter_users_with_orders()), media_type="application/x-ndjson")
+    return StreamingResponse(json_array_stream(iter_users_with_orders()), media_type="application/json")
 
 @auth_router.delete("/users/{user_id}", response_model=dict)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    success = delete_user_by_id(db, user_id)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    success = await delete_user_by_id(db, user_id)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User successfully deleted"}
 
 @auth_router.delete("/users", response_model=dict)
-def delete_all_users_route(db: Session = Depends(get_db)):
-    delete_all_users(db)
+async def delete_all_users_route(db: AsyncSession = Depends(get_db)):
+    await delete_all_users(db)
     return {"message": "All users have been deleted"}
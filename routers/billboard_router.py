@@ -1,47 +1,105 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db
+from http_cache import conditional_json
+from streaming import csv_stream, ndjson_stream
+from uploads import upload_batches
+from pagination import InvalidCursor, MAX_PAGE_SIZE
+from crud.catalog import NameTaken, SearchUnavailable
+from crud.version import get_version
+from models.billboard import Billboard
 from crud.billboard import (
-    create_billboard, get_billboards, get_billboard, update_billboard, delete_billboard
+    create_billboard, get_billboards_json, get_billboard_json, update_billboard, delete_billboard,
+    import_billboards, iter_billboards, search_billboards_json, BILLBOARD_RESPONSE_COLUMNS,
 )
 from schemas.billboard import BillboardCreate, BillboardUpdate, BillboardResponse
-from fastapi.middleware.cors import CORSMiddleware
+from schemas.pagination import Page
 billboard_router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
+@billboard_router.post("/", response_model=BillboardResponse)
+async def create_new_billboard(billboard: BillboardCreate, db: AsyncSession = Depends(get_db)):
     try:
-        yield db
-    finally:
-        db.close()
+        return await create_billboard(db, billboard)
+    except NameTaken:
+        raise HTTPException(status_code=409, detail="billboard with this name already exists")
 
-@billboard_router.post("/", response_model=BillboardResponse)
-def create_new_billboard(billboard: BillboardCreate, db: Session = Depends(get_db)):
-    return create_billboard(db, billboard)
+# Импорт NDJSON или CSV: upsert по имени пачками, ошибки по строкам в отчёте
+@billboard_router.post("/import", response_model=dict)
+async def import_billboards_file(
+    file: UploadFile,
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    return await import_billboards(db, upload_batches(file, format))
+
+# Потоковая выгрузка в тех же форматах, что принимает импорт
+@billboard_router.get("/export")
+async def export_billboards(format: Literal["ndjson", "csv"] = "ndjson"):
+    if format == "csv":
+        fieldnames = [column.key for column in BILLBOARD_RESPONSE_COLUMNS]
+        return StreamingResponse(csv_stream(iter_billboards(), fieldnames), media_type="text/csv")
+    return StreamingResponse(ndjson_stream(iter_billboards()), media_type="application/x-ndjson")
+
+@billboard_router.get("/", response_model=Page[BillboardResponse])
+async def read_billboards(
+    request: Request,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "name"] = "id",
+    skip: int = Query(0, ge=0, deprecated=True),
+    db: AsyncSession = Depends(get_read_db),
+):
+    version, updated_at = await get_version(db, Billboard.__tablename__)
+    try:
+        return await conditional_json(
+            request, version, updated_at,
+            lambda: get_billboards_json(db, limit=limit, cursor=cursor, sort=sort, skip=skip, version=version),
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-@billboard_router.get("/", response_model=list[BillboardResponse])
-def read_billboards(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    return get_billboards(db, skip=skip, limit=limit)
+# Полнотекстовый поиск по названию и описанию, по релевантности
+@billboard_router.get("/search", response_model=Page[BillboardResponse])
+async def search_billboards(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        data = await search_billboards_json(db, q, limit=limit, cursor=cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except SearchUnavailable:
+        raise HTTPException(status_code=501, detail="Search requires SQLite FTS5")
+    return Response(content=data, media_type="application/json")
 
 @billboard_router.get("/{billboard_id}", response_model=BillboardResponse)
-def read_billboard(billboard_id: int, db: Session = Depends(get_db)):
-    billboard = get_billboard(db, billboard_id)
-    if not billboard:
+async def read_billboard(request: Request, billboard_id: int, db: AsyncSession = Depends(get_read_db)):
+    version, updated_at = await get_version(db, Billboard.__tablename__)
+    response = await conditional_json(request, version, updated_at, lambda: get_billboard_json(db, billboard_id, version))
+    if response is None:
         raise HTTPException(status_code=404, detail="billboard not found")
-    return billboard
+    return response
 
 @billboard_router.put("/{billboard_id}", response_model=BillboardResponse)
-def update_existing_billboard(
-    billboard_id: int, billboard_update: BillboardUpdate, db: Session = Depends(get_db)
+async def update_existing_billboard(
+    billboard_id: int, billboard_update: BillboardUpdate, db: AsyncSession = Depends(get_db)
 ):
-    updated_billboard = update_billboard(db, billboard_id, billboard_update)
+    try:
+        updated_billboard = await update_billboard(db, billboard_id, billboard_update)
+    except NameTaken:
+        raise HTTPException(status_code=409, detail="billboard with this name already exists")
     if not updated_billboard:
         raise HTTPException(status_code=404, detail="billboard not found")
     return updated_billboard
 
 @billboard_router.delete("/{billboard_id}", response_model=BillboardResponse)
-def delete_existing_billboard(billboard_id: int, db: Session = Depends(get_db)):
-    deleted_billboard = delete_billboard(db, billboard_id)
+async def delete_existing_billboard(billboard_id: int, db: AsyncSession = Depends(get_db)):
+    deleted_billboard = await delete_billboard(db, billboard_id)
     if not deleted_billboard:
         raise HTTPException(status_code=404, detail="billboard not found")
     return deleted_billboard
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+from fastapi import APIRouter, HTTPException, Request, Response, UploadFile, status
+from fastapi.responses import FileResponse
+from http_cache import is_not_modified
+from images import (
+    FORMATS, IMAGE_CACHE_CONTROL, IMAGE_MAX_BYTES, IMAGE_URL_PREFIX, IMAGE_VARIANTS,
+    ImageTooLarge, ImagesBusy, InvalidImage,
+    make_variants, original_path, store_image, variant_path, variant_urls,
+)
+from schemas.image import ImageResponse
+image_router = APIRouter()
+
+def images_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many images are being processed, try again later",
+        headers={"Retry-After": "1"},
+    )
+
+# Загрузка картинки: ответ содержит URL оригинала для поля image товара или
+# билборда и URL уменьшенных копий
+@image_router.post("/", response_model=ImageResponse)
+async def upload_image(file: UploadFile):
+    try:
+        digest, ext, width, height = await store_image(file.file)
+    except InvalidImage as exc:
+        raise HTTPException(status_code=415, detail=str(exc))
+    except ImageTooLarge:
+        raise HTTPException(status_code=413, detail=f"Image is larger than {IMAGE_MAX_BYTES} bytes")
+    except ImagesBusy:
+        raise images_busy()
+    url = f"{IMAGE_URL_PREFIX}/{digest}.{ext}"
+    return ImageResponse(digest=digest, url=url, width=width, height=height, images=variant_urls(url))
+
+def _check_name(digest: str, ext: str):
+    if len(digest) != 64 or digest.strip("0123456789abcdef") or ext not in FORMATS:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+def _serve(request: Request, path: str, ext: str):
+    # Содержимое по URL не меняется, поэтому кешируется на год без перепроверки.
+    # FileResponse отдаёт файл кусками из пула потоков и сам обрабатывает Range
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    response = FileResponse(path, media_type=FORMATS[ext][1], stat_result=stat_result,
+                            headers={"Cache-Control": IMAGE_CACHE_CONTROL})
+    if is_not_modified(request, response.headers["etag"], None):
+        return Response(status_code=304, headers={"ETag": response.headers["etag"], "Cache-Control": IMAGE_CACHE_CONTROL})
+    return response
+
+@image_router.get("/{digest}.{ext}")
+async def get_original(request: Request, digest: str, ext: str):
+    _check_name(digest, ext)
+    response = _serve(request, original_path(digest, ext), ext)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return response
+
+@image_router.get("/{digest}/{size}.{ext}")
+async def get_variant(request: Request, digest: str, size: int, ext: str):
+    _check_name(digest, ext)
+    if size not in IMAGE_VARIANTS.values():
+        raise HTTPException(status_code=404, detail="Image not found")
+    response = _serve(request, variant_path(digest, size, ext), ext)
+    if response is None:
+        # Вариант размера, добавленного после загрузки, считается при первом запросе
+        if not os.path.exists(original_path(digest, ext)):
+            raise HTTPException(status_code=404, detail="Image not found")
+        try:
+            await make_variants(digest, ext, [size])
+        except InvalidImage:
+            raise HTTPException(status_code=404, detail="Image not found")
+        except ImagesBusy:
+            raise images_busy()
+        response = _serve(request, variant_path(digest, size, ext), ext)
+    return response
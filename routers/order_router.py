@@ -1,89 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models.user import User
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from database import get_db, get_read_db
 from models.order import Order
-from models.product import Product
-from schemas.order import OrderCreate, OrderResponse
+from schemas.order import OrderCreate, OrderResponse, OrderStats
+from crud.points import UserNotFound
+from crud.order import (
+    place_order, remove_order, get_orders_json, get_order_stats_json, get_user_order_stats,
+    ProductNotFound, OutOfStock,
+)
+from pagination import InvalidCursor, MAX_PAGE_SIZE
+from schemas.pagination import Page
 # Роутер для работы с заказами
 order_router = APIRouter()
 
-# Получение сессии базы данных
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Утилита для получения пользователя по ID
-def get_user_by_id(db: Session, user_id: int):
-    return db.query(User).filter(User.id == user_id).first()
-
-def get_product_by_id(db: Session, product_id: int):
-    return db.query(Product).filter(Product.id == product_id).first()
-
 # Утилита для получения заказа по ID
-def get_order_by_id(db: Session, order_id: int):
-    return db.query(Order).filter(Order.id == order_id).first()
+async def get_order_by_id(db: AsyncSession, order_id: int):
+    result = await db.execute(select(Order).options(selectinload(Order.items)).filter(Order.id == order_id))
+    return result.scalars().first()
 
-# Функция для начисления баллов
-def add_points(db: Session, user_id: int, points: int):
-    user = get_user_by_id(db, user_id)
-    if user:
-        user.points += points
-        db.commit()
-        db.refresh(user)
-    return user
+def order_to_dict(order: Order):
+    return {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "product_id": order.product_id,
+        "quantity": order.quantity,
+        "order_price": order.total,
+        "points_added": order.points,
+        "items": [{"product_id": item.product_id, "quantity": item.quantity, "price": item.price} for item in order.items],
+    }
 
-# Создание заказа
+# Создание заказа: списание остатка, заказ и задачи очереди (jobs) в одной
+# транзакции; баллы и итоги по заказам начисляют задачи после commit
 @order_router.post("/", response_model=OrderResponse)
-def create_order(order: OrderCreate, db: Session = Depends(get_db)):
-    user = get_user_by_id(db, order.user_id)
-    if not user:
+async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db)):
+    try:
+        new_order, items, order_value, points_to_add = await place_order(db, order)
+    except UserNotFound:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    # Получаем продукт по ID
-    product = get_product_by_id(db, order.product_id)
-    if not product:
+    except ProductNotFound:
         raise HTTPException(status_code=404, detail="Product not found")
+    except OutOfStock:
+        raise HTTPException(status_code=409, detail="Product is out of stock")
     
-    # Создание нового заказа
-    new_order = Order(user_id=order.user_id, product_id=order.product_id, quantity=order.quantity)
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
-    
-    # Рассчитываем стоимость заказа и начисляем баллы (25% от стоимости)
-    order_value = new_order.quantity * product.price  # Используем цену из модели Product
-    points_to_add = int(order_value * 0.25)  # 25% от стоимости
-    
-    # Начисляем баллы пользователю
-    add_points(db, user.id, points_to_add)
-    
-    return {"order_id": new_order.id, "user_id": new_order.user_id, "product_id": product.id, "order_price": order_value, "quantity": new_order.quantity, "points_added": points_to_add}
+    return {"order_id": new_order.id, "user_id": new_order.user_id, "product_id": new_order.product_id, "order_price": order_value, "quantity": new_order.quantity, "points_added": points_to_add, "items": items}
 
 # Получение всех заказов
-@order_router.get("/", response_model=list[OrderResponse])
-def get_all_orders(db: Session = Depends(get_db)):
-    orders = db.query(Order).all()
-    return [{"order_id": order.id, "user_id": order.user_id, "product_id": order.product_id, "quantity": order.quantity} for order in orders]
+@order_router.get("/", response_model=Page[OrderResponse])
+async def get_all_orders(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        data = await get_orders_json(db, limit=limit, cursor=cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Готовые байты: response_model остаётся только для схемы OpenAPI
+    return Response(content=data, media_type="application/json")
+
+# Итоги по пользователям (by=user) или товарам (by=product) из таблиц итогов
+@order_router.get("/stats", response_model=Page[OrderStats])
+async def get_order_stats(
+    by: Literal["user", "product"] = "user",
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        data = await get_order_stats_json(db, by, limit=limit, cursor=cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return Response(content=data, media_type="application/json")
+
+# История заказов пользователя
+@order_router.get("/user/{user_id}", response_model=Page[OrderResponse])
+async def get_user_orders(
+    user_id: int,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        data = await get_orders_json(db, limit=limit, cursor=cursor, user_id=user_id)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except UserNotFound:
+        raise HTTPException(status_code=404, detail="User not found")
+    return Response(content=data, media_type="application/json")
+
+# Итоги по заказам пользователя за всё время
+@order_router.get("/user/{user_id}/stats", response_model=OrderStats)
+async def get_user_stats(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    try:
+        return await get_user_order_stats(db, user_id)
+    except UserNotFound:
+        raise HTTPException(status_code=404, detail="User not found")
 
 # Получение заказа по ID
 @order_router.get("/{order_id}", response_model=OrderResponse)
-def get_order(order_id: int, db: Session = Depends(get_db)):
-    order = get_order_by_id(db, order_id)
+async def get_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    order = await get_order_by_id(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return {"order_id": order.id, "user_id": order.user_id, "product_id": order.product_id, "quantity": order.quantity}
+    return order_to_dict(order)
 
 # Удаление заказа по ID
 @order_router.delete("/{order_id}", response_model=dict)
-def delete_order(order_id: int, db: Session = Depends(get_db)):
-    order = get_order_by_id(db, order_id)
+async def delete_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    order = await get_order_by_id(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    
-    db.delete(order)
-    db.commit()
+
+    await remove_order(db, order)
     return {"message": "Order deleted successfully"}
@@ -1,53 +1,99 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db
 from models.user import User
-from schemas.points import PointsTransaction, PointsResponse
+from crud.points import (
+    apply_points, apply_points_batch, get_leaderboard_page, get_rank,
+    UserNotFound, InsufficientPoints, IdempotencyConflict, BatchConflict,
+)
+from pagination import decode_cursor, InvalidCursor, MAX_PAGE_SIZE
+from schemas.points import (
+    PointsTransaction, PointsResponse, PointsBatchResponse, LeaderboardEntry, PointsRankResponse
+)
+from schemas.pagination import Page
 
 # Роутер для работы с баллами
 points_router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    result = await db.execute(select(User).filter(User.id == user_id))
+    return result.scalars().first()
 
-def get_user_by_id(db: Session, user_id: int):
-    return db.query(User).filter(User.id == user_id).first()
+async def change_points(db: AsyncSession, user_id: int, delta: int, reason: str, idempotency_key: Optional[str]):
+    try:
+        return await apply_points(db, user_id, delta, reason, idempotency_key)
+    except UserNotFound:
+        raise HTTPException(status_code=404, detail="User not found")
+    except InsufficientPoints:
+        raise HTTPException(status_code=400, detail="Not enough points")
+    except IdempotencyConflict:
+        raise HTTPException(status_code=409, detail="Idempotency key was already used for another request")
 
 # Начисление баллов
 @points_router.post("/add", response_model=PointsResponse)
-def add_points(user_id: int, points: int, db: Session = Depends(get_db)):
-    user = get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    user.points += points
-    db.commit()
-    db.refresh(user)
-    return {"user_id": user.id, "points": user.points, "message": "Points added successfully"}
+async def add_points(
+    user_id: int,
+    points: int = Query(..., gt=0),
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    entry = await change_points(db, user_id, points, "add", idempotency_key)
+    return {"user_id": entry.user_id, "points": entry.balance_after, "message": "Points added successfully"}
 
 # Списание баллов
 @points_router.post("/redeem", response_model=PointsResponse)
-def redeem_points(user_id: int, points: int, db: Session = Depends(get_db)):
-    user = get_user_by_id(db, user_id)
-    if not user:
+async def redeem_points(
+    user_id: int,
+    points: int = Query(..., gt=0),
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    entry = await change_points(db, user_id, -points, "redeem", idempotency_key)
+    return {"user_id": entry.user_id, "points": entry.balance_after, "message": "Points redeemed successfully"}
+
+# Пакетное начисление и списание баллов в одной транзакции
+@points_router.post("/batch", response_model=PointsBatchResponse)
+async def batch_points(transactions: list[PointsTransaction], db: AsyncSession = Depends(get_db)):
+    try:
+        results = await apply_points_batch(db, transactions)
+    except BatchConflict:
+        raise HTTPException(status_code=409, detail="Points were changed concurrently, retry the batch")
+    applied = sum(1 for result in results if result["status"] == "ok")
+    return {"applied": applied, "failed": len(results) - applied, "results": results}
+
+# Таблица лидеров: по убыванию баллов, при равенстве — кто раньше зарегистрировался.
+# Читает основную базу: журнал баллов с реплики может отставать
+@points_router.get("/leaderboard", response_model=Page[LeaderboardEntry])
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, "points")
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not isinstance(after[0], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    items, next_cursor = await get_leaderboard_page(db, limit, after)
+    return {"items": items, "next_cursor": next_cursor}
+
+# Место пользователя в таблице лидеров
+@points_router.get("/{user_id}/rank", response_model=PointsRankResponse)
+async def get_user_rank(user_id: int, db: AsyncSession = Depends(get_db)):
+    try:
+        return await get_rank(db, user_id)
+    except UserNotFound:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    if user.points < points:
-        raise HTTPException(status_code=400, detail="Not enough points")
-    
-    user.points -= points
-    db.commit()
-    db.refresh(user)
-    return {"user_id": user.id, "points": user.points, "message": "Points redeemed successfully"}
 
 # Получение текущего количества баллов
 @points_router.get("/{user_id}", response_model=PointsResponse)
-def get_user_points(user_id: int, db: Session = Depends(get_db)):
-    user = get_user_by_id(db, user_id)
+async def get_user_points(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    user = await get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
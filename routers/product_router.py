@@ -1,47 +1,110 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db
+from http_cache import conditional_json
+from streaming import csv_stream, ndjson_stream
+from uploads import upload_batches
+from pagination import InvalidCursor, MAX_PAGE_SIZE
+from crud.catalog import NameTaken, SearchUnavailable
+from crud.version import get_version
+from models.product import Product
 from crud.product import (
-    create_product, get_products, get_product, update_product, delete_product
+    create_product, get_products_json, get_product_json, update_product, delete_product,
+    import_products, iter_products, search_products_json, PRODUCT_RESPONSE_COLUMNS,
 )
 from schemas.product import ProductCreate, ProductUpdate, ProductResponse
-from fastapi.middleware.cors import CORSMiddleware
+from schemas.pagination import Page
 product_router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
+@product_router.post("/", response_model=ProductResponse)
+async def create_new_product(product: ProductCreate, db: AsyncSession = Depends(get_db)):
     try:
-        yield db
-    finally:
-        db.close()
+        return await create_product(db, product)
+    except NameTaken:
+        raise HTTPException(status_code=409, detail="Product with this name already exists")
 
-@product_router.post("/", response_model=ProductResponse)
-def create_new_product(product: ProductCreate, db: Session = Depends(get_db)):
-    return create_product(db, product)
+# Импорт NDJSON или CSV: upsert по имени пачками, ошибки по строкам в отчёте
+@product_router.post("/import", response_model=dict)
+async def import_products_file(
+    file: UploadFile,
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    return await import_products(db, upload_batches(file, format))
+
+# Потоковая выгрузка в тех же форматах, что принимает импорт
+@product_router.get("/export")
+async def export_products(format: Literal["ndjson", "csv"] = "ndjson"):
+    if format == "csv":
+        fieldnames = [column.key for column in PRODUCT_RESPONSE_COLUMNS]
+        return StreamingResponse(csv_stream(iter_products(), fieldnames), media_type="text/csv")
+    return StreamingResponse(ndjson_stream(iter_products()), media_type="application/x-ndjson")
+
+@product_router.get("/", response_model=Page[ProductResponse])
+async def read_products(
+    request: Request,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "name"] = "id",
+    skip: int = Query(0, ge=0, deprecated=True),
+    db: AsyncSession = Depends(get_read_db),
+):
+    version, updated_at = await get_version(db, Product.__tablename__)
+    try:
+        return await conditional_json(
+            request, version, updated_at,
+            lambda: get_products_json(db, limit=limit, cursor=cursor, sort=sort, skip=skip, version=version),
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-@product_router.get("/", response_model=list[ProductResponse])
-def read_products(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    return get_products(db, skip=skip, limit=limit)
+# Полнотекстовый поиск по названию и описанию, по релевантности
+@product_router.get("/search", response_model=Page[ProductResponse])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    available: Optional[bool] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        data = await search_products_json(
+            db, q, limit=limit, cursor=cursor, available=available, min_price=min_price, max_price=max_price,
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except SearchUnavailable:
+        raise HTTPException(status_code=501, detail="Search requires SQLite FTS5")
+    return Response(content=data, media_type="application/json")
 
 @product_router.get("/{product_id}", response_model=ProductResponse)
-def read_product(product_id: int, db: Session = Depends(get_db)):
-    product = get_product(db, product_id)
-    if not product:
+async def read_product(request: Request, product_id: int, db: AsyncSession = Depends(get_read_db)):
+    version, updated_at = await get_version(db, Product.__tablename__)
+    response = await conditional_json(request, version, updated_at, lambda: get_product_json(db, product_id, version))
+    if response is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return response
 
 @product_router.put("/{product_id}", response_model=ProductResponse)
-def update_existing_product(
-    product_id: int, product_update: ProductUpdate, db: Session = Depends(get_db)
+async def update_existing_product(
+    product_id: int, product_update: ProductUpdate, db: AsyncSession = Depends(get_db)
 ):
-    updated_product = update_product(db, product_id, product_update)
+    try:
+        updated_product = await update_product(db, product_id, product_update)
+    except NameTaken:
+        raise HTTPException(status_code=409, detail="Product with this name already exists")
     if not updated_product:
         raise HTTPException(status_code=404, detail="Product not found")
     return updated_product
 
 @product_router.delete("/{product_id}", response_model=ProductResponse)
-def delete_existing_product(product_id: int, db: Session = Depends(get_db)):
-    deleted_product = delete_product(db, product_id)
+async def delete_existing_product(product_id: int, db: AsyncSession = Depends(get_db)):
+    deleted_product = await delete_product(db, product_id)
     if not deleted_product:
         raise HTTPException(status_code=404, detail="Product not found")
     return deleted_product
\ No newline at end of file
@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+class ImageResponse(BaseModel):
+    digest: str
+    url: str
+    width: int
+    height: int
+    images: dict[str, str]
@@ -1,12 +1,52 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional
+
+class OrderItemCreate(BaseModel):
+    product_id: int
+    quantity: int = Field(1, gt=0)
 
 class OrderCreate(BaseModel):
     user_id: int
-    product_id: int # This is the product ID that will be used to look up the product in the database
-    quantity: int = 1
+    product_id: Optional[int] = None # This is the product ID that will be used to look up the product in the database
+    quantity: int = Field(1, gt=0)
+    items: list[OrderItemCreate] = []
+
+    @model_validator(mode="after")
+    def check_lines(self):
+        if self.product_id is None and not self.items:
+            raise ValueError("Either product_id or items must be provided")
+        if self.product_id is not None and self.items:
+            raise ValueError("product_id and items are mutually exclusive")
+        return self
+
+    def lines(self):
+        # Одинаковые товары в корзине объединяются в одну позицию
+        if not self.items:
+            return {self.product_id: self.quantity}
+        lines = {}
+        for item in self.items:
+            lines[item.product_id] = lines.get(item.product_id, 0) + item.quantity
+        return lines
+
+class OrderItemResponse(BaseModel):
+    product_id: int
+    quantity: int
+    price: int
 
 class OrderResponse(BaseModel):
     order_id: int
     user_id: int
-    product_id: int
+    product_id: Optional[int] = None
+    quantity: int
+    # Нет у старых заказов без позиций
+    order_price: Optional[int] = None
+    points_added: Optional[int] = None
+    items: list[OrderItemResponse] = []
+
+# Итоги по заказам пользователя или товара; id — user_id или product_id
+class OrderStats(BaseModel):
+    id: int
+    orders: int
     quantity: int
+    revenue: int
+    points: int
@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
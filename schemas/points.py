@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class PointsTransaction(BaseModel):
     user_id: int
@@ -8,3 +9,26 @@ class PointsResponse(BaseModel):
     user_id: int
     points: int
     message: str
+
+class PointsBatchResult(BaseModel):
+    user_id: int
+    points: Optional[int] = None
+    status: str
+    detail: Optional[str] = None
+
+class PointsBatchResponse(BaseModel):
+    applied: int
+    failed: int
+    results: list[PointsBatchResult]
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: Optional[str] = None
+    points: int
+
+class PointsRankResponse(BaseModel):
+    user_id: int
+    points: int
+    rank: int
+    total: int
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, computed_field
 from typing import Optional
+from images import variant_urls
 
 class ProductBase(BaseModel):
     name: str
@@ -18,7 +19,12 @@ class ProductUpdate(ProductBase):
     stock: Optional[int] = None
 
 class ProductResponse(ProductBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
 
-    class Config:
-        orm_mode = True
+    # URL уменьшенных копий, если image загружена через /images/
+    @computed_field
+    @property
+    def images(self) -> Optional[dict[str, str]]:
+        return variant_urls(self.image)
@@ -0,0 +1,121 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Annotated
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
+from models.user import User
+from revocation import revoked_tokens
+
+# Настройки безопасности и токенов
+SECRET_KEY = "your_secret_key"  # Замените на ваш секретный ключ
+ALGORITHM = "HS256"
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+# Проверенные токены кешируются до их exp, но не дольше TOKEN_CACHE_TTL
+# секунд: столько другой воркер может не знать об удалении пользователя
+TOKEN_CACHE_SIZE = 10_000
+TOKEN_CACHE_TTL = 60.0
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    id: int
+    username: str
+    role: str
+
+class TokenCache:
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._by_user = {}
+
+    def get(self, token: str):
+        # Ключ — подпись JWT; полный токен сравнивается, чтобы чужой payload
+        # с той же подписью не прошёл без проверки
+        key = token.rpartition(".")[2]
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != token or entry[1] < time.time():
+            if entry is not None and entry[0] == token:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2], entry[3]
+
+    def put(self, token: str, claims: dict, user: UserSnapshot):
+        key = token.rpartition(".")[2]
+        expires = min(claims["exp"], time.time() + self.ttl)
+        self._entries[key] = (token, expires, claims, user)
+        self._entries.move_to_end(key)
+        self._by_user.setdefault(user.id, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry[3].id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[3].id]
+
+    def invalidate_user(self, user_id: int):
+        for key in self._by_user.pop(user_id, ()):
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self):
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+token_cache = TokenCache()
+
+def invalidate_user(user_id: int):
+    # Вызывается при удалении пользователя и смене его роли
+    token_cache.invalidate_user(user_id)
+
+def token_id(token: str, claims: dict):
+    # Токены, выданные до появления jti, отзываются по подписи
+    return claims.get("jti") or token.rpartition(".")[2]
+
+async def authenticate_token(token: str, db: AsyncSession):
+    cached = token_cache.get(token)
+    if cached is not None:
+        if await revoked_tokens.is_revoked(db, token_id(token, cached[0])):
+            raise HTTPException(status_code=403, detail="Token has been revoked")
+        return cached
+    # jose тянет за собой cryptography; импорт при первом токене, а не при старте
+    from jose import JWTError, jwt
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=403, detail="Invalid or expired token")
+    username = claims.get("sub")
+    if not username or "exp" not in claims:
+        raise HTTPException(status_code=403, detail="Invalid token")
+    if await revoked_tokens.is_revoked(db, token_id(token, claims)):
+        raise HTTPException(status_code=403, detail="Token has been revoked")
+    row = (await db.execute(
+        select(User.id, User.role).filter(User.username == username)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user = UserSnapshot(id=row.id, username=username, role=row.role or "default")
+    token_cache.put(token, claims, user)
+    return claims, user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    _, user = await authenticate_token(token, db)
+    return user
+
+CurrentUser = Annotated[UserSnapshot, Depends(get_current_user)]
@@ -0,0 +1,21 @@
+from pydantic_core import to_json
+
+# Быстрый путь для горячих чтений: строки select() по колонкам кодируются
+# в JSON сразу, без ORM-объектов и построчной валидации Pydantic.
+# to_json — тот же кодировщик pydantic-core, что у model_dump_json, поэтому
+# при колонках в порядке полей схемы байты ответа совпадают
+
+# transform дописывает в словарь строки вычисляемые поля схемы (computed_field)
+def rows_to_dicts(rows, transform=None):
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    items = [dict(zip(keys, row)) for row in rows]
+    return items if transform is None else [transform(item) for item in items]
+
+def row_json(row, transform=None) -> bytes:
+    item = row._asdict()
+    return to_json(item if transform is None else transform(item))
+
+def page_json(items, next_cursor) -> bytes:
+    return to_json({"items": items, "next_cursor": next_cursor})
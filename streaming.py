@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+
+# Строки склеиваются в куски примерно такого размера перед отправкой клиенту
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def _dump(row):
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode()
+
+async def _chunked(parts):
+    buffer = bytearray()
+    async for part in parts:
+        buffer += part
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+async def _ndjson_parts(rows):
+    async for row in rows:
+        yield _dump(row) + b"\n"
+
+async def _json_array_parts(rows):
+    yield b"["
+    first = True
+    async for row in rows:
+        yield _dump(row) if first else b"," + _dump(row)
+        first = False
+    yield b"]"
+
+async def _csv_parts(rows, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames)
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+def ndjson_stream(rows):
+    return _chunked(_ndjson_parts(rows))
+
+def json_array_stream(rows):
+    return _chunked(_json_array_parts(rows))
+
+def csv_stream(rows, fieldnames):
+    return _chunked(_csv_parts(rows, fieldnames))
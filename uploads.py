@@ -0,0 +1,44 @@
+import csv
+import io
+import itertools
+import json
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+# Записей в одной пачке импорта: одна транзакция и один INSERT ... ON CONFLICT
+IMPORT_BATCH_SIZE = 1000
+
+class InvalidUpload(Exception):
+    pass
+
+def _ndjson_records(text):
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as exc:
+            yield line_number, None, f"Invalid JSON: {exc}"
+
+def _csv_records(text):
+    reader = csv.DictReader(text)
+    for record in reader:
+        # Пустая ячейка — значение по умолчанию из схемы; лишние ячейки без заголовка отбрасываются
+        yield reader.line_num, {key: value for key, value in record.items() if key is not None and value not in ("", None)}, None
+
+async def upload_batches(upload: UploadFile, format: str, batch_size: int = IMPORT_BATCH_SIZE):
+    # Файл уже лежит во временном файле multipart-парсера; читаем и разбираем его
+    # пачками в пуле потоков, чтобы в памяти была только текущая пачка
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    records = _csv_records(text) if format == "csv" else _ndjson_records(text)
+    try:
+        while True:
+            try:
+                batch = await run_in_threadpool(list, itertools.islice(records, batch_size))
+            except (UnicodeDecodeError, csv.Error) as exc:
+                raise InvalidUpload(str(exc))
+            if not batch:
+                return
+            yield batch
+    finally:
+        text.detach()